@@ -0,0 +1,82 @@
+"""
+Cache of decoded and resampled audio
+
+librosa.load decodes and resamples a file every time it is called, for the
+44.1 kHz Matlab data resampling to 22050 Hz is the largest cost of building a
+dataset. load_audio is a drop in replacement that decodes every source file
+once for each target sample rate and keeps the result as a float32 .npy file
+which is memory-mapped on later loads. An entry is rebuilt when the
+modification time or size of its source file changes.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import librosa
+
+AUDIO_CACHE_PATH = "Audio_Cache"
+
+
+def entry_paths(cache_path, file_path, sr):
+    """
+    Paths of the cached audio and its description
+        :param cache_path (str): path to cache folder
+        :param file_path (str): path to source audio file
+        :param sr (int): sample rate of the cached audio, None for the native rate
+        :return (tuple): path to .npy audio, path to .json description
+    """
+    description = json.dumps([os.path.abspath(file_path), sr])
+    key = hashlib.sha1(description.encode("utf-8")).hexdigest()
+    entry_path = os.path.join(cache_path, key[:2], key)
+    return entry_path + ".npy", entry_path + ".json"
+
+
+def source_state(file_path):
+    stat = os.stat(file_path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def write_atomic(path, write):
+    # a unique temporary name so several processes can fill the cache at once
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as fp:
+        write(fp)
+    os.replace(tmp_path, path)
+
+
+def load_audio(file_path, sr=22050, duration=None, cache_path=AUDIO_CACHE_PATH, mmap=True):
+    """
+    Load an audio file like librosa.load, going through the cache
+        :param file_path (str): path to audio file
+        :param sr (int): sample rate to load the audio at, None for the native rate
+        :param duration (float): only load up to this many seconds
+        :param cache_path (str): path to cache folder, None loads without the cache
+        :param mmap (bool): return a read only memory map instead of an array in memory
+        :return signal (ndarray): mono float32 signal
+        :return sr (int): sample rate of signal
+    """
+    if cache_path is None:
+        return librosa.load(file_path, sr=sr, duration=duration)
+
+    audio_path, description_path = entry_paths(cache_path, file_path, sr)
+    state = source_state(file_path)
+    description = None
+    if os.path.exists(description_path) and os.path.exists(audio_path):
+        with open(description_path, "r") as fp:
+            description = json.load(fp)
+
+    if description is None or description["source"] != state:
+        # decode and resample the whole file once, duration is applied when it is read
+        signal, sr_loaded = librosa.load(file_path, sr=sr)
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        write_atomic(audio_path, lambda fp: np.save(fp, signal.astype(np.float32)))
+        description = {"source": state, "sr": sr_loaded, "num_samples": len(signal)}
+        write_atomic(description_path, lambda fp: fp.write(json.dumps(description).encode("utf-8")))
+
+    # an empty file can't be memory-mapped
+    mmap = mmap and description["num_samples"] > 0
+    signal = np.load(audio_path, mmap_mode="r" if mmap else None)
+    if duration is not None:
+        signal = signal[:int(duration * description["sr"])]
+    return signal, description["sr"]
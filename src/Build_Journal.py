@@ -0,0 +1,169 @@
+"""
+Incremental, resumable dataset builds
+
+A build journal is kept next to the feature store. It records every source
+file that has been featurized with its modification time, size and content
+hash, and which records of the store came from it. The journal is saved after
+every chunk of files, so a build that is interrupted picks up where it
+stopped, and a later build only featurizes files that are new or changed.
+
+Records of files that changed or were removed are dropped from the store at
+the end of the build.
+"""
+
+import os
+import json
+import numpy as np
+from Feature_Store import is_store, load_manifest, create_store, truncate_store, append_records, \
+    compact_store, save_metadata
+from Feature_Cache import file_hash
+
+JOURNAL_FILE = "journal.json"
+CHUNK_SIZE = 64  # files featurized between journal saves
+
+
+def load_journal(store_path):
+    """
+    Load the build journal of a store
+        :param store_path (str): path to the store
+        :return journal (dict): source file path -> entry, empty if there is no journal or the
+            store was rewritten since the journal was saved
+    """
+    journal_path = os.path.join(store_path, JOURNAL_FILE)
+    if not os.path.exists(journal_path):
+        return {}
+    with open(journal_path, "r") as fp:
+        journal = json.load(fp)
+    if journal.get("build_id") != load_manifest(store_path).get("build_id"):
+        return {}
+    return journal["files"]
+
+
+def save_journal(store_path, journal):
+    """
+    Save the build journal of a store
+        :param store_path (str): path to the store
+        :param journal (dict): source file path -> entry
+    """
+    journal_path = os.path.join(store_path, JOURNAL_FILE)
+    with open(journal_path + ".tmp", "w") as fp:
+        json.dump({"build_id": load_manifest(store_path)["build_id"], "files": journal}, fp)
+    os.replace(journal_path + ".tmp", journal_path)
+
+
+def is_unchanged(entry, file_path, hashes=None):
+    """
+    Check if a file is the same as when it was featurized, the file is only
+    hashed if its modification time changed and its size didn't
+        :param entry (dict): journal entry of the file
+        :param file_path (str): path to the file
+        :param hashes (dict): file path -> hash, the hash is added to it so it isn't computed again
+        :return (bool): True if the file doesn't need featurizing again
+    """
+    stat = os.stat(file_path)
+    if stat.st_mtime == entry["mtime"] and stat.st_size == entry["size"]:
+        return True
+    if stat.st_size != entry["size"]:
+        return False
+    content_hash = file_hash(file_path)
+    if hashes is not None:
+        hashes[file_path] = content_hash
+    if content_hash == entry["hash"]:
+        # touched but not modified
+        entry["mtime"] = stat.st_mtime
+        return True
+    return False
+
+
+def incremental_build(store_path, files, extract, record_shape, mapping=None, params=None,
+                      chunk_size=CHUNK_SIZE):
+    """
+    Featurize only the files that are new or changed since the last build and
+    append them to the store
+        :param store_path (str): path to the store, created if it doesn't exist
+        :param files (list): (file_path, label, metadata) for every file of the dataset,
+            metadata is a dict of per record information or None
+        :param extract (function): called as extract(file_paths, content_hashes) and returns an iterator of
+            (segment, features) lists, one per file, the hashes are the file_hash of each file
+        :param record_shape (tuple): shape of a single record
+        :param mapping (list): names of the labels
+        :param params (dict): parameters used to extract the features
+        :param chunk_size (int): number of files featurized between journal saves
+        :return (int): number of files featurized
+    """
+    params = params if params is not None else {}
+    journal = {}
+    if is_store(store_path):
+        manifest = load_manifest(store_path)
+        if manifest["params"] != params or manifest["record_shape"] != list(record_shape):
+            print("Parameters changed, rebuilding {}".format(store_path))
+        else:
+            journal = load_journal(store_path)
+            truncate_store(store_path)  # drop records of an interrupted chunk
+    if not journal:
+        create_store(store_path, record_shape, mapping, params)
+
+    # forget files that changed or were removed, their records are dropped at the end
+    file_paths = set(file_path for file_path, label, metadata in files)
+    hashes = {}  # every file is hashed once, the journal and the feature cache share the hash
+    for file_path in list(journal):
+        if file_path not in file_paths or not is_unchanged(journal[file_path], file_path, hashes):
+            del journal[file_path]
+    todo = [(file_path, label, metadata) for file_path, label, metadata in files if file_path not in journal]
+    print("{} files up to date, {} to featurize".format(len(files) - len(todo), len(todo)))
+
+    num_records = load_manifest(store_path)["num_records"]
+    for start in range(0, len(todo), chunk_size):
+        chunk = todo[start:start + chunk_size]
+        chunk_paths = [f[0] for f in chunk]
+        chunk_hashes = [hashes.pop(file_path, None) or file_hash(file_path) for file_path in chunk_paths]
+        features = []
+        labels = []
+        for (file_path, label, metadata), content_hash, segments in zip(chunk, chunk_hashes,
+                                                                         extract(chunk_paths, chunk_hashes)):
+            stat = os.stat(file_path)
+            journal[file_path] = {"mtime": stat.st_mtime,
+                                  "size": stat.st_size,
+                                  "hash": content_hash,
+                                  "start": num_records + len(features),
+                                  "count": len(segments),
+                                  "label": label,
+                                  "metadata": metadata}
+            for s, mfcc in segments:
+                features.append(mfcc)
+                labels.append(label)
+
+        features = np.array(features, dtype=np.float32).reshape((-1,) + tuple(record_shape))
+        num_records = append_records(store_path, features, labels, mapping)["num_records"]
+        save_journal(store_path, journal)
+        print("Featurized {}/{} files".format(min(start + chunk_size, len(todo)), len(todo)))
+
+    finish_build(store_path, journal, num_records)
+    return len(todo)
+
+
+def finish_build(store_path, journal, num_records):
+    """
+    Drop records that no journal entry owns and write the per record metadata
+        :param store_path (str): path to the store
+        :param journal (dict): source file path -> entry
+        :param num_records (int): number of records in the store
+    """
+    entries = sorted(journal.values(), key=lambda entry: entry["start"])
+    keep = np.concatenate([np.arange(entry["start"], entry["start"] + entry["count"]) for entry in entries]) \
+        if entries else np.zeros(0, dtype=np.int64)
+
+    if len(keep) != num_records:
+        compact_store(store_path, keep)
+        start = 0
+        for entry in entries:
+            entry["start"] = start
+            start += entry["count"]
+        save_journal(store_path, journal)
+
+    metadata = {}
+    for entry in entries:
+        for key, value in (entry["metadata"] or {}).items():
+            metadata.setdefault(key, []).extend([value] * entry["count"])
+    if metadata:
+        save_metadata(store_path, metadata)
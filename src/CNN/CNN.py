@@ -12,16 +12,17 @@ from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, accuracy_s
     precision_score, recall_score, f1_score, classification_report
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
 import tensorflow.keras as keras
 from tensorflow.keras.utils import plot_model
+from Feature_Store import is_store, load_dataset_manifest, load_dataset
+from Input_Pipeline import prepare_pipelines, load_records, split_indices, save_split
 from Notes_to_Frequency import notes_to_frequency
 from Notes_to_Frequency import  notes_to_frequency_IDMT_limited
 from Notes_to_Frequency import notes_to_frequency_6
 from Notes_to_Frequency import notes_to_frequency_limited
 
 
-DATASET_PATH ="Dataset_JSON_Files/Simulated_Dataset_Matlab_12frets_1.json"
+DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
 MODEL_PATH = "CNN_Model_Files/CNN_Model_Simulated_Dataset_Matlab_12frets_1.h5"
 
 
@@ -36,6 +37,21 @@ LEARNING_RATE = 0.0001
 LOSS = "sparse_categorical_crossentropy"
 BATCH_SIZE = 4
 EPOCHS = 200
+PREDICT_BATCH_SIZE = 256  # samples per model call when predicting
+
+# stream batches from the store with tf.data instead of loading it into memory, needs a feature store
+INPUT_PIPELINE = False
+
+# train on notes synthesized on the fly instead of the training split, validation and test stay on the store
+PROCEDURAL = False
+STEPS_PER_EPOCH = 100  # batches per epoch when training procedurally
+NUM_WORKERS = 4  # processes synthesizing procedural notes
+
+# train the fully convolutional frame model, which takes recordings of any length. It is saved to FRAME_MODEL_PATH
+# only, the clip classifier at MODEL_PATH isn't touched
+FULLY_CONVOLUTIONAL = False
+FRAME_MODEL_PATH = "CNN_Model_Files/CNN_Frame_Model_Simulated_Dataset_Matlab_12frets_1.h5"
+DILATION_RATES = [2, 4, 8]  # dilated convolutions over time, widen the frames each prediction sees
 
 
 def get_nth_key(dictionary, n=0):
@@ -48,21 +64,22 @@ def get_nth_key(dictionary, n=0):
 
 
 def get_mappings(dataset_path):
-    with open(dataset_path, "r") as fp:
-        data = json.load(fp)
-
-    mapping = data["mapping"]
-    return mapping
+    # only reads the manifest, not the features
+    return load_dataset_manifest(dataset_path)["mapping"]
 
 
 def load_data(dataset_path):
     """
-    Loads training dataset from json file
-        :param dataset_path (str): path to json file
+    Loads training dataset from a feature store or json file
+        :param dataset_path (str): path to feature store or json file
         :return X (ndarray): inputs
         :return y (ndarray): targets
     """
 
+    if is_store(dataset_path):
+        # memory-mapped, nothing is read until it is used
+        return load_dataset(dataset_path)
+
     with open(dataset_path, "r") as fp:
         data = json.load(fp)
 
@@ -101,11 +118,12 @@ def plot_history(history, plt_title=""):
     plt.show()
 
 #TODO verify docstring makes sense
-def prepare_datasets(test_size, validation_size):
+def prepare_datasets(test_size, validation_size, split=None):
     """
     Create test and validation datasets
         :param test_size (float): Value in [0, 1] indicating percentage of data set to allocate to test split
         :param validation_size (float): Value in [0, 1] indicating percentage of train set to allocate to validation split
+        :param split (tuple): train, validation and test indices to use instead of a new split
         :return X_train (ndarray): Input training set
         :return X_validation (ndarray): Input validation set
         :return X_test (ndarray): Input test set
@@ -118,11 +136,12 @@ def prepare_datasets(test_size, validation_size):
     print("X shape: ", X.shape)
     print("y shape: ", y.shape)
 
-    # create train/test split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size)
-
-    # create train/validation split
-    X_train, X_validation, y_train, y_validation = train_test_split(X_train, y_train, test_size=validation_size)
+    # create train/validation/test split of the record indices, so the split can be saved with the model
+    if split is None:
+        split = split_indices(len(X), test_size, validation_size)
+    train_indices, validation_indices, test_indices = split
+    X_train, X_validation, X_test = X[train_indices], X[validation_indices], X[test_indices]
+    y_train, y_validation, y_test = y[train_indices], y[validation_indices], y[test_indices]
 
     # CNN expects 3D array inputs are only 2D
     X_train = X_train[..., np.newaxis]  # 4D array -> [num_samples, number of time bins, mfcc_coefficients, channel]
@@ -167,6 +186,67 @@ def build_model(input_shape):
 
     return model
 
+def build_frame_model(num_coefficients, num_notes=NUMBER_OF_NOTES, dropout=DROPOUT, dilation_rates=DILATION_RATES):
+    """
+    Generate a fully convolutional CNN predicting a note for every frame
+        :param num_coefficients (int): MFCC coefficients or spectrogram bins of a frame
+        :param num_notes (int): number of notes to classify
+        :param dropout (float): dropout rate
+        :param dilation_rates (list): dilation rates of the convolutions over time
+        :return model: model taking [recordings, any number of frames, num_coefficients, channel] and
+            returning a posteriorgram of shape [recordings, frames, num_notes]
+    """
+
+    # create model, the conv layers of build_model with "same" padding and pooling only over the coefficients
+    # so there is one output per input frame
+    model = keras.Sequential()
+
+    # 1st conv layer
+    model.add(keras.layers.Conv2D(32, (3, 3), activation="relu", padding="same",
+                                  input_shape=(None, num_coefficients, 1)))
+    model.add(keras.layers.MaxPool2D((3, 3), strides=(1, 2), padding="same"))
+    model.add(keras.layers.BatchNormalization())
+
+    # 2nd conv layer
+    model.add(keras.layers.Conv2D(32, (3, 3), activation="relu", padding="same"))
+    model.add(keras.layers.MaxPool2D((3, 3), strides=(1, 2), padding="same"))
+    model.add(keras.layers.BatchNormalization())
+
+    # 3rd conv layer
+    model.add(keras.layers.Conv2D(32, (2, 2), activation="relu", padding="same"))
+    model.add(keras.layers.MaxPool2D((2, 2), strides=(1, 2), padding="same"))
+    model.add(keras.layers.BatchNormalization())
+
+    # a conv over every remaining coefficient takes the place of Flatten and Dense, for each frame
+    remaining = num_coefficients
+    for _ in range(3):
+        remaining = -(-remaining // 2)
+    model.add(keras.layers.Conv2D(64, (1, remaining), activation="relu"))
+    model.add(keras.layers.Reshape((-1, 64)))  # [recordings, frames, features]
+
+    # context from the neighbouring frames
+    for rate in dilation_rates:
+        model.add(keras.layers.Conv1D(64, 3, dilation_rate=rate, activation="relu", padding="same"))
+    model.add(keras.layers.Dropout(dropout))  # avoid over fitting
+
+    # output layer, applied to every frame
+    model.add(keras.layers.Dense(num_notes, activation="softmax"))
+
+    return model
+
+
+def build_clip_model(frame_model):
+    """
+    Wrap a frame model so it can be trained and evaluated on clips with one label each
+        :param frame_model: model from build_frame_model
+        :return model: model returning the mean of the frame probabilities, it shares the weights of frame_model
+    """
+    model = keras.Sequential()
+    model.add(frame_model)
+    model.add(keras.layers.GlobalAveragePooling1D())
+    return model
+
+
 #TODO complete docstring
 def predict(model, X, y):
     """
@@ -189,12 +269,47 @@ def predict(model, X, y):
     # return predicted_index
     return predicted_index, prediction
 
-LABELS = get_mappings(DATASET_PATH)  # Lables for graphs
 
-if __name__ == "__main__":
+def predict_batch(model, X, batch_size=PREDICT_BATCH_SIZE):
+    """
+    Predict on many samples with one model call per batch
+        :param model: CNN model
+        :param X (ndarray): inputs of shape [num_samples, number of time bins, mfcc_coefficients, channel]
+        :param batch_size (int): samples per model call
+        :return predicted_index (ndarray): index with the highest probability for each sample
+        :return prediction (ndarray): probabilities of shape [num_samples, number of notes]
+    """
+    prediction = model.predict(X, batch_size=batch_size)
+    predicted_index = np.argmax(prediction, axis=1)
+    return predicted_index, prediction
 
-    # create training, validation and test sets
-    X_train, X_validation, X_test, y_train, y_validation, y_test = prepare_datasets(0.25, 0.2)
+
+def predict_frames(frame_model, frames):
+    """
+    Predict the note of every frame of a whole recording in one forward pass
+        :param frame_model: model from build_frame_model
+        :param frames (ndarray): MFCCs of the recording of shape [number of time bins, mfcc_coefficients]
+        :return predicted_index (ndarray): index with the highest probability for each frame
+        :return prediction (ndarray): posteriorgram of shape [number of time bins, number of notes]
+    """
+    X = np.asarray(frames, dtype=np.float32)[np.newaxis, ..., np.newaxis]  # one recording with a channel axis
+    prediction = np.asarray(frame_model.predict_on_batch(X))[0]
+    predicted_index = np.argmax(prediction, axis=1)
+    return predicted_index, prediction
+
+
+if __name__ == "__main__":
+    LABELS = get_mappings(DATASET_PATH)  # Lables for graphs
+
+    # create training, validation and test sets, the split is saved with the model
+    split = split_indices(load_dataset_manifest(DATASET_PATH)["num_records"], 0.25, 0.2)
+    if INPUT_PIPELINE:
+        train_dataset, validation_data, test_indices = prepare_pipelines(DATASET_PATH, 0.25, 0.2, BATCH_SIZE,
+                                                                         channel=True, split=split)
+        X_test, y_test = load_records(DATASET_PATH, test_indices, channel=True)
+    else:
+        X_train, X_validation, X_test, y_train, y_validation, y_test = prepare_datasets(0.25, 0.2, split)
+        validation_data = (X_validation, y_validation)
 
     """
     with open("Dataset_Augmented_JSON_Files/Hybrid_Limited_Dataset.json", "r") as fp:
@@ -215,14 +330,16 @@ if __name__ == "__main__":
     X_validation = X_validation[..., np.newaxis]
     """
     # build the CNN
-    input_shape = (X_train.shape[1], X_train.shape[2], X_train.shape[3])
+    input_shape = (X_test.shape[1], X_test.shape[2], X_test.shape[3])
     #input_shape = (X_train.shape[0], X_train.shape[1])
-    print(X_train.shape)
-    print(type(X_train[0]))
-    print(type(X_train[1]))
-    print(type(X_train[2]))
+    print(input_shape)
 
-    model = build_model(input_shape)
+    if FULLY_CONVOLUTIONAL:
+        # trained on the mean of the frame predictions so the clips, labels and metrics stay the same
+        frame_model = build_frame_model(input_shape[1])
+        model = build_clip_model(frame_model)
+    else:
+        model = build_model(input_shape)
 
     # print model
     # plot_model(model, to_file='CNN_Model_Files/Model.png')
@@ -236,8 +353,17 @@ if __name__ == "__main__":
     model.summary()
 
     # train the model
-    history = model.fit(X_train, y_train, validation_data=(X_validation, y_validation),
-                        batch_size=BATCH_SIZE, epochs=EPOCHS)
+    if PROCEDURAL:
+        # imported here, the synthesis models are only needed to train procedurally
+        from Procedural_Dataset import procedural_dataset
+        train_dataset = procedural_dataset(LABELS, batch_size=BATCH_SIZE, num_workers=NUM_WORKERS)
+        history = model.fit(train_dataset, validation_data=validation_data,
+                            steps_per_epoch=STEPS_PER_EPOCH, epochs=EPOCHS)
+    elif INPUT_PIPELINE:
+        history = model.fit(train_dataset, validation_data=validation_data, epochs=EPOCHS)
+    else:
+        history = model.fit(X_train, y_train, validation_data=validation_data,
+                            batch_size=BATCH_SIZE, epochs=EPOCHS)
     #print(history.history.keys())
 
     # plot accuracy/error for training and validation
@@ -248,15 +374,16 @@ if __name__ == "__main__":
     #print("Accuracy on test set is: ", test_accuracy)
 
     # save model
-    model.save(MODEL_PATH)
-
-    # make prediction on a sample
-    #predicted_note = []
-    predicted_index = []
-    for i in range(len(X_test)):
-        index, pred = predict(model, X_test[i], y_test[i])
-        #predicted_note.append(note)
-        predicted_index.append(index)
+    if FULLY_CONVOLUTIONAL:
+        # the clip wrapper only exists for training, MODEL_PATH keeps the clip classifier
+        frame_model.save(FRAME_MODEL_PATH)
+        save_split(FRAME_MODEL_PATH, DATASET_PATH, *split)
+    else:
+        model.save(MODEL_PATH)
+        save_split(MODEL_PATH, DATASET_PATH, *split)
+
+    # make prediction on the test set
+    predicted_index, pred = predict_batch(model, X_test)
 
     cm = confusion_matrix(y_test, predicted_index)
 
@@ -7,27 +7,22 @@ expected index, the model must be provided with the correct data.
 # TODO calculate confusion matrix metrics
 
 import numpy as np
-import pandas as pd
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, accuracy_score, \
-    precision_score, recall_score, f1_score, classification_report
-import seaborn as sns
 from tensorflow.keras.models import load_model
-import matplotlib.pyplot as plt
 from CNN import load_data
-from CNN import predict
+from CNN import predict_batch
 from CNN import get_mappings
+from Prediction_Writer import PredictionWriter
 from Notes_to_Frequency import notes_to_frequency
 from Notes_to_Frequency import notes_to_frequency_6
 from Notes_to_Frequency import  notes_to_frequency_limited
 
-MODEL_DATASET_PATH = "Dataset_JSON_Files/Simulated_Dataset_Matlab_12frets_1.json"
-DATASET_PATH = "Dataset_JSON_Files/Only_G4_Recorded_1.json"  # data used for predictions
+MODEL_DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
+DATASET_PATH = "Dataset_Files/Only_G4_Recorded_1"  # data used for predictions
 MODEL_PATH = "CNN_Model_Files/CNN_Model_Simulated_Dataset_Matlab_12frets_1.h5"
 RESULTS_PATH = "Results/CNN_Results/"
 MODEL_NAME = "Simulated_Dataset_Matlab_12frets_1"
 DATASET_NAME = "Only_G4_Recorded_1"
 PLOT_TITLE = "Only_G4_Recorded_1"  # Dataset name to be used in graph titles
-LABELS = get_mappings(MODEL_DATASET_PATH)
 
 
 def prepare_data(dataset):
@@ -44,6 +39,8 @@ def prepare_data(dataset):
 
 
 if __name__ == "__main__":
+    LABELS = get_mappings(MODEL_DATASET_PATH)  # only reads the manifest
+
     # load model
     model = load_model(MODEL_PATH)
 
@@ -53,36 +50,13 @@ if __name__ == "__main__":
     # load data
     X, y = prepare_data(DATASET_PATH)
 
-    # make prediction on a sample
-    #predicted_note = []
-    predicted_index = []
-    prediction = pd.DataFrame(columns=LABELS)
-    #print(LABELS)
-    #prediction.columns = list(LABELS)
-
-    for i in range(len(X)):
-        index, pred = predict(model, X[i], y[i])
-        #predicted_note.append(note)
-        predicted_index.append(index)
-        prediction.loc[len(prediction.index)] = pred[0]
-
-    #print(y)
-    # print(predicted_index)
-    # print full dataframe
-    with pd.option_context('display.max_rows', None,
-                           'display.max_columns', None,
-                           'display.precision', 3,
-                           ):
-        print(prediction)
-
-    # save results as csv
-    prediction = prediction.round(2)  # round to 2 dp
-    description = prediction.describe()
-    description = description.round(2)  # round to 2 dp
-    prediction.to_csv(RESULTS_PATH + "Prediction_" + MODEL_NAME + "_" + DATASET_NAME + ".csv")
-    description.to_csv(RESULTS_PATH + "Description_" + MODEL_NAME + "_"+ DATASET_NAME + ".csv")
-
-    print(prediction.describe())
+    # make prediction on every sample
+    predicted_index, pred = predict_batch(model, X)
+
+    # save results as csv and binary
+    writer = PredictionWriter(RESULTS_PATH, MODEL_NAME + "_" + DATASET_NAME, LABELS)
+    writer.write(pred)
+    print(writer.close())  # summary statistics
 
 
     """
@@ -4,26 +4,23 @@ Pre-process audio files
 
 
 import os
-import librosa
 import math
-import json
-import librosa
-import random
-import numpy as np
-import librosa.display
-import soundfile as sf
-import matplotlib.pyplot as plt
+import itertools
 from audiomentations import Compose, AddGaussianNoise, TimeStretch, FrequencyMask,\
-    PolarityInversion, Gain, GainTransition, LoudnessNormalization, TimeMask
+    PolarityInversion, LoudnessNormalization, TimeMask
 from sklearn.model_selection import train_test_split
+from Feature_Store import DatasetWriter
+from MFCC_Engine import mfcc_signals
+from Audio_Cache import load_audio
 
 
 DATASET_PATH = "Hybrid_Limited_Dataset"  # name of folder with audio files
-JSON_PATH = "Dataset_Augmented_JSON_Files/Hybrid_Limited_Dataset.json"  # name of file to be created
+STORE_PATH = "Dataset_Augmented_Files/Hybrid_Limited_Dataset"  # name of feature store to be created
 SAMPLE_RATE = 22050
 DURATION = 4  # length of audio files measured in seconds
 NUM_SEGMENTS = 4
 SAMPLES_PER_TRACK = SAMPLE_RATE * DURATION
+BATCH_SIZE = 64  # signals featurized and written at a time
 
 
 def load_dataset(dataset_path):
@@ -55,7 +52,7 @@ def load_dataset(dataset_path):
             for f in filenames:
                 # load audio file
                 file_path = os.path.join(dirpath, f)
-                signal, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=DURATION)
+                signal, sr = load_audio(file_path, sr=SAMPLE_RATE, duration=DURATION)
                 data["signal"].append(signal)
                 #data[1].append(signal)
                 data["labels"].append(i - 1)  # each iterations is a different folder
@@ -117,79 +114,40 @@ def augment(signal, label):
     return signal, label
 
 
-def save_mfcc(json_path,  X_train, X_validation, X_test, y_train,
+def save_mfcc(store_path,  X_train, X_validation, X_test, y_train,
               y_validation, y_test,n_mfcc=13, n_fft=2048, hop_length=512,
-              num_segments=1):
-    data = {
-        "X_train_augmented": [],
-        "X_validation": [],
-        "X_test": [],
-        "y_train_augmented": [],
-        "y_validation": [],
-        "y_test" : []
-    }
-
+              num_segments=1, mapping=None, batch_size=BATCH_SIZE):
+    """
+    Creates a feature store for each of the train, validation and test sets
+    :param store_path: folder to create the stores in
+    :param mapping: names of the labels
+    :param batch_size: signals featurized at a time, the signals can be given as iterators so a set is never
+        held in memory
+    """
     num_samples_per_segment = int(SAMPLES_PER_TRACK / num_segments)
     expected_num_mfcc_vectors_per_segment = math.ceil(num_samples_per_segment / hop_length)  # round up always
+    params = {
+        "sample_rate": SAMPLE_RATE,
+        "duration": DURATION,
+        "n_mfcc": n_mfcc,
+        "n_fft": n_fft,
+        "hop_length": hop_length,
+        "num_segments": num_segments
+    }
 
-    # create mfcc for training data
-    for i in range(len(X_train)):
-        # process segments extracting mfcc and storing data
-        #for s in range(num_segments):
-            #start_sample = num_samples_per_segment * s  # s=0 -> 0
-            #finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
-
-            mfcc = librosa.feature.mfcc(X_train[i],
-                                        sr=SAMPLE_RATE,
-                                        n_fft=n_fft,
-                                        n_mfcc=n_mfcc,
-                                        hop_length=hop_length)
-            mfcc = mfcc.T  # TODO find out why this is better to work with
-            if len(mfcc) == expected_num_mfcc_vectors_per_segment:
-                data["X_train_augmented"].append(mfcc.tolist())
-                data["y_train_augmented"].append(y_train[i])
-
-    # create mfcc for validation data
-    for j in range(len(X_validation)):
-        # process segments extracting mfcc and storing data
-        #for s in range(num_segments):
-            #start_sample = num_samples_per_segment * s  # s=0 -> 0
-            #finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
-
-            mfcc = librosa.feature.mfcc(X_test[j],
-                                        sr=SAMPLE_RATE,
-                                        n_fft=n_fft,
-                                        n_mfcc=n_mfcc,
-                                        hop_length=hop_length)
-            mfcc = mfcc.T  # TODO find out why this is better to work with
-            if len(mfcc) == expected_num_mfcc_vectors_per_segment:
-                data["X_validation"].append(mfcc.tolist())
-                data["y_validation"].append(y_test[j])
-
-    # create mfcc for test data
-    for k in range(len(X_test)):
-        # process segments extracting mfcc and storing data
-        #for s in range(num_segments):
-            #start_sample = num_samples_per_segment * s  # s=0 -> 0
-            #finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
-
-            mfcc = librosa.feature.mfcc(X_test[k],
-                                        sr=SAMPLE_RATE,
-                                        n_fft=n_fft,
-                                        n_mfcc=n_mfcc,
-                                        hop_length=hop_length)
-            mfcc = mfcc.T  # TODO find out why this is better to work with
-            if len(mfcc) == expected_num_mfcc_vectors_per_segment:
-                data["X_test"].append(mfcc.tolist())
-                data["y_test"].append(y_test[k])
-    """
-    data["X_validation"] = X_validation.tolist()
-    data["X_test"] = X_test.tolist()
-    data["y_validation"] = y_validation.tolist()
-    data["y_test"] = y_test.tolist()
-    """
-    with open(json_path, "w") as fp:
-        json.dump(data, fp, indent=4)
+    # create mfcc for training, validation and test data, each batch is written to its store before the next
+    for name, X, y in [("train", X_train, y_train),
+                       ("validation", X_validation, y_validation),
+                       ("test", X_test, y_test)]:
+        with DatasetWriter(os.path.join(store_path, name), (expected_num_mfcc_vectors_per_segment, n_mfcc),
+                           mapping=mapping, params=params) as writer:
+            records = zip(X, y)
+            for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+                mfccs = mfcc_signals([signal for signal, label in batch], sr=SAMPLE_RATE, n_fft=n_fft,
+                                     n_mfcc=n_mfcc, hop_length=hop_length)
+                for mfcc, (signal, label) in zip(mfccs, batch):
+                    if len(mfcc) == expected_num_mfcc_vectors_per_segment:
+                        writer.append(mfcc, label)
 
 
 
@@ -204,17 +162,15 @@ if __name__ == "__main__":
     y_test = prepare_datasets(data, 0.25, 0.2)
 
     print("X train size: ", len(X_train))
-    X_train_augmented = X_train.copy()
-    y_train_augmented = y_train.copy()
-    for i in range(len(X_train)):
-        signal, label = augment(X_train[i], y_train[i])
-        X_train_augmented.append(signal)
-        y_train_augmented.append(label)
-    print("X train augmented: ", len(X_train_augmented))
+    # the augmented copies are made batch by batch as they are written, not all up front
+    X_train_augmented = itertools.chain(X_train, (augment(signal, label)[0]
+                                                  for signal, label in zip(X_train, y_train)))
+    y_train_augmented = y_train + y_train  # augment keeps the label
+    print("X train augmented: ", len(y_train_augmented))
     print(y_train_augmented)
 
-    save_mfcc(JSON_PATH, X_train_augmented, X_validation,
-                       X_test, y_train_augmented, y_validation, y_test)
+    save_mfcc(STORE_PATH, X_train_augmented, X_validation,
+                       X_test, y_train_augmented, y_validation, y_test, mapping=data["mapping"])
 
 
     #librosa.display.waveplot(np.asarray(X_train[0]), sr=SAMPLE_RATE)
@@ -0,0 +1,163 @@
+"""
+Persistent on-disk cache of extracted features
+
+Every segment of every file is saved as its own .npy entry. The key is a hash
+of the audio file contents plus every parameter used to extract the segment,
+so renaming or moving a file still hits the cache and changing any parameter
+misses it. Reading an entry updates its modification time, when the cache
+grows past its size cap the least recently used entries are removed first.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+
+MAX_CACHE_SIZE = 2 * 1024 ** 3  # bytes
+ENTRY_EXTENSION = ".npy"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    """
+    Hash the contents of a file
+        :param file_path (str): path to file
+        :return (str): sha1 hex digest of the file
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def cache_key(content_hash, params, segment):
+    """
+    Key of a cache entry
+        :param content_hash (str): hash of the audio file
+        :param params (dict): parameters used to extract the features
+        :param segment (int): index of the segment
+        :return (str): key of the entry
+    """
+    description = json.dumps([content_hash, sorted(params.items()), segment])
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def entry_path(cache_path, key):
+    # split entries over sub folders to keep folders small
+    return os.path.join(cache_path, key[:2], key + ENTRY_EXTENSION)
+
+
+def get_entry(cache_path, key):
+    """
+    Read an entry from the cache
+        :param cache_path (str): path to cache folder
+        :param key (str): key of the entry
+        :return (ndarray): cached features, empty if the segment had no features, None on a miss
+    """
+    path = entry_path(cache_path, key)
+    try:
+        features = np.load(path)
+    except (OSError, ValueError):
+        return None
+    os.utime(path)  # mark as recently used
+    return features
+
+
+def put_entry(cache_path, key, features):
+    """
+    Write an entry to the cache
+        :param cache_path (str): path to cache folder
+        :param key (str): key of the entry
+        :param features (ndarray): features to cache, empty if the segment had no features
+        :return (int): size of the entry in bytes
+    """
+    path = entry_path(cache_path, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fp:
+        np.save(fp, np.asarray(features, dtype=np.float32))
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def evict(cache_path, max_size=MAX_CACHE_SIZE):
+    """
+    Remove the least recently used entries until the cache fits in max_size
+        :param cache_path (str): path to cache folder
+        :param max_size (int): size cap in bytes
+        :return (int): number of entries removed
+    """
+    entries = []
+    total_size = 0
+    for dirpath, dirnames, filenames in os.walk(cache_path):
+        for f in filenames:
+            if f.endswith(ENTRY_EXTENSION):
+                stat = os.stat(os.path.join(dirpath, f))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, f)))
+                total_size += stat.st_size
+
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        os.remove(path)
+        total_size -= size
+        removed += 1
+    return removed
+
+
+def extract_files_cached(file_paths, cache_path, extract, num_segments=1, max_size=MAX_CACHE_SIZE,
+                         content_hashes=None, **params):
+    """
+    Extract features of many files, only files with a missing segment are extracted
+        :param file_paths (list): paths to audio files
+        :param cache_path (str): path to cache folder
+        :param extract (function): called as extract(missed_file_paths, num_segments=..., **params) and
+            returns an iterator of (segment, features) lists, one per file
+        :param num_segments (int): number of segments each file is split into
+        :param max_size (int): size cap of the cache in bytes
+        :param content_hashes (list): file_hash of every file if the caller already has them, None hashes the files
+        :param params: parameters used to extract the features, all part of the cache key
+        :return segments (iterator): (segment, features) for every segment with features, per file,
+            entries are only read when they are reached
+        :return num_misses (int): number of files that will be extracted
+    """
+    key_params = dict(params, num_segments=num_segments)
+    # these don't change the features
+    key_params.pop("num_workers", None)
+    key_params.pop("chunk_size", None)
+
+    keys = []
+    missed = []
+    if content_hashes is None:
+        content_hashes = [file_hash(file_path) for file_path in file_paths]
+    for file_path, content_hash in zip(file_paths, content_hashes):
+        file_keys = [cache_key(content_hash, key_params, s) for s in range(num_segments)]
+        keys.append(file_keys)
+        missed.append(not all(os.path.exists(entry_path(cache_path, key)) for key in file_keys))
+
+    missed_paths = [file_path for file_path, miss in zip(file_paths, missed) if miss]
+
+    def segments():
+        extracted = extract(missed_paths, num_segments=num_segments, **params)
+        for file_path, file_keys, miss in zip(file_paths, keys, missed):
+            cached = None if miss else [get_entry(cache_path, key) for key in file_keys]
+            if cached is None or any(features is None for features in cached):
+                if miss:
+                    file_segments = next(extracted)
+                else:
+                    # an entry was evicted since it was checked, a single file isn't worth starting workers for
+                    file_segments = next(iter(extract([file_path], num_segments=num_segments,
+                                                      **dict(params, num_workers=1))))
+                found = dict(file_segments)
+                for s, key in enumerate(file_keys):
+                    # segments without features are cached too so they aren't extracted again
+                    put_entry(cache_path, key, found.get(s, np.zeros(0, dtype=np.float32)))
+                yield file_segments
+            else:
+                yield [(s, features) for s, features in enumerate(cached) if features.size > 0]
+        if missed_paths:
+            evict(cache_path, max_size)
+
+    return segments(), len(missed_paths)
@@ -0,0 +1,160 @@
+"""
+Shared feature extraction for the dataset builders
+
+Files are listed up front so every file gets its label before any work is
+done, the extraction can then be spread over a process pool and the results
+still come back in the same order as a serial run. Files are handled in
+chunks, the segments of every file in a chunk go through MFCC_Engine as one
+batch.
+"""
+
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+from MFCC_Engine import mfcc_signals
+from Audio_Cache import load_audio
+from Feature_Cache import extract_files_cached, MAX_CACHE_SIZE
+
+CHUNK_SIZE = 32  # files loaded and featurized together
+
+
+def list_dataset_files(dataset_path):
+    """
+    List the audio files of a dataset in the order os.walk finds them
+        :param dataset_path (str): path to the dataset folder, one sub folder per note
+        :return mapping (list): name of each note
+        :return files (list): (file_path, label) for every file
+    """
+    mapping = []
+    files = []
+    for i, (dirpath, dirnames, filenames) in enumerate(os.walk(dataset_path)):
+        # ensure that we're not at the root level (Audio folder)
+        if dirpath is not dataset_path:
+            # save the semantic label (name of the note)
+            dirpath_components = dirpath.split("\\")
+            mapping.append(dirpath_components[-1])
+            for f in filenames:
+                files.append((os.path.join(dirpath, f), i - 1))  # each iterations is a different folder
+    return mapping, files
+
+
+def split_segments(signal, num_samples_per_segment, num_segments):
+    """
+    Split a signal into segments
+        :param signal (ndarray): 1D signal
+        :param num_samples_per_segment (int): length of each segment
+        :param num_segments (int): number of segments
+        :return segments (list): views of the signal, the last may be shorter
+    """
+    segments = []
+    for s in range(num_segments):
+        start_sample = num_samples_per_segment * s  # s=0 -> 0
+        finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
+        segments.append(signal[start_sample:finish_sample])
+    return segments
+
+
+def extract_signals_mfcc(signals, sample_rate, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=1,
+                         num_samples_per_segment=None):
+    """
+    Extract the MFCCs of each segment of many signals in one batch
+        :param signals (list): 1D signals
+        :param sample_rate (int): sample rate of the signals
+        :param n_mfcc (int): number of MFCC coefficients to create
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param num_segments (int): number of segments to split each signal into
+        :param num_samples_per_segment (int): length of each segment
+        :return segments (list): (segment, mfcc) for every segment with the expected length, per signal
+    """
+    expected_num_mfcc_vectors_per_segment = math.ceil(num_samples_per_segment / hop_length)  # round up always
+
+    all_segments = []
+    owners = []
+    for i, signal in enumerate(signals):
+        for s, segment in enumerate(split_segments(signal, num_samples_per_segment, num_segments)):
+            # segments too short to give the expected number of frames are skipped
+            if 1 + len(segment) // hop_length == expected_num_mfcc_vectors_per_segment:
+                all_segments.append(segment)
+                owners.append((i, s))
+
+    mfccs = mfcc_signals(all_segments, sr=sample_rate, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
+
+    segments = [[] for _ in signals]
+    for (i, s), mfcc in zip(owners, mfccs):
+        segments[i].append((s, mfcc))
+    return segments
+
+
+def extract_files_mfcc(file_paths, sample_rate, duration, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=1):
+    """
+    Load audio files and extract the MFCCs of each segment
+        :param file_paths (list): paths to audio files
+        :param sample_rate (int): rate to load the audio at
+        :param duration (float): length of audio to load in seconds
+        :param n_mfcc (int): number of MFCC coefficients to create
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param num_segments (int): number of segments to split the audio into
+        :return segments (list): (segment, mfcc) for every segment with the expected length, per file
+    """
+    signals = [load_audio(file_path, sr=sample_rate, duration=duration)[0] for file_path in file_paths]
+    return extract_signals_mfcc(signals, sample_rate, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length,
+                                num_segments=num_segments,
+                                num_samples_per_segment=int(sample_rate * duration / num_segments))
+
+
+def _extract_files_mfcc(args):
+    # ProcessPoolExecutor.map only passes one argument
+    file_paths, params = args
+    return extract_files_mfcc(file_paths, **params)
+
+
+def extract_files(file_paths, num_workers=1, chunk_size=CHUNK_SIZE, **params):
+    """
+    Extract the MFCCs of many files, in parallel if num_workers > 1
+        :param file_paths (list): paths to audio files
+        :param num_workers (int): number of processes to use, None uses every core
+        :param chunk_size (int): number of files featurized in one batch
+        :param params: arguments passed on to extract_files_mfcc
+        :return (iterator): segments of each file, in the same order as file_paths
+    """
+    chunks = [(file_paths[start:start + chunk_size], params) for start in range(0, len(file_paths), chunk_size)]
+    if num_workers == 1:
+        results = map(_extract_files_mfcc, chunks)
+        executor = None
+    else:
+        # map keeps the order of the chunks
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        results = executor.map(_extract_files_mfcc, chunks)
+
+    try:
+        for chunk_segments in results:
+            for segments in chunk_segments:
+                yield segments
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def extract_dataset_files(file_paths, num_workers=1, cache_path=None, max_cache_size=MAX_CACHE_SIZE,
+                          content_hashes=None, **params):
+    """
+    Extract the MFCCs of many files, going through the feature cache if a cache_path is given
+        :param file_paths (list): paths to audio files
+        :param num_workers (int): number of processes to use, None uses every core
+        :param cache_path (str): folder to cache features in, None disables the cache
+        :param max_cache_size (int): size cap of the cache in bytes
+        :param content_hashes (list): hashes of the files if they are already known, so the cache doesn't hash
+            them again
+        :param params: arguments passed on to extract_files_mfcc
+        :return (iterator): segments of each file, in the same order as file_paths
+    """
+    if cache_path is None:
+        return extract_files(file_paths, num_workers=num_workers, **params)
+
+    segments_per_file, num_misses = extract_files_cached(file_paths, cache_path, extract_files,
+                                                         max_size=max_cache_size, content_hashes=content_hashes,
+                                                         num_workers=num_workers, **params)
+    print("Cache hits: {}, misses: {}".format(len(file_paths) - num_misses, num_misses))
+    return segments_per_file
@@ -0,0 +1,536 @@
+"""
+Binary feature store used by the dataset builders and the models
+
+A store is a folder holding:
+    features.f32  - raw float32 array of shape (num_records, frames, coefficients)
+    labels.i32    - raw int32 array of shape (num_records,)
+    manifest.json - mapping, shapes and the parameters used to extract the features
+    metadata.json - optional per record information (file names, fret numbers...)
+
+The features are memory-mapped when loaded so nothing is parsed or copied
+until the data is actually used.
+
+A view is a subset of another store with its own labels, it holds:
+    indices.i64   - int64 indices of its records in the source store
+    labels.i32    - raw int32 array of the remapped labels
+    manifest.json - like a store manifest with a "view" entry naming the source store
+Views are loaded like stores, only the selected records are read, when they
+are indexed.
+"""
+
+import os
+import json
+import uuid
+import numpy as np
+
+FEATURES_FILE = "features.f32"
+LABELS_FILE = "labels.i32"
+MANIFEST_FILE = "manifest.json"
+METADATA_FILE = "metadata.json"
+INDICES_FILE = "indices.i64"
+FEATURES_DTYPE = np.float32
+LABELS_DTYPE = np.int32
+INDICES_DTYPE = np.int64
+STORE_VERSION = 1
+CHUNK_RECORDS = 1024  # records buffered by DatasetWriter before they are written
+
+
+def is_store(path):
+    """
+    Check if a path is a feature store
+        :param path (str): path to check
+        :return (bool): True if path is a folder with a manifest
+    """
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def label_counts(labels, num_labels=0):
+    """
+    Count how many records there are for each label
+        :param labels (ndarray): label of each record
+        :param num_labels (int): minimum length of the returned list
+        :return (list): number of records per label
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    if labels.size == 0:
+        return [0] * num_labels
+    return np.bincount(labels, minlength=num_labels).tolist()
+
+
+def write_manifest(store_path, manifest):
+    """
+    Write the manifest of a store, a temporary file is used so a crash never
+    leaves a half written manifest
+        :param store_path (str): path to the store
+        :param manifest (dict): manifest to write
+    """
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(manifest, fp, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+
+def save_dataset(store_path, features, labels, mapping=None, params=None, metadata=None):
+    """
+    Save features and labels as a binary feature store
+        :param store_path (str): folder to create the store in
+        :param features (ndarray): features of shape (num_records, frames, coefficients)
+        :param labels (ndarray): label of each record
+        :param mapping (list): names of the labels
+        :param params (dict): parameters used to extract the features
+        :param metadata (dict): lists of per record information, saved separately
+    """
+    features = np.ascontiguousarray(features, dtype=FEATURES_DTYPE)
+    labels = np.ascontiguousarray(labels, dtype=LABELS_DTYPE)
+    if len(features) != len(labels):
+        raise ValueError("features and labels must have the same length")
+
+    os.makedirs(store_path, exist_ok=True)
+    features.tofile(os.path.join(store_path, FEATURES_FILE))
+    labels.tofile(os.path.join(store_path, LABELS_FILE))
+
+    if metadata is not None:
+        save_metadata(store_path, metadata)
+
+    mapping = list(mapping) if mapping is not None else []
+    manifest = new_manifest(features.shape[1:], mapping, params)
+    manifest["num_records"] = int(features.shape[0])
+    manifest["label_counts"] = label_counts(labels, len(mapping))
+    write_manifest(store_path, manifest)
+
+
+def new_manifest(record_shape, mapping=None, params=None):
+    """
+    Manifest of an empty store
+        :param record_shape (tuple): shape of a single record
+        :param mapping (list): names of the labels
+        :param params (dict): parameters used to extract the features
+        :return manifest (dict): manifest with no records
+    """
+    mapping = list(mapping) if mapping is not None else []
+    return {
+        "version": STORE_VERSION,
+        "num_records": 0,
+        "record_shape": [int(n) for n in record_shape],
+        "features_dtype": np.dtype(FEATURES_DTYPE).name,
+        "labels_dtype": np.dtype(LABELS_DTYPE).name,
+        "mapping": mapping,
+        "label_counts": [0] * len(mapping),
+        "params": params if params is not None else {},
+        "build_id": uuid.uuid4().hex,  # changes every time the store is rewritten from scratch
+    }
+
+
+def save_metadata(store_path, metadata):
+    """
+    Save the per record metadata of a store
+        :param store_path (str): path to the store
+        :param metadata (dict): lists of per record information
+    """
+    metadata_path = os.path.join(store_path, METADATA_FILE)
+    with open(metadata_path + ".tmp", "w") as fp:
+        json.dump(metadata, fp)
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+
+def create_store(store_path, record_shape, mapping=None, params=None):
+    """
+    Create an empty store that records can be appended to
+        :param store_path (str): folder to create the store in
+        :param record_shape (tuple): shape of a single record
+        :param mapping (list): names of the labels
+        :param params (dict): parameters used to extract the features
+        :return manifest (dict): manifest of the new store
+    """
+    os.makedirs(store_path, exist_ok=True)
+    for file_name in [FEATURES_FILE, LABELS_FILE]:
+        open(os.path.join(store_path, file_name), "wb").close()
+    metadata_path = os.path.join(store_path, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    manifest = new_manifest(record_shape, mapping, params)
+    write_manifest(store_path, manifest)
+    return manifest
+
+
+def truncate_store(store_path):
+    """
+    Drop anything written after the last manifest update, e.g. by a build that crashed
+        :param store_path (str): path to the store
+        :return manifest (dict): manifest of the store
+    """
+    manifest = load_manifest(store_path)
+    record_size = int(np.prod(manifest["record_shape"])) * np.dtype(FEATURES_DTYPE).itemsize
+    sizes = {FEATURES_FILE: manifest["num_records"] * record_size,
+             LABELS_FILE: manifest["num_records"] * np.dtype(LABELS_DTYPE).itemsize}
+    for file_name, size in sizes.items():
+        with open(os.path.join(store_path, file_name), "r+b") as fp:
+            fp.truncate(size)
+    return manifest
+
+
+def append_records(store_path, features, labels, mapping=None):
+    """
+    Append records to a store, the manifest is only updated once the data is on disk
+        :param store_path (str): path to the store
+        :param features (ndarray): features of shape (num_records, frames, coefficients)
+        :param labels (ndarray): label of each record
+        :param mapping (list): names of the labels, replaces the mapping in the manifest if given
+        :return manifest (dict): updated manifest
+    """
+    manifest = load_manifest(store_path)
+    features = np.ascontiguousarray(features, dtype=FEATURES_DTYPE)
+    labels = np.ascontiguousarray(labels, dtype=LABELS_DTYPE)
+    if len(features) != len(labels):
+        raise ValueError("features and labels must have the same length")
+    if list(features.shape[1:]) != manifest["record_shape"]:
+        raise ValueError("expected records of shape {}, got {}".format(manifest["record_shape"],
+                                                                      list(features.shape[1:])))
+
+    for file_name, array in [(FEATURES_FILE, features), (LABELS_FILE, labels)]:
+        with open(os.path.join(store_path, file_name), "ab") as fp:
+            array.tofile(fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    if mapping is not None:
+        manifest["mapping"] = list(mapping)
+    counts = label_counts(labels, max(len(manifest["mapping"]), len(manifest["label_counts"])))
+    for i, count in enumerate(manifest["label_counts"]):
+        counts[i] += count
+    manifest["label_counts"] = counts
+    manifest["num_records"] += int(features.shape[0])
+    write_manifest(store_path, manifest)
+    return manifest
+
+
+def compact_store(store_path, keep, chunk_size=4096):
+    """
+    Rewrite a store keeping only some of its records
+        :param store_path (str): path to the store
+        :param keep (ndarray): indices of the records to keep, in the order to keep them
+        :param chunk_size (int): number of records copied at a time
+        :return manifest (dict): updated manifest
+    """
+    manifest = load_manifest(store_path)
+    X, y = load_dataset(store_path)
+    keep = np.asarray(keep, dtype=np.int64)
+
+    features_tmp = os.path.join(store_path, FEATURES_FILE + ".tmp")
+    labels_tmp = os.path.join(store_path, LABELS_FILE + ".tmp")
+    with open(features_tmp, "wb") as features_fp, open(labels_tmp, "wb") as labels_fp:
+        for start in range(0, len(keep), chunk_size):
+            indices = keep[start:start + chunk_size]
+            np.ascontiguousarray(X[indices]).tofile(features_fp)
+            np.ascontiguousarray(y[indices]).tofile(labels_fp)
+        new_labels = np.asarray(y[keep])
+    del X, y  # release the memory maps before replacing the files
+
+    os.replace(features_tmp, os.path.join(store_path, FEATURES_FILE))
+    os.replace(labels_tmp, os.path.join(store_path, LABELS_FILE))
+    manifest["num_records"] = int(len(keep))
+    manifest["label_counts"] = label_counts(new_labels, len(manifest["mapping"]))
+    write_manifest(store_path, manifest)
+    return manifest
+
+
+def save_view(view_path, store_path, indices, labels, mapping=None):
+    """
+    Save a subset of a store as a view, the features are not copied
+        :param view_path (str): folder to create the view in
+        :param store_path (str): path to the source store
+        :param indices (ndarray): indices of the records in the source store
+        :param labels (ndarray): new label of each record
+        :param mapping (list): names of the new labels
+        :return manifest (dict): manifest of the view
+    """
+    indices = np.ascontiguousarray(indices, dtype=INDICES_DTYPE)
+    labels = np.ascontiguousarray(labels, dtype=LABELS_DTYPE)
+    if len(indices) != len(labels):
+        raise ValueError("indices and labels must have the same length")
+    source = load_manifest(store_path)
+    if "view" in source:
+        raise ValueError("{} is a view, make views of the source store".format(store_path))
+
+    os.makedirs(view_path, exist_ok=True)
+    indices.tofile(os.path.join(view_path, INDICES_FILE))
+    labels.tofile(os.path.join(view_path, LABELS_FILE))
+
+    manifest = new_manifest(source["record_shape"], mapping, source["params"])
+    manifest["num_records"] = int(len(indices))
+    manifest["label_counts"] = label_counts(labels, len(manifest["mapping"]))
+    # the source path is relative to the view so the two can be moved together
+    manifest["view"] = {"source": os.path.relpath(store_path, view_path), "source_build_id": source["build_id"]}
+    write_manifest(view_path, manifest)
+    return manifest
+
+
+def view_source(view_path, manifest):
+    """
+    Path to the source store of a view, checking it wasn't rebuilt since the view was made
+        :param view_path (str): path to the view
+        :param manifest (dict): manifest of the view
+        :return (str): path to the source store
+    """
+    store_path = os.path.normpath(os.path.join(view_path, manifest["view"]["source"]))
+    if load_manifest(store_path)["build_id"] != manifest["view"]["source_build_id"]:
+        raise ValueError("{} was rebuilt after the view {} was made".format(store_path, view_path))
+    return store_path
+
+
+def load_view_indices(view_path):
+    """
+    Load the indices of the records of a view in its source store
+        :param view_path (str): path to the view
+        :return indices (ndarray): int64 indices
+    """
+    manifest = load_manifest(view_path)
+    return np.fromfile(os.path.join(view_path, INDICES_FILE), dtype=INDICES_DTYPE, count=manifest["num_records"])
+
+
+class DatasetWriter:
+    """
+    Streams records to a new store in fixed size chunks, so memory use doesn't
+    grow with the number of records. Only the small per record metadata is
+    kept in memory until the writer is closed.
+
+        with DatasetWriter(store_path, (frames, n_mfcc), mapping, params) as writer:
+            writer.append(mfcc, label)
+    """
+
+    def __init__(self, store_path, record_shape, mapping=None, params=None, chunk_records=CHUNK_RECORDS):
+        """
+        :param store_path (str): folder to create the store in
+        :param record_shape (tuple): shape of a single record
+        :param mapping (list): names of the labels
+        :param params (dict): parameters used to extract the features
+        :param chunk_records (int): number of records buffered before they are written
+        """
+        self.store_path = store_path
+        self.record_shape = tuple(record_shape)
+        self.mapping = mapping
+        self.features = np.empty((chunk_records,) + self.record_shape, dtype=FEATURES_DTYPE)
+        self.labels = np.empty(chunk_records, dtype=LABELS_DTYPE)
+        self.metadata = {}
+        self.num_buffered = 0
+        self.num_records = 0
+        create_store(store_path, record_shape, mapping, params)
+
+    def append(self, features, label, metadata=None):
+        """
+        Add a record to the store
+            :param features (ndarray): features of shape record_shape
+            :param label (int): label of the record
+            :param metadata (dict): per record information
+        """
+        self.features[self.num_buffered] = features
+        self.labels[self.num_buffered] = label
+        for key, value in (metadata or {}).items():
+            self.metadata.setdefault(key, []).append(value)
+        self.num_buffered += 1
+        self.num_records += 1
+        if self.num_buffered == len(self.features):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records to disk
+        """
+        if self.num_buffered:
+            append_records(self.store_path, self.features[:self.num_buffered], self.labels[:self.num_buffered],
+                           self.mapping)
+            self.num_buffered = 0
+
+    def close(self):
+        """
+        Write the remaining records and the metadata
+            :return manifest (dict): manifest of the store
+        """
+        self.flush()
+        if self.metadata:
+            save_metadata(self.store_path, self.metadata)
+        return load_manifest(self.store_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ViewRecords:
+    """
+    The records of a view, read from the memory-mapped source store only when
+    they are indexed, so loading a view copies nothing. Indexing works like
+    indexing the array of the view's records, np.asarray reads them all.
+    """
+
+    def __init__(self, source, indices):
+        """
+        :param source (ndarray): memory-mapped features of the source store
+        :param indices (ndarray): index in source of each record
+        """
+        self.source = source
+        self.indices = indices
+        self.shape = (len(indices),) + source.shape[1:]
+        self.dtype = source.dtype
+        self.ndim = source.ndim
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        keys = key if isinstance(key, tuple) else (key,)
+        if keys and isinstance(keys[0], (int, np.integer, slice, list, np.ndarray)) \
+                and not any(k is Ellipsis or k is None for k in keys):
+            # the first key picks records, only those are read
+            return self.source[(self.indices[keys[0]],) + keys[1:]]
+        # e.g. X[..., np.newaxis], the key doesn't start with the records so every record is read
+        return self.source[self.indices][key]
+
+    def __array__(self, dtype=None, copy=None):
+        records = self.source[self.indices]
+        return records if dtype is None else records.astype(dtype)
+
+
+def load_manifest(store_path):
+    """
+    Load the manifest of a store without touching the features
+        :param store_path (str): path to the store
+        :return manifest (dict): mapping, shapes and extraction parameters
+    """
+    with open(os.path.join(store_path, MANIFEST_FILE), "r") as fp:
+        manifest = json.load(fp)
+    return manifest
+
+
+def load_dataset_manifest(dataset_path):
+    """
+    Load the manifest of a feature store or an old JSON dataset file without
+    reading the features. A JSON file is parsed once and its manifest is kept
+    next to it, it is parsed again only if the file changes.
+        :param dataset_path (str): path to feature store or json file
+        :return manifest (dict): mapping, label counts and shapes
+    """
+    if is_store(dataset_path):
+        return load_manifest(dataset_path)
+
+    manifest_path = dataset_path + "." + MANIFEST_FILE
+    stat = os.stat(dataset_path)
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as fp:
+            manifest = json.load(fp)
+        if manifest.get("source") == source:
+            return manifest
+
+    X, y, mapping = load_json_dataset(dataset_path)
+    manifest = new_manifest(X.shape[1:], mapping)
+    manifest["num_records"] = int(X.shape[0])
+    manifest["label_counts"] = label_counts(y, len(mapping))
+    manifest["source"] = source
+    with open(manifest_path, "w") as fp:
+        json.dump(manifest, fp, indent=4)
+    return manifest
+
+
+def load_metadata(store_path):
+    """
+    Load the per record metadata of a store
+        :param store_path (str): path to the store
+        :return metadata (dict): lists of per record information, empty if none was saved
+    """
+    manifest = load_manifest(store_path)
+    if "view" in manifest:
+        indices = load_view_indices(store_path)
+        metadata = load_metadata(view_source(store_path, manifest))
+        return {key: [values[i] for i in indices] for key, values in metadata.items()}
+
+    metadata_path = os.path.join(store_path, METADATA_FILE)
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path, "r") as fp:
+        metadata = json.load(fp)
+    return metadata
+
+
+def load_labels(store_path):
+    """
+    Load only the labels of a store or view
+        :param store_path (str): path to the store
+        :return y (ndarray): labels
+    """
+    manifest = load_manifest(store_path)
+    return np.fromfile(os.path.join(store_path, LABELS_FILE), dtype=LABELS_DTYPE, count=manifest["num_records"])
+
+
+def load_dataset(store_path, mmap_mode="r"):
+    """
+    Load the features and labels of a store, for a view only its records are
+    read from the source store, when they are indexed
+        :param store_path (str): path to the store or view
+        :param mmap_mode (str): numpy memmap mode, None reads the arrays into memory
+        :return X (ndarray): features of shape (num_records, frames, coefficients), a ViewRecords for a
+            memory-mapped view
+        :return y (ndarray): labels
+    """
+    manifest = load_manifest(store_path)
+    if "view" in manifest:
+        X, y = load_dataset(view_source(store_path, manifest), mmap_mode=mmap_mode)
+        if mmap_mode is None:
+            return X[load_view_indices(store_path)], load_labels(store_path)
+        return ViewRecords(X, load_view_indices(store_path)), load_labels(store_path)
+
+    num_records = manifest["num_records"]
+    shape = (num_records,) + tuple(manifest["record_shape"])
+    features_path = os.path.join(store_path, FEATURES_FILE)
+    labels_path = os.path.join(store_path, LABELS_FILE)
+
+    # np.memmap can't map an empty file
+    if num_records == 0:
+        return np.zeros(shape, dtype=FEATURES_DTYPE), np.zeros(0, dtype=LABELS_DTYPE)
+
+    if mmap_mode is None:
+        X = np.fromfile(features_path, dtype=FEATURES_DTYPE, count=int(np.prod(shape))).reshape(shape)
+        y = np.fromfile(labels_path, dtype=LABELS_DTYPE, count=num_records)
+    else:
+        X = np.memmap(features_path, dtype=FEATURES_DTYPE, mode=mmap_mode, shape=shape)
+        y = np.memmap(labels_path, dtype=LABELS_DTYPE, mode=mmap_mode, shape=(num_records,))
+    return X, y
+
+
+def load_json_dataset(json_path, features_key="mfcc"):
+    """
+    Load one of the old JSON dataset files
+        :param json_path (str): path to json file
+        :param features_key (str): name of the features in the file
+        :return X (ndarray): inputs
+        :return y (ndarray): targets
+        :return mapping (list): names of the labels
+    """
+    with open(json_path, "r") as fp:
+        data = json.load(fp)
+
+    X = np.array(data[features_key], dtype=FEATURES_DTYPE)
+    y = np.array(data["labels"])
+    return X, y, data.get("mapping", [])
+
+
+def convert_json_dataset(json_path, store_path, params=None):
+    """
+    Convert one of the old JSON dataset files to a feature store
+        :param json_path (str): path to json file
+        :param store_path (str): folder to create the store in
+        :param params (dict): parameters used to extract the features
+    """
+    X, y, mapping = load_json_dataset(json_path)
+    save_dataset(store_path, X, y, mapping=mapping, params=params)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # convert old JSON datasets: python Feature_Store.py <json_path> <store_path>
+    convert_json_dataset(sys.argv[1], sys.argv[2])
+    print("Created store: ", sys.argv[2])
@@ -3,13 +3,10 @@ This code creates sine waves at the frequency of musical notes and
 adds some variance to them
 """
 
-import numpy as np
-import matplotlib.pyplot as plt
-import wave
-import struct
 import os
 import random
 from Notes_to_Frequency import notes_to_frequency
+from Wave_Writer import create_wav as write_note, write_notes
 
 random.seed(20)
 
@@ -20,31 +17,13 @@ parent_dir = ""
 # path = os.path.join(parent_dir, directory)
 path = directory
 sr = 44100.0  # sample rate (hertz)
+NUM_WORKERS = os.cpu_count()  # processes used to write notes
 
 
 def create_wav(filename, freq, sample_rate=44100.0,  amplitude=20):
     # y = A*sin(w*t + phase) = A*sin(2*pi*f*t + phase)
-    period = 1/sample_rate  # period for 1 sample
     t = 20  # how log to generate signal (seconds)
-    n = sr * t  # number of data points (time)
-
-    omega = 2*np.pi*freq  # angular frequency
-    t_seq = np.arange(n)*period
-
-    y = amplitude*np.sin(omega*t_seq)
-    #plt.plot(t_seq, y)
-    #plt.show()
-
-    obj = wave.open(filename+".wav", "w")
-    obj.setnchannels(1)  # mono
-    obj.setsampwidth(2)
-    obj.setframerate(sr)
-
-    for i in y:
-        print(i)
-        data = struct.pack("b", int(i))
-        obj.writeframesraw(data)
-    obj.close()
+    write_note(filename, freq, sample_rate=sample_rate, amplitude=amplitude, duration=t)
 
 
 if __name__ == "__main__":
@@ -55,22 +34,26 @@ if __name__ == "__main__":
     else:
         print("Already a directory")
 
+    # the random variations are drawn up front so the notes don't depend on which process writes them
+    notes = []
     for key, value in notes_to_frequency.items():
         # create notes directory
         note_path = os.path.join(path, key)
         if not os.path.exists(note_path):
             os.mkdir(note_path)
             # generate correct pitch signal
-            create_wav(filename=note_path+"\\" + key, sample_rate=sr, freq=value)
+            notes.append({"filename": os.path.join(note_path, key), "freq": value, "sample_rate": sr,
+                          "duration": 20})
             for j in range(10):
                 amplitude_random = random.randint(5, 20)
                 freq_shift = random.uniform(-10, 10)  # random float to change frequency
                 new_freq = value + freq_shift
                 # append a number up to 10 to identify modified data
-                create_wav(filename=note_path + "\\" + key + str(j),
-                           sample_rate=sr, freq=new_freq, amplitude=amplitude_random)
+                notes.append({"filename": os.path.join(note_path, key + str(j)), "freq": new_freq,
+                              "sample_rate": sr, "amplitude": amplitude_random, "duration": 20})
             print("Directory '% s' created" % key)
         else:
             print("Already a directory")
 
-
+    write_notes(notes, num_workers=NUM_WORKERS)
+    print("Created {} files".format(len(notes)))
@@ -0,0 +1,228 @@
+"""
+Karplus-Strong guitar string synthesis in NumPy/SciPy
+
+A port of kspluck.m and lagrange.m that runs in process, so notes can be
+created without starting the Matlab engine. Every step is the same as the
+Matlab code: the excitation is padded or cut to the note duration, passed
+through the pluck position comb filter, then through the string loop made of
+the loop filter and a Lagrange fractional delay. scipy.signal.lfilter is the
+same difference equation as Matlab's filter.
+
+Excitation signals are read once and kept in memory.
+"""
+
+import os
+import math
+from functools import lru_cache
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter
+
+SAMPLE_RATE = 44100
+NOTE_DURATION = 4  # seconds
+EXCITATION_PATH = os.path.dirname(os.path.abspath(__file__))  # folder with the excitation wav files
+# loop filter
+LOOP_B = [0.8995, 0.1087]
+LOOP_A = [1, 0.0136]
+
+
+def lagrange(n, delay):
+    """
+    Order n FIR filter that implements a delay in samples, port of lagrange.m
+        :param n (int): order of the filter
+        :param delay (float): delay in samples
+        :return h (ndarray): n + 1 filter coefficients
+    """
+    indices = np.arange(n + 1)
+    h = np.ones(n + 1)
+    for k in range(n + 1):
+        index = indices != k
+        h[index] = h[index] * (delay - k) / (indices[index] - k)
+    return h
+
+
+def matlab_round(x):
+    # Matlab rounds halves away from zero, np.round rounds them to even
+    return int(math.floor(abs(x) + 0.5) * (1 if x >= 0 else -1))
+
+
+def string_filter(f, fs, B, A):
+    """
+    Coefficients of the string loop of kspluck, they only depend on the note so
+    every variant of a note can share them
+        :param f (float): frequency
+        :param fs (int): sample rate
+        :param B (list): numerator coefficients of loop filter
+        :param A (list): denominator coefficients of loop filter
+        :return b1 (ndarray): numerator coefficients
+        :return a1 (ndarray): denominator coefficients
+    """
+    N = int(fs / f)  # fix rounds towards zero
+    hnum = np.asarray(B, dtype=np.float64)
+    hden = np.asarray(A, dtype=np.float64)
+
+    # lagrange interpolation filter to account for fractional delay
+    # (keeps the string in tune with the desired frequency)
+    l = lagrange(3, f / fs)
+
+    #     Hd(z)L(z)z^-N
+    b1 = np.concatenate([np.zeros(N), np.convolve(l, hden)])
+
+    #                Hd(z) - Hl(z)L(z)z^-N
+    a1 = np.concatenate([hden, np.zeros(N - len(hden)), -1 * np.convolve(hnum, l)])
+    return b1, a1
+
+
+def fit_excitation(excitation, num_samples):
+    """
+    Pad or cut an excitation signal to the note length
+        :param excitation (ndarray): string excitation signal
+        :param num_samples (int): length of the note
+        :return X (ndarray): float64 signal of num_samples
+    """
+    excitation = np.asarray(excitation, dtype=np.float64)
+    if len(excitation) <= num_samples:
+        return np.concatenate([excitation, np.zeros(num_samples - len(excitation))])
+    return excitation[:num_samples]
+
+
+def pluck_comb(p, N):
+    """
+    Numerator of the pluck position comb filter
+        :param p (float): pluck position along waveguide
+        :param N (int): length of the waveguide in samples
+        :return (ndarray): filter coefficients
+    """
+    # pluck location, zeros(1, p - 1) is empty for p < 1
+    p = matlab_round(p * N)
+    return np.concatenate([[1], np.zeros(max(p - 1, 0)), [-1]])
+
+
+def kspluck(f, length, fs, excitation, B, A, p):
+    """
+    Karplus-Strong model with additional parameters, port of kspluck.m
+        :param f (float): frequency
+        :param length (float): time in seconds
+        :param fs (int): sample rate
+        :param excitation (ndarray): string excitation signal
+        :param B (list): numerator coefficients of loop filter
+        :param A (list): denominator coefficients of loop filter
+        :param p (float): pluck position along waveguide (0 < p < 1 - fraction of waveguide length)
+        :return y (ndarray): synthesized note
+    """
+    # modify length of excitation signal to match desired duration
+    X = fit_excitation(excitation, int(length * fs))
+
+    b1, a1 = string_filter(f, fs, B, A)
+
+    P = lfilter(pluck_comb(p, int(fs / f)), 1, X)
+
+    # no initial conditions
+    y = lfilter(b1, a1, P)
+    return y
+
+
+def kspluck_batch(f, length, fs, excitations, B, A, pluck_positions):
+    """
+    kspluck for many excitations and pluck positions of the same note, the
+    string loop is built once and runs over every variant in one lfilter call
+        :param f (float): frequency
+        :param length (float): time in seconds
+        :param fs (int): sample rate
+        :param excitations (list): string excitation signals
+        :param B (list): numerator coefficients of loop filter
+        :param A (list): denominator coefficients of loop filter
+        :param pluck_positions (list): pluck positions
+        :return y (ndarray): notes of shape (len(excitations) * len(pluck_positions), samples),
+            pluck position changes fastest
+    """
+    num_samples = int(length * fs)
+    N = int(fs / f)
+    P = np.empty((len(excitations) * len(pluck_positions), num_samples))
+    for i, excitation in enumerate(excitations):
+        X = fit_excitation(excitation, num_samples)
+        for j, p in enumerate(pluck_positions):
+            P[i * len(pluck_positions) + j] = lfilter(pluck_comb(p, N), 1, X)
+
+    b1, a1 = string_filter(f, fs, B, A)
+    return lfilter(b1, a1, P, axis=-1)
+
+
+@lru_cache(maxsize=None)
+def load_excitation(excitation_signal):
+    """
+    Read an excitation signal like Matlab's audioread, only the first call reads the file
+        :param excitation_signal (str): name of a wav file in EXCITATION_PATH, or a path
+        :return excitation (ndarray): read only float64 signal of the first channel
+        :return fs (int): sample rate of the file
+    """
+    path = excitation_signal
+    if not os.path.exists(path):
+        path = os.path.join(EXCITATION_PATH, excitation_signal)
+    excitation, fs = sf.read(path, dtype="float64", always_2d=True)
+    excitation = excitation[:, 0]
+    excitation.setflags(write=False)
+    return excitation, fs
+
+
+def pluck(freq, pluck_position=0.9, excitation_signal="excite-picked-nodamp.wav", duration=NOTE_DURATION,
+          fs=SAMPLE_RATE):
+    """
+    Synthesize a note
+        :param freq (float): note frequency
+        :param pluck_position (float): simulate pluck position on guitar
+        :param excitation_signal (str): signal used to create the note
+        :param duration (float): note duration in seconds
+        :param fs (int): sample rate
+        :return signal (ndarray): synthesized note
+    """
+    excitation = load_excitation(excitation_signal)[0]
+    return kspluck(freq, duration, fs, excitation, LOOP_B, LOOP_A, pluck_position)
+
+
+def write_wav(filename, signal, fs=SAMPLE_RATE):
+    """
+    Write a note as a 32 bit float wav file, like audiowrite with 'BitsPerSample', 32
+        :param filename (str): path to the wav file
+        :param signal (ndarray): note to write
+        :param fs (int): sample rate
+    """
+    sf.write(filename, signal, fs, subtype="FLOAT")
+
+
+def compare_with_matlab(freq, pluck_position=0.9, excitation_signal="excite-picked-nodamp.wav",
+                        duration=NOTE_DURATION, fs=SAMPLE_RATE):
+    """
+    Synthesize a note with kspluck.m and with pluck and compare them sample for sample,
+    needs the Matlab engine and kspluck.m on the Matlab path
+        :param freq (float): note frequency
+        :param pluck_position (float): simulate pluck position on guitar
+        :param excitation_signal (str): signal used to create the note
+        :param duration (float): note duration in seconds
+        :param fs (int): sample rate
+        :return (float): largest absolute difference between the two notes
+    """
+    import matlab
+    import matlab.engine
+
+    eng = matlab.engine.start_matlab()
+    eng.cd(EXCITATION_PATH, nargout=0)
+    excitation = load_excitation(excitation_signal)[0]
+    expected = eng.kspluck(float(freq), float(duration), float(fs), matlab.double(excitation.tolist()),
+                           matlab.double(LOOP_B), matlab.double(LOOP_A), float(pluck_position))
+    eng.quit()
+    expected = np.asarray(expected, dtype=np.float64).ravel()
+    actual = pluck(freq, pluck_position, excitation_signal, duration, fs)
+    if expected.shape != actual.shape:
+        raise ValueError("expected {} samples, got {}".format(expected.shape, actual.shape))
+    return float(np.max(np.abs(expected - actual)))
+
+
+if __name__ == "__main__":
+    # check the port against kspluck.m for a spread of notes and pluck positions
+    for freq in [82.41, 440.00, 1318.51]:
+        for pluck_position in [0, 0.5, 0.9]:
+            for excitation_signal in ["excite-picked-nodamp.wav", "excite-plucked-nodamp.wav"]:
+                difference = compare_with_matlab(freq, pluck_position, excitation_signal)
+                print("{} Hz, pluck {}, {}: max difference {:.3g}".format(freq, pluck_position,
+                                                                         excitation_signal, difference))
@@ -0,0 +1,114 @@
+"""
+Synthesize a grid of notes x detunes x pluck positions x excitations
+
+Each note and detune is one task: its string loop filter is built once and
+every pluck position and excitation of it is filtered as one batch. Tasks are
+spread over a process pool. The notes are either written as wav files, named
+like Audio_Data_From_Matlab.play_style names them, or returned as one array
+for feature extraction.
+
+    signals, variants = sweep(notes_to_frequency, num_workers=os.cpu_count())
+    sweep(notes_to_frequency, output_path="Simulated_Dataset_Matlab_12frets", num_workers=os.cpu_count())
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Karplus_Strong import kspluck_batch, load_excitation, write_wav, SAMPLE_RATE, NOTE_DURATION, LOOP_B, LOOP_A
+
+PLUCK_POSITIONS = [0, 0.5, 0.7, 0.9]
+DETUNE_FREQUENCIES = [-2, -1, 0, 1, 2]
+EXCITATIONS = ["excite-picked-nodamp.wav", "excite-plucked-nodamp.wav"]
+STYLES = {"excite-picked-nodamp.wav": "Picked", "excite-plucked-nodamp.wav": "Plucked"}
+
+
+def file_name(note_name, freq_shift, excitation, pluck_position):
+    """
+    Name of the wav file of a note, the same as play_style creates
+        :param note_name (str): name of the note
+        :param freq_shift (float): detune in Hz
+        :param excitation (str): excitation signal
+        :param pluck_position (float): pluck position
+        :return (str): file name
+    """
+    pluck_str = str(int(float(pluck_position) * 10))  # remove decimal from pluck position
+    style = STYLES.get(excitation, "Plucked")
+    return note_name + "_" + str(freq_shift) + "_" + style + "_" + pluck_str + ".wav"
+
+
+def grid(notes, detunes=DETUNE_FREQUENCIES, pluck_positions=PLUCK_POSITIONS, excitations=EXCITATIONS):
+    """
+    Every variant of the sweep, in the order sweep returns them
+        :param notes (dict): note name -> frequency
+        :param detunes (list): frequency shifts in Hz
+        :param pluck_positions (list): pluck positions
+        :param excitations (list): excitation signals
+        :return variants (list): dict of note, frequency, detune, excitation and pluck_position per note
+    """
+    variants = []
+    for note_name, freq in notes.items():
+        for freq_shift in detunes:
+            for excitation in excitations:
+                for pluck_position in pluck_positions:
+                    variants.append({"note": note_name,
+                                     "frequency": freq + freq_shift,
+                                     "detune": freq_shift,
+                                     "excitation": excitation,
+                                     "pluck_position": float(pluck_position)})  # convert from numpy float
+    return variants
+
+
+def _synthesize(args):
+    # ProcessPoolExecutor.map only passes one argument
+    note_name, freq, freq_shift, pluck_positions, excitations, duration, fs, output_path = args
+    signals = kspluck_batch(freq + freq_shift, duration, fs, [load_excitation(e)[0] for e in excitations],
+                            LOOP_B, LOOP_A, pluck_positions)
+    if output_path is None:
+        return signals.astype(np.float32)
+
+    # workers write their own files so the notes aren't sent back to the main process
+    note_path = os.path.join(output_path, note_name)
+    os.makedirs(note_path, exist_ok=True)
+    paths = []
+    i = 0
+    for excitation in excitations:
+        for pluck_position in pluck_positions:
+            paths.append(os.path.join(note_path, file_name(note_name, freq_shift, excitation, pluck_position)))
+            write_wav(paths[-1], signals[i], fs)
+            i += 1
+    return paths
+
+
+def sweep(notes, detunes=DETUNE_FREQUENCIES, pluck_positions=PLUCK_POSITIONS, excitations=EXCITATIONS,
+          duration=NOTE_DURATION, fs=SAMPLE_RATE, output_path=None, num_workers=1):
+    """
+    Synthesize every variant of a grid of notes
+        :param notes (dict): note name -> frequency
+        :param detunes (list): frequency shifts in Hz
+        :param pluck_positions (list): pluck positions
+        :param excitations (list): excitation signals
+        :param duration (float): note duration in seconds
+        :param fs (int): sample rate
+        :param output_path (str): folder to write wav files to, one sub folder per note,
+            None returns the notes instead
+        :param num_workers (int): number of processes to use, None uses every core
+        :return signals (ndarray): float32 notes of shape (variants, samples), or the paths of
+            the wav files if output_path is given
+        :return variants (list): parameters of each note
+    """
+    variants = grid(notes, detunes, pluck_positions, excitations)
+    tasks = [(note_name, freq, freq_shift, list(pluck_positions), list(excitations), duration, fs, output_path)
+             for note_name, freq in notes.items() for freq_shift in detunes]
+
+    if num_workers == 1:
+        results = list(map(_synthesize, tasks))
+    else:
+        # map keeps the order of the tasks
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_synthesize, tasks))
+
+    if output_path is not None:
+        return [path for paths in results for path in paths], variants
+    if not results:
+        return np.zeros((0, int(duration * fs)), dtype=np.float32), variants
+    return np.concatenate(results), variants
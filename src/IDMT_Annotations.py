@@ -0,0 +1,118 @@
+"""
+Index of the IDMT-SMT-GUITAR annotations
+
+Every annotation XML of the dataset is parsed once with a streaming parser
+and the result is kept in a JSON index keyed by the audio file name (without
+extension). When the index is rebuilt only XML files that are new or whose
+modification time or size changed are parsed again.
+
+Each entry holds:
+    pitch, fretNumber, stringNumber - from the first note event of the file
+    folder                          - guitar/pickup folder the annotation is in
+    xml_path, mtime_ns, size        - source of the entry
+"""
+
+import os
+import json
+import xml.etree.ElementTree as ET
+
+INDEX_PATH = "IDMT_Annotation_Index.json"
+FIELDS = ["audioFileName", "pitch", "fretNumber", "stringNumber"]
+
+
+def parse_annotation(xml_path):
+    """
+    Read the fields of an annotation file, parsing stops once all of them are found
+        :param xml_path (str): path to annotation XML
+        :return annotation (dict): text of each field, None for missing fields
+    """
+    annotation = dict.fromkeys(FIELDS)
+    with open(xml_path, "rb") as fp:
+        for event, element in ET.iterparse(fp, events=("end",)):
+            if element.tag in annotation and annotation[element.tag] is None:
+                annotation[element.tag] = (element.text or "").strip()
+                if all(value is not None for value in annotation.values()):
+                    break
+            element.clear()
+    return annotation
+
+
+def guitar_folder(xml_path):
+    # annotations are stored as <guitar folder>/annotation/<file>.xml
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(xml_path))))
+
+
+def load_index(index_path=INDEX_PATH):
+    """
+    Load an annotation index
+        :param index_path (str): path to index file
+        :return index (dict): audio file name -> annotation, empty if there is no index
+    """
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, "r") as fp:
+        index = json.load(fp)
+    return index
+
+
+def build_index(dataset_path, index_path=INDEX_PATH):
+    """
+    Index every annotation XML of the dataset, reusing entries of files that haven't changed
+        :param dataset_path (str): path to the dataset folder
+        :param index_path (str): path to index file, None to not save the index
+        :return index (dict): audio file name -> annotation
+    """
+    old_index = load_index(index_path) if index_path is not None else {}
+    by_xml_path = {entry["xml_path"]: (name, entry) for name, entry in old_index.items()}
+
+    index = {}
+    num_parsed = 0
+    for dirpath, dirnames, filenames in os.walk(dataset_path):
+        for f in filenames:
+            if os.path.splitext(f)[1] != ".xml":
+                continue
+            xml_path = os.path.abspath(os.path.join(dirpath, f))
+            stat = os.stat(xml_path)
+
+            name, entry = by_xml_path.get(xml_path, (None, None))
+            if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                annotation = parse_annotation(xml_path)
+                if annotation["audioFileName"] is None or annotation["pitch"] is None:
+                    print("Skipping annotation without audio file name or pitch: ", xml_path)
+                    continue
+                name = os.path.splitext(annotation["audioFileName"])[0]
+                entry = {"pitch": int(annotation["pitch"]),
+                         "fretNumber": annotation["fretNumber"],
+                         "stringNumber": annotation["stringNumber"],
+                         "folder": guitar_folder(xml_path),
+                         "xml_path": xml_path,
+                         "mtime_ns": stat.st_mtime_ns,
+                         "size": stat.st_size}
+                num_parsed += 1
+            index[name] = entry
+
+    print("Annotations indexed: {}, parsed: {}".format(len(index), num_parsed))
+    if index_path is not None and (num_parsed or len(index) != len(old_index)):
+        with open(index_path + ".tmp", "w") as fp:
+            json.dump(index, fp)
+        os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+def join_annotations(file_paths, index):
+    """
+    Pair audio files with their annotations
+        :param file_paths (list): paths to audio files
+        :param index (dict): audio file name -> annotation
+        :return files (list): (file_path, annotation) for every file with an annotation
+        :return missing (list): paths of files without an annotation
+    """
+    files = []
+    missing = []
+    for file_path in file_paths:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        if name in index:
+            files.append((file_path, index[name]))
+        else:
+            missing.append(file_path)
+    return files, missing
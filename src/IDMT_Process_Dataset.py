@@ -1,92 +1,86 @@
 
 import os
-import xml.etree.cElementTree as ET
-from bs4 import BeautifulSoup
-import librosa
 import math
-import json
-import pandas as pd
-import numpy as np
+from Feature_Store import DatasetWriter
+from Feature_Extraction import extract_dataset_files
+from Build_Journal import incremental_build
+from IDMT_Annotations import build_index, join_annotations
+from Metadata_Index import idmt_metadata
 #import pandas_read_xml as pdx
 
 DATASET_PATH = "IDMT-SMT-GUITAR_V2_Dataset/dataset1"
-JSON_PATH = "Dataset_JSON_Files/IDMT-SMT-GUITAR_V2_Dataset.json"
+STORE_PATH = "Dataset_Files/IDMT-SMT-GUITAR_V2_Dataset"
+INDEX_PATH = "Dataset_Files/IDMT-SMT-GUITAR_V2_Annotation_Index.json"  # parsed annotations
 SAMPLE_RATE = 22050
 DURATION = 1  # length of audio files measured in seconds
 NUM_SEGMENTS = 1
+NUM_WORKERS = os.cpu_count()  # processes used to extract features, 1 runs serially
+CACHE_PATH = "Feature_Cache"  # folder to cache features in, None disables the cache
+MAX_CACHE_SIZE = 2 * 1024 ** 3  # bytes
+INCREMENTAL = True  # only featurize new or changed files, resumes interrupted builds
 SAMPLES_PER_TRACK = SAMPLE_RATE * DURATION
 deleted = []
 
 
-def save_mfcc(dataset_path, json_path, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=1):
-    # dictionary to store data
-    dataset = {"audioFileName": [],
-               "mfcc": [],
-               "labels": [],
-               "fretNumber": [],
-               "stringNumber": []
-               }
+def save_mfcc(dataset_path, store_path, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=1, num_workers=1,
+              cache_path=None, max_cache_size=MAX_CACHE_SIZE, incremental=False, index_path=INDEX_PATH):
+    wav_paths = []
 
     num_samples_per_segment = int(SAMPLES_PER_TRACK / num_segments)
     expected_num_mfcc_vectors_per_segment = math.ceil(num_samples_per_segment / hop_length)
     print("expected_num_mfcc_vectors_per_segment: ", expected_num_mfcc_vectors_per_segment)
+
+    # annotations keyed by the name (without extension) of the audio file they describe,
+    # only new or changed XML files are parsed
+    annotations = build_index(dataset_path, index_path)
+
     # Loop through all the data
     for i, (dirpath, dirnames, filenames) in enumerate(os.walk(dataset_path)):
         # dirpath = current folder path
         # dirnames = subfolders in dirpath
         # filenames = all files in dirpath
-        #print(dirnames)
         # ensure that we're not at the root level (Audio folder)
-
-        """
-        for name in filenames:
-            if "G53-40100-1111-00001.xml" in name:
-                print(os.path.abspath(os.path.join(dirpath, name)))
-        """
         if dirpath is not dataset_path:
-            # process files for specific note
-            for f in range(len(filenames)):
-                # split file name into name and extension
-                split_tup = os.path.splitext(filenames[f])
-                file_path = os.path.abspath(os.path.join(dirpath, filenames[f]))
-                if split_tup[1] == ".xml":
-                    # get absolute path of file
-                    print(file_path)
-                    with open(file_path, "r") as fp:
-                        data = fp.read()
-
-                    # get data into processable format
-                    soup = BeautifulSoup(data, "xml")
-                    dataset["audioFileName"].append(soup.audioFileName.text)
-                    dataset["labels"].append(int(soup.pitch.text))
-                    dataset["fretNumber"].append(soup.fretNumber.text)
-                    dataset["stringNumber"].append(soup.stringNumber.text)
-                elif split_tup[1] == ".wav":
-                    # load audio file
-                    signal, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=DURATION)
-                    # process segments extracting mfcc and storing data
-                    for s in range(num_segments):
-                        start_sample = num_samples_per_segment * s  # s=0 -> 0
-                        finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
-                        mfcc = librosa.feature.mfcc(signal[start_sample:finish_sample],
-                                                    sr=sr,
-                                                    n_fft=n_fft,
-                                                    n_mfcc=n_mfcc,
-                                                    hop_length=hop_length)
-                        mfcc = mfcc.T  # TODO find out why this is better to work with
-
-                        # store mfcc for segment if it has expected length
-                        if len(mfcc) == expected_num_mfcc_vectors_per_segment:
-                            dataset["mfcc"].append(mfcc.tolist())  # can't save numpy arrays
-                        else:
-                            deleted.append(file_path)
-
-        # print(dataset)
-
-    with open(json_path, "w") as fp:
-        json.dump(dataset, fp, indent=4)
+            for f in filenames:
+                if os.path.splitext(f)[1] == ".wav":
+                    wav_paths.append(os.path.abspath(os.path.join(dirpath, f)))
 
-        """
+    # pair every audio file with its annotation by file name
+    joined, missing = join_annotations(wav_paths, annotations)
+    deleted.extend(missing)
+    files = []
+    for file_path, annotation in joined:
+        files.append((file_path, annotation["pitch"], idmt_metadata(file_path, annotation)))
+
+    # process segments extracting mfcc and storing data
+    params = {
+        "sample_rate": SAMPLE_RATE,
+        "duration": DURATION,
+        "n_mfcc": n_mfcc,
+        "n_fft": n_fft,
+        "hop_length": hop_length,
+        "num_segments": num_segments
+    }
+
+    def extract(paths, content_hashes=None):
+        return extract_dataset_files(paths, num_workers=num_workers, cache_path=cache_path,
+                                     max_cache_size=max_cache_size, content_hashes=content_hashes, **params)
+
+    if incremental:
+        incremental_build(store_path, files, extract, (expected_num_mfcc_vectors_per_segment, n_mfcc),
+                          params=params)
+        return
+
+    # records are written to the store in chunks as they are produced
+    with DatasetWriter(store_path, (expected_num_mfcc_vectors_per_segment, n_mfcc), params=params) as writer:
+        for (file_path, label, annotation), segments in zip(files, extract([f[0] for f in files])):
+            # store mfcc for segments with the expected length
+            for s, mfcc in segments:
+                writer.append(mfcc, label, annotation)
+            if len(segments) < num_segments:
+                deleted.append(file_path)
+
+    """
         # Reading the data inside the xml file to a variable under the name  data
         with open("IDMT-SMT-GUITAR_V2_Dataset/dataset1/"
                          "Fender Strat Clean Neck SC/annotation/"
@@ -136,6 +130,7 @@ def save_mfcc(dataset_path, json_path, n_mfcc=13, n_fft=2048, hop_length=512, nu
 
 
 if __name__ == "__main__":
-    save_mfcc(DATASET_PATH, JSON_PATH, num_segments=NUM_SEGMENTS)
+    save_mfcc(DATASET_PATH, STORE_PATH, num_segments=NUM_SEGMENTS, num_workers=NUM_WORKERS,
+              cache_path=CACHE_PATH, incremental=INCREMENTAL)
     print(deleted)
 
@@ -0,0 +1,291 @@
+"""
+Local inference server
+
+Keeps the models of CNN_Model_Files and LSTM_Model_Files loaded through the
+model registry, so a prediction doesn't pay for importing TensorFlow and
+loading the .h5 file. Requests that arrive at the same time are coalesced
+into micro-batches: a batch is run once MAX_BATCH_SIZE requests are waiting
+or MAX_WAIT seconds after the first one arrived.
+
+    python Inference_Server.py
+
+    GET  /models   -> {"models": [names]}
+    POST /predict  <- {"model": name, "mfcc": [[...]]} or {"model": name, "audio": [...], "sample_rate": 44100}
+                   -> {"predicted_index": i, "predicted_note": note, "probabilities": [...]}
+
+Audio is resampled to SAMPLE_RATE, padded or cut to the length the model was
+trained on and its MFCCs are extracted like the dataset builders do.
+"""
+
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import librosa
+from MFCC_Engine import batch_mfcc
+from Model_Registry import ModelRegistry, REGISTRY_PATH, MODEL_PATHS
+
+HOST = "127.0.0.1"
+PORT = 8500
+MAX_BATCH_SIZE = 64
+MAX_WAIT = 0.01  # seconds a request waits for others to join its batch
+REQUEST_TIMEOUT = 30  # seconds a request waits for its prediction
+SAMPLE_RATE = 22050
+DURATION = 4  # length of the training clips in seconds
+N_MFCC = 13
+N_FFT = 2048
+HOP_LENGTH = 512
+
+
+class MicroBatcher:
+    """
+    Runs a model on batches of the requests waiting for it, in a thread of its own
+    """
+
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+        """
+        :param model: Keras model
+        :param max_batch_size (int): most requests run in one batch
+        :param max_wait (float): seconds to wait for a batch to fill after the first request
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.closing = False  # set by close, no more requests are accepted
+        self.closed = False  # set by the thread once it has seen the end of the queue
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, features):
+        """
+        Queue a sample for prediction
+            :param features (ndarray): input of the model for one sample
+            :return (Future): resolves to the probabilities of the sample
+        """
+        future = Future()
+        with self.lock:
+            # checked under the lock so nothing can be queued after the end of the queue
+            if self.closing:
+                raise RuntimeError("the batcher is closed")
+            self.requests.put((features, future))
+        return future
+
+    def close(self):
+        """
+        Stop the thread once the requests already queued are done
+        """
+        with self.lock:
+            if not self.closing:
+                self.closing = True
+                self.requests.put(None)
+
+    def next_batch(self):
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self.closed = True
+                break
+            batch.append(request)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+        return batch
+
+    def run(self):
+        while not self.closed:
+            batch = self.next_batch()
+            if not batch:
+                continue
+            try:
+                prediction = np.asarray(self.model.predict_on_batch(np.stack([features for features, _ in batch])))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), probabilities in zip(batch, prediction):
+                future.set_result(probabilities)
+
+
+class ModelPool:
+    """
+    A micro-batcher for every model of the registry that is in use
+    """
+
+    def __init__(self, registry, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+        """
+        :param registry (ModelRegistry): registry the models are loaded from, the pool takes its on_evict
+        :param max_batch_size (int): most requests run in one batch
+        :param max_wait (float): seconds to wait for a batch to fill after the first request
+        """
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batchers = {}
+        self.lock = threading.Lock()
+        registry.on_evict = self.release
+
+    def release(self, name, model):
+        """
+        Close and drop the batcher of a model the registry evicted, so nothing keeps the model in memory
+            :param name (str): model name
+            :param model: the evicted model
+        """
+        with self.lock:
+            if name in self.batchers and self.batchers[name].model is model:
+                self.batchers.pop(name).close()
+
+    def get(self, name):
+        """
+        Micro-batcher of a model, replaced when the registry reloads the model
+            :param name (str): model name
+            :return (MicroBatcher): batcher of the loaded model
+            :return labels (list): names of the notes
+        """
+        while True:
+            # loading a model can take seconds, requests for the other models don't wait for it
+            model, labels = self.registry.get(name)
+            with self.lock:
+                if not self.registry.is_loaded(name, model):
+                    continue  # evicted or reloaded in the meantime, a batcher would keep it alive
+                if name not in self.batchers or self.batchers[name].model is not model:
+                    if name in self.batchers:
+                        self.batchers[name].close()
+                    self.batchers[name] = MicroBatcher(model, self.max_batch_size, self.max_wait)
+                return self.batchers[name], labels
+
+    def predict(self, name, features=None, audio=None, sample_rate=SAMPLE_RATE, timeout=REQUEST_TIMEOUT):
+        """
+        Predict the note of one sample
+            :param name (str): model name
+            :param features (ndarray): MFCCs of shape (frames, n_mfcc)
+            :param audio (ndarray): raw audio, used if features is None
+            :param sample_rate (int): sample rate of audio
+            :param timeout (float): seconds to wait for the prediction
+            :return result (dict): predicted index, note and probabilities
+        """
+        batcher, labels = self.get(name)
+        input_shape = tuple(batcher.model.input_shape[1:])
+        if features is None:
+            features = audio_features(audio, sample_rate, input_shape[0])
+        features = np.asarray(features, dtype=np.float32).reshape(input_shape)  # adds the CNN channel axis
+        try:
+            future = batcher.submit(features)
+        except RuntimeError:
+            # the model was reloaded since the batcher was taken, submit to the new one
+            batcher, labels = self.get(name)
+            future = batcher.submit(features)
+        probabilities = future.result(timeout=timeout)
+
+        predicted_index = int(np.argmax(probabilities))
+        return {"predicted_index": predicted_index,
+                "predicted_note": labels[predicted_index] if predicted_index < len(labels) else None,
+                "probabilities": probabilities.tolist()}
+
+
+def clip_samples(frames, max_segments=10):
+    """
+    Length of the training clips of a model, a whole DURATION clip or one of its segments like Save_dataset cuts
+        :param frames (int): number of frames the model takes
+        :param max_segments (int): most segments per clip looked for
+        :return (int): samples per clip
+    """
+    for num_segments in range(1, max_segments + 1):
+        num_samples = int(SAMPLE_RATE * DURATION / num_segments)
+        if 1 + num_samples // HOP_LENGTH == frames:
+            return num_samples
+    return (frames - 1) * HOP_LENGTH  # not cut from DURATION clips, the shortest length giving frames
+
+
+def audio_features(audio, sample_rate, frames):
+    """
+    MFCCs of a clip of raw audio, padded or cut to the number of frames the model expects
+        :param audio (ndarray): raw audio
+        :param sample_rate (int): sample rate of audio
+        :param frames (int): number of frames
+        :return (ndarray): MFCCs of shape (frames, n_mfcc)
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if sample_rate != SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=SAMPLE_RATE)
+    num_samples = clip_samples(frames)
+    audio = np.pad(audio[:num_samples], (0, max(0, num_samples - len(audio))))
+    return batch_mfcc(audio[np.newaxis], sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)[0]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    pool = None  # set by serve
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/models":
+            self.send_json(200, {"models": self.pool.registry.names()})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            result = self.pool.predict(request["model"], features=request.get("mfcc"), audio=request.get("audio"),
+                                       sample_rate=request.get("sample_rate", SAMPLE_RATE))
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except FutureTimeout:
+            self.send_json(504, {"error": "the prediction timed out"})
+            return
+        except Exception as e:
+            # e.g. a model that fails to load or to run, the client still gets an answer
+            self.send_json(500, {"error": "{}: {}".format(type(e).__name__, e)})
+            return
+        self.send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass  # a line per request would slow down busy servers
+
+
+def serve(host=HOST, port=PORT, registry_path=REGISTRY_PATH, model_paths=MODEL_PATHS,
+          max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+    """
+    Run the inference server until interrupted
+        :param host (str): address to listen on
+        :param port (int): port to listen on
+        :param registry_path (str): json file of registered models, with the datasets they were trained on
+        :param model_paths (list): folders of .h5 models
+        :param max_batch_size (int): most requests run in one batch
+        :param max_wait (float): seconds to wait for a batch to fill after the first request
+    """
+    registry = ModelRegistry(registry_path, model_paths)
+    RequestHandler.pool = ModelPool(registry, max_batch_size, max_wait)
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    print("Serving {} models on http://{}:{}".format(len(registry.names()), host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,177 @@
+"""
+tf.data input pipeline over a feature store
+
+Only record indices are split and shuffled, the features stay memory-mapped
+in the store and each batch is read when the pipeline asks for it, so the
+dataset size isn't limited by RAM. Batches are read in parallel, the channel
+axis for the CNN is added per batch and the next batches are prefetched while
+the model trains.
+
+    train_dataset, validation_dataset, test_indices = prepare_pipelines(DATASET_PATH, 0.25, 0.2, BATCH_SIZE)
+    model.fit(train_dataset, validation_data=validation_dataset, epochs=EPOCHS)
+"""
+
+import os
+import json
+import numpy as np
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+from Feature_Store import load_manifest, load_dataset, load_labels, load_view_indices, view_source
+
+SHUFFLE_BUFFER = 10000  # record indices held by the shuffle buffer
+SPLIT_SUFFIX = "_Split.json"  # saved next to a model, the records it was trained, validated and tested on
+
+
+def open_store(store_path):
+    """
+    Memory-map a store without reading the features, for a view the source store is mapped
+        :param store_path (str): path to the store or view
+        :return X (ndarray): memory-mapped features of the source store
+        :return record_indices (ndarray): index in X of each record, None for a store
+        :return y (ndarray): labels
+    """
+    manifest = load_manifest(store_path)
+    if "view" in manifest:
+        X = load_dataset(view_source(store_path, manifest))[0]
+        return X, load_view_indices(store_path), load_labels(store_path)
+    X, y = load_dataset(store_path)
+    return X, None, np.asarray(y)
+
+
+def split_indices(num_records, test_size, validation_size, seed=None):
+    """
+    Split record indices into train, validation and test sets, like the two
+    train_test_split calls of prepare_datasets but without copying features
+        :param num_records (int): number of records
+        :param test_size (float): fraction of the records for the test set
+        :param validation_size (float): fraction of the rest for the validation set
+        :param seed (int): random seed, None for a different split every time
+        :return (tuple): train, validation and test indices
+    """
+    indices = np.arange(num_records)
+    train_indices, test_indices = train_test_split(indices, test_size=test_size, random_state=seed)
+    train_indices, validation_indices = train_test_split(train_indices, test_size=validation_size,
+                                                         random_state=seed)
+    return train_indices, validation_indices, test_indices
+
+
+def split_path(model_path):
+    return os.path.splitext(model_path)[0] + SPLIT_SUFFIX
+
+
+def save_split(model_path, dataset_path, train_indices, validation_indices, test_indices):
+    """
+    Save the split a model was trained with next to it, so it can be evaluated on its own test set later
+        :param model_path (str): path to the .h5 model
+        :param dataset_path (str): feature store or json dataset the indices are records of
+        :param train_indices (ndarray): training records
+        :param validation_indices (ndarray): validation records
+        :param test_indices (ndarray): test records
+    """
+    split = {"dataset": dataset_path,
+             "train": np.asarray(train_indices).tolist(),
+             "validation": np.asarray(validation_indices).tolist(),
+             "test": np.asarray(test_indices).tolist()}
+    with open(split_path(model_path), "w") as fp:
+        json.dump(split, fp)
+
+
+def load_split(model_path):
+    """
+    Load the split saved with a model
+        :param model_path (str): path to the .h5 model
+        :return (tuple): train, validation and test indices, None if no split was saved with the model
+    """
+    if not os.path.exists(split_path(model_path)):
+        return None
+    with open(split_path(model_path), "r") as fp:
+        split = json.load(fp)
+    return tuple(np.asarray(split[key], dtype=np.int64) for key in ["train", "validation", "test"])
+
+
+def read_records(X, record_indices, y, indices):
+    """
+    Read some records of a store
+        :param X (ndarray): memory-mapped features
+        :param record_indices (ndarray): index in X of each record, None for a store
+        :param y (ndarray): labels
+        :param indices (ndarray): records to read
+        :return X (ndarray): float32 features
+        :return y (ndarray): int32 labels
+    """
+    # the order within a batch doesn't matter, sorted indices read the file front to back
+    indices = np.sort(np.asarray(indices, dtype=np.int64))
+    rows = indices if record_indices is None else record_indices[indices]
+    return np.asarray(X[rows], dtype=np.float32), np.asarray(y[indices], dtype=np.int32)
+
+
+def make_dataset(store_path, indices, batch_size=32, shuffle_buffer=None, channel=False, seed=None):
+    """
+    tf.data pipeline reading batches of records from a store
+        :param store_path (str): path to the store or view
+        :param indices (ndarray): records to use
+        :param batch_size (int): records per batch
+        :param shuffle_buffer (int): size of the shuffle buffer, None doesn't shuffle
+        :param channel (bool): add a channel axis for the CNN
+        :param seed (int): shuffle seed
+        :return dataset (tf.data.Dataset): (X, y) batches
+    """
+    X, record_indices, y = open_store(store_path)
+    record_shape = X.shape[1:]
+
+    def read_batch(batch_indices):
+        features, labels = tf.numpy_function(lambda i: read_records(X, record_indices, y, i), [batch_indices],
+                                             [tf.float32, tf.int32])
+        features.set_shape((None,) + tuple(record_shape))
+        labels.set_shape((None,))
+        if channel:
+            features = features[..., tf.newaxis]
+        return features, labels
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(read_batch, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def prepare_pipelines(store_path, test_size, validation_size, batch_size=32, shuffle_buffer=SHUFFLE_BUFFER,
+                      channel=False, seed=None, split=None):
+    """
+    Train and validation pipelines over a store and the indices of its test set
+        :param store_path (str): path to the store or view
+        :param test_size (float): fraction of the records for the test set
+        :param validation_size (float): fraction of the rest for the validation set
+        :param batch_size (int): records per batch
+        :param shuffle_buffer (int): size of the shuffle buffer of the training set
+        :param channel (bool): add a channel axis for the CNN
+        :param seed (int): random seed of the split and shuffle
+        :param split (tuple): train, validation and test indices to use instead of a new split
+        :return train_dataset (tf.data.Dataset): shuffled training batches
+        :return validation_dataset (tf.data.Dataset): validation batches
+        :return test_indices (ndarray): records of the test set, see load_records
+    """
+    if split is None:
+        split = split_indices(load_manifest(store_path)["num_records"], test_size, validation_size, seed)
+    train_indices, validation_indices, test_indices = split
+    train_dataset = make_dataset(store_path, train_indices, batch_size, shuffle_buffer, channel, seed)
+    validation_dataset = make_dataset(store_path, validation_indices, batch_size, channel=channel)
+    return train_dataset, validation_dataset, test_indices
+
+
+def load_records(store_path, indices, channel=False):
+    """
+    Read some records of a store into memory, e.g. the test set
+        :param store_path (str): path to the store or view
+        :param indices (ndarray): records to read
+        :param channel (bool): add a channel axis for the CNN
+        :return X (ndarray): features
+        :return y (ndarray): labels
+    """
+    X, record_indices, y = open_store(store_path)
+    rows = indices if record_indices is None else record_indices[indices]
+    X = np.asarray(X[rows], dtype=np.float32)
+    if channel:
+        X = X[..., np.newaxis]
+    return X, np.asarray(y[indices])
@@ -5,14 +5,15 @@ from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, accuracy_s
     precision_score, recall_score, f1_score, classification_report
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
 from sklearn.model_selection import GridSearchCV
 import tensorflow.keras as keras
 from tensorflow.keras.utils import plot_model
+from Feature_Store import is_store, load_dataset_manifest, load_dataset
+from Input_Pipeline import prepare_pipelines, load_records, split_indices, save_split
 from tensorflow.keras.wrappers.scikit_learn import KerasClassifier
 
 
-DATASET_PATH = "src/Datasets/Dataset_JSON_Files/Simulated_Dataset_Matlab_12frets_1.json"
+DATASET_PATH = "src/Datasets/Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
 MODEL_PATH = "src/LSTM/LSTM_Model_Files/LSTM_Model_Simulated_Dataset_Matlab_12frets_1.h5"
 PLOT_TITLE = "Simulated_Dataset_Matlab_12frets_1"  # Dataset name to be used in graph titles
 RESULTS_PATH = "LSTM_Results/"
@@ -25,6 +26,8 @@ LEARNING_RATE = 0.0001
 LOSS = "sparse_categorical_crossentropy"
 BATCH_SIZE = 4
 EPOCHS = 10
+# stream batches from the store with tf.data instead of loading it into memory, needs a feature store
+INPUT_PIPELINE = False
 
 param_grid = {"batch_size": [4, 8, 16, 32],
               "epochs": [25, 50, 75, 100, 125, 150],
@@ -42,21 +45,22 @@ def get_nth_key(dictionary, n=0):
 
 
 def get_mappings(dataset_path):
-    with open(dataset_path, "r") as fp:
-        data = json.load(fp)
-
-    mapping = data["mapping"]
-    return mapping
+    # only reads the manifest, not the features
+    return load_dataset_manifest(dataset_path)["mapping"]
 
 
 def load_data(dataset_path):
     """
-    Loads training dataset from json file.
-        :param data_path (str): Path to json file containing data
+    Loads training dataset from a feature store or json file.
+        :param data_path (str): Path to feature store or json file containing data
         :return X (ndarray): Inputs
         :return y (ndarray): Targets
     """
 
+    if is_store(dataset_path):
+        # memory-mapped, nothing is read until it is used
+        return load_dataset(dataset_path)
+
     with open(dataset_path, "r") as fp:
         data = json.load(fp)
 
@@ -95,11 +99,12 @@ def plot_history(history, plt_title=""):
     plt.show()
 
 #TODO verify docstring makes is similar to CNN
-def prepare_datasets(test_size, validation_size):
+def prepare_datasets(test_size, validation_size, split=None):
     """
     Loads data and splits it into train, validation and test sets.
         :param test_size (float): Value in [0, 1] indicating percentage of data set to allocate to test split
         :param validation_size (float): Value in [0, 1] indicating percentage of train set to allocate to validation split
+        :param split (tuple): train, validation and test indices to use instead of a new split
         :return X_train (ndarray): Input training set
         :return X_validation (ndarray): Input validation set
         :return X_test (ndarray): Input test set
@@ -111,11 +116,12 @@ def prepare_datasets(test_size, validation_size):
     # load data
     X, y = load_data(DATASET_PATH)
 
-    # create train, validation and test split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size)
-
-    # create train/validation split
-    X_train, X_validation, y_train, y_validation = train_test_split(X_train, y_train, test_size=validation_size)
+    # create train, validation and test split of the record indices, so the split can be saved with the model
+    if split is None:
+        split = split_indices(len(X), test_size, validation_size)
+    train_indices, validation_indices, test_indices = split
+    X_train, X_validation, X_test = X[train_indices], X[validation_indices], X[test_indices]
+    y_train, y_validation, y_test = y[train_indices], y[validation_indices], y[test_indices]
 
     return X_train, X_validation, X_test, y_train, y_validation, y_test
 
@@ -146,6 +152,30 @@ def build_model(input_shape, num_notes, dropout=0.0):
     return model
 
 
+def build_streaming_model(model, batch_size=1):
+    """Stateful copy of a trained build_model network for streaming, the LSTM
+    state is carried between calls so each call only needs the new frames
+    :param model: trained RNN-LSTM model
+    :param batch_size (int): number of streams run side by side
+    :return streaming_model: model taking (batch_size, frames, mfcc_coefficients) and returning a
+        prediction for every frame, call reset_states() to start a new stream
+    """
+    units = [layer.units for layer in model.layers if isinstance(layer, keras.layers.LSTM)]
+    dense = [layer for layer in model.layers if isinstance(layer, keras.layers.Dense)]
+
+    streaming_model = keras.Sequential()
+    # any number of frames per call, return sequences so every frame gets a prediction
+    streaming_model.add(keras.layers.LSTM(units[0], batch_input_shape=(batch_size, None, model.input_shape[-1]),
+                                          return_sequences=True, stateful=True))
+    streaming_model.add(keras.layers.LSTM(units[1], return_sequences=True, stateful=True))
+    streaming_model.add(keras.layers.Dense(dense[0].units, activation='relu'))
+    # dropout does nothing at inference so it is left out
+    streaming_model.add(keras.layers.Dense(dense[1].units, activation='softmax'))
+
+    streaming_model.set_weights(model.get_weights())
+    return streaming_model
+
+
 #TODO complete function and docstring
 def predict(model, X, y):
     """
@@ -167,13 +197,18 @@ def predict(model, X, y):
     return predicted_index, prediction
 
 
-LABELS = get_mappings(DATASET_PATH)
-
-
 if __name__ == "__main__":
-
-    # create training, validation and test sets
-    X_train, X_validation, X_test, y_train, y_validation, y_test = prepare_datasets(0.25, 0.2)
+    LABELS = get_mappings(DATASET_PATH)
+
+    # create training, validation and test sets, the split is saved with the model
+    split = split_indices(load_dataset_manifest(DATASET_PATH)["num_records"], 0.25, 0.2)
+    if INPUT_PIPELINE:
+        train_dataset, validation_data, test_indices = prepare_pipelines(DATASET_PATH, 0.25, 0.2, BATCH_SIZE,
+                                                                         split=split)
+        X_test, y_test = load_records(DATASET_PATH, test_indices)
+    else:
+        X_train, X_validation, X_test, y_train, y_validation, y_test = prepare_datasets(0.25, 0.2, split)
+        validation_data = (X_validation, y_validation)
     # quick and dirty load of dataset
     """
     with open("Dataset_Augmented_JSON_Files/Hybrid_Limited_Dataset.json", "r") as fp:
@@ -189,7 +224,7 @@ if __name__ == "__main__":
     """
 
     # Build LSTM
-    input_shape = (X_train.shape[1], X_train.shape[2]) # 130, 13 [number of slices, mfcc coeffceints]
+    input_shape = (X_test.shape[1], X_test.shape[2]) # 130, 13 [number of slices, mfcc coeffceints]
 
     callback = keras.callbacks.EarlyStopping(monitor='loss', patience=10)
     model = build_model(input_shape, NUMBER_OF_NOTES, DROPOUT)
@@ -207,8 +242,11 @@ if __name__ == "__main__":
     model.summary()
 
     # train the model
-    history = model.fit(X_train, y_train, validation_data=(X_validation, y_validation),
-                        batch_size=BATCH_SIZE, epochs=EPOCHS, callbacks=[callback])
+    if INPUT_PIPELINE:
+        history = model.fit(train_dataset, validation_data=validation_data, epochs=EPOCHS, callbacks=[callback])
+    else:
+        history = model.fit(X_train, y_train, validation_data=validation_data,
+                            batch_size=BATCH_SIZE, epochs=EPOCHS, callbacks=[callback])
 
     # plot accuracy/error for training and validation
     plot_history(history, plt_title=PLOT_TITLE)
@@ -219,6 +257,7 @@ if __name__ == "__main__":
 
     # save model
     model.save(MODEL_PATH)
+    save_split(MODEL_PATH, DATASET_PATH, *split)
 
     # make prediction on a samples
     predicted_index, pred = predict(model, X_test, y_test)
@@ -7,25 +7,20 @@ expected index, the model must be provided with the correct data.
 # TODO calculate confusion matrix metrics
 
 import numpy as np
-import pandas as pd
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, accuracy_score, \
-    precision_score, recall_score, f1_score, classification_report
-import seaborn as sns
 from tensorflow.keras.models import load_model
-import matplotlib.pyplot as plt
 from LSTM import load_data
 from LSTM import predict
 from LSTM import get_mappings
+from Prediction_Writer import PredictionWriter
 
 
-MODEL_DATASET_PATH = "Dataset_JSON_Files/Simulated_Dataset_Matlab_12frets_1.json"
-DATASET_PATH = "Dataset_JSON_Files/Only_A4_Recorded_1.json"  # data used for predictions
+MODEL_DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
+DATASET_PATH = "Dataset_Files/Only_A4_Recorded_1"  # data used for predictions
 MODEL_PATH = "LSTM_Model_Files/LSTM_Model_Simulated_Dataset_Matlab_12frets_1.h5"
 RESULTS_PATH = "Results/LSTM_Results/"
 MODEL_NAME = "Simulated_Dataset_Matlab_12frets_1"
 DATASET_NAME = "Only_A4_Recorded_1"
 PLOT_TITLE = "Only_A4_Recorded_1"  # Dataset name to be used in graph titles
-LABELS = get_mappings(MODEL_DATASET_PATH)
 TRANSCRIPTIONS = "Transcriptions/"
 
 
@@ -55,6 +50,8 @@ def transcribe(file_name="Transcription.ly"):
 
 
 if __name__ == "__main__":
+    LABELS = get_mappings(MODEL_DATASET_PATH)  # only reads the manifest
+
     # load model
     model = load_model(MODEL_PATH)
 
@@ -68,28 +65,12 @@ if __name__ == "__main__":
 
     # make prediction on a samples
     #predicted_note = []
-    prediction = pd.DataFrame(columns=LABELS)
     predicted_index, pred = predict(model, X, y)
-    #print(pred)
-    for i in range(len(pred)):
-        prediction.loc[len(prediction.index)] = pred[i]
-
-    prediction = prediction.round(2)
-    # print full dataframe
-    with pd.option_context('display.max_rows', None,
-                           'display.max_columns', None,
-                           'display.precision', 3,
-                           ):
-        print(prediction)
-
-
-    # save results as csv
-    #print(prediction)
-    description = prediction.describe()
-    description = description.round(2)
-    prediction.to_csv(RESULTS_PATH + "Prediction_" + MODEL_NAME + "_" + DATASET_NAME + ".csv")
-    description.to_csv(RESULTS_PATH + "Description_"+ MODEL_NAME + "_" + DATASET_NAME + ".csv")
-    print(description)
+
+    # save results as csv and binary
+    writer = PredictionWriter(RESULTS_PATH, MODEL_NAME + "_" + DATASET_NAME, LABELS)
+    writer.write(pred)
+    print(writer.close())  # summary statistics
     #sns.barplot(data=prediction)
     #plt.show()
 
@@ -0,0 +1,232 @@
+"""
+Streaming transcription with a stateful LSTM
+
+Audio is read in blocks, from a file or as 16 bit PCM from stdin, and
+resampled to SAMPLE_RATE as it comes in. StreamingMFCC keeps the last n_fft
+samples in a ring buffer and computes only the MFCC frames completed by each
+block. The frames are fed CHUNK_FRAMES at a time to a stateful copy of the
+trained LSTM, which carries its state from one chunk to the next instead of
+running the whole 173 frame window again. The work per block and the memory
+don't depend on how long the stream has been running.
+
+The LSTM was only trained on 173 frame clips that start from a zero state,
+so its state is reset every RESET_FRAMES frames by default, it never has to
+carry a state further than it was trained to.
+
+    python LSTM_Stream.py recording.wav
+    arecord -f S16_LE -r 44100 -c 1 | python LSTM_Stream.py - 44100 1
+"""
+
+import sys
+import time
+import numpy as np
+import soundfile as sf
+from math import gcd
+from scipy.signal import firwin
+from tensorflow.keras.models import load_model
+from LSTM import get_mappings, build_streaming_model
+from MFCC_Engine import StreamingMFCC
+from Prediction_Writer import PredictionWriter
+
+MODEL_DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
+MODEL_PATH = "LSTM_Model_Files/LSTM_Model_Simulated_Dataset_Matlab_12frets_1.h5"
+RESULTS_PATH = "Results/LSTM_Results/"
+MODEL_NAME = "Simulated_Dataset_Matlab_12frets_1"
+
+# must match the features the model was trained on
+SAMPLE_RATE = 22050
+N_MFCC = 13
+N_FFT = 2048
+HOP_LENGTH = 512
+
+BLOCK_SIZE = 4096  # samples read at a time
+CHUNK_FRAMES = 4  # frames per model call, the same shape every call so the model is only traced once
+RESET_FRAMES = 173  # reset the LSTM state every this many frames, the training window, None to never reset
+
+
+class Resampler:
+    """
+    Polyphase resampling of a stream, block by block, without clicks at the block edges
+    """
+
+    def __init__(self, orig_sr, target_sr, half_width=16):
+        """
+        :param orig_sr (int): sample rate of the stream
+        :param target_sr (int): sample rate to resample to
+        :param half_width (int): zero crossings of the low pass filter on each side
+        """
+        divisor = gcd(orig_sr, target_sr)
+        self.up = target_sr // divisor
+        self.down = orig_sr // divisor
+        num_taps = 2 * half_width * max(self.up, self.down) + 1
+        taps = firwin(num_taps, 1 / max(self.up, self.down), window=("kaiser", 5.0)) * self.up
+        self.num_phases = -(-num_taps // self.up)  # input samples under the filter for each output
+        taps = np.pad(taps, (0, self.num_phases * self.up - num_taps))
+        self.polyphase = taps.reshape(self.num_phases, self.up).T.astype(np.float32)  # [phase, tap]
+        self.delay = (num_taps - 1) // 2  # filter delay at the upsampled rate, removed from the output
+        self.history = np.zeros(self.num_phases - 1, dtype=np.float32)
+        self.num_inputs = 0
+        self.num_outputs = 0
+
+    def __call__(self, samples):
+        """
+        Resample the next block of the stream
+            :param samples (ndarray): 1D samples at orig_sr
+            :return (ndarray): the output samples that only depend on the samples seen so far
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.up == self.down:
+            return samples
+        signal = np.concatenate((self.history, samples))
+        start = self.num_inputs - len(self.history)  # stream index of signal[0]
+        self.num_inputs += len(samples)
+
+        # output j is sample j * down + delay of the upsampled, filtered stream
+        end = max(self.num_outputs, (self.num_inputs * self.up - self.delay + self.down - 1) // self.down)
+        position = np.arange(self.num_outputs, end) * self.down + self.delay
+        newest = position // self.up - start
+        inputs = signal[newest[:, np.newaxis] - np.arange(self.num_phases)]
+        output = np.einsum("ij,ij->i", inputs, self.polyphase[position % self.up])
+
+        self.num_outputs = end
+        self.history = signal[len(signal) - len(self.history):]
+        return output
+
+
+def read_file(file_path, block_size=BLOCK_SIZE):
+    """
+    Read an audio file block by block
+        :param file_path (str): path to the audio file
+        :param block_size (int): samples per block
+        :return (generator): mono float32 blocks
+    """
+    with sf.SoundFile(file_path) as f:
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            yield block.mean(axis=1)
+
+
+def read_pcm(stream, channels=1, block_size=BLOCK_SIZE):
+    """
+    Read interleaved 16 bit little endian PCM block by block, e.g. from stdin
+        :param stream: binary file object
+        :param channels (int): number of interleaved channels
+        :param block_size (int): samples per channel per block
+        :return (generator): mono float32 blocks
+    """
+    frame_bytes = 2 * channels
+    leftover = b""
+    while True:
+        data = stream.read(block_size * frame_bytes)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % frame_bytes
+        data, leftover = data[:usable], data[usable:]
+        block = np.frombuffer(data, dtype="<i2").reshape(-1, channels)
+        yield block.mean(axis=1).astype(np.float32) / 32768
+
+
+class StreamingTranscriber:
+    """
+    Note probabilities of every MFCC frame of a stream
+    """
+
+    def __init__(self, model, sample_rate, chunk_frames=CHUNK_FRAMES, reset_frames=RESET_FRAMES):
+        """
+        :param model: trained RNN-LSTM model
+        :param sample_rate (int): sample rate of the stream
+        :param chunk_frames (int): frames per model call
+        :param reset_frames (int): reset the LSTM state every this many frames, None to never reset
+        """
+        self.model = build_streaming_model(model)
+        self.resampler = Resampler(sample_rate, SAMPLE_RATE)
+        self.mfcc = StreamingMFCC(sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        self.chunk_frames = chunk_frames
+        self.reset_frames = reset_frames
+        self.frames = np.zeros((0, N_MFCC), dtype=np.float32)  # less than a chunk, waiting for more
+        self.frames_since_reset = 0
+
+    def push(self, samples):
+        """
+        Add a block of audio to the stream
+            :param samples (ndarray): 1D samples at the stream's sample rate
+            :return (ndarray): probabilities of the frames completed so far, shape (frames, number of notes)
+        """
+        frames = np.concatenate((self.frames, self.mfcc.push(self.resampler(samples))))
+        num_chunked = len(frames) - len(frames) % self.chunk_frames
+        self.frames = frames[num_chunked:]
+        return self.run(frames[:num_chunked].reshape(-1, self.chunk_frames, N_MFCC))
+
+    def flush(self):
+        """
+        End the stream
+            :return (ndarray): probabilities of the last frames
+        """
+        frames = np.concatenate((self.frames, self.mfcc.flush()))
+        self.frames = frames[:0]
+        return self.run(frames[:, np.newaxis])
+
+    def run(self, chunks):
+        prediction = []
+        for chunk in chunks:
+            if self.reset_frames is not None and self.frames_since_reset >= self.reset_frames:
+                self.model.reset_states()
+                self.frames_since_reset = 0
+            prediction.append(np.asarray(self.model.predict_on_batch(chunk[np.newaxis]))[0])
+            self.frames_since_reset += len(chunk)
+        if not prediction:
+            return np.zeros((0, self.model.output_shape[-1]), dtype=np.float32)
+        return np.concatenate(prediction)
+
+
+def transcribe_stream(blocks, sample_rate, model, labels, writer=None):
+    """
+    Transcribe a stream, printing each note when the predicted note changes
+        :param blocks (iterable): 1D blocks of samples
+        :param sample_rate (int): sample rate of the blocks
+        :param model: trained RNN-LSTM model
+        :param labels (list): names of the notes
+        :param writer (PredictionWriter): writes the probabilities of every frame, None to not save them
+        :return num_frames (int): number of frames transcribed
+        :return latency (ndarray): seconds spent on each block
+    """
+    transcriber = StreamingTranscriber(model, sample_rate)
+    num_frames = 0
+    previous = -1  # index of the last note printed
+    latency = []
+    blocks = iter(blocks)
+    while True:
+        block = next(blocks, None)
+        start = time.perf_counter()
+        prediction = transcriber.flush() if block is None else transcriber.push(block)
+        latency.append(time.perf_counter() - start)
+
+        predicted_index = np.argmax(prediction, axis=1)
+        for i in np.flatnonzero(predicted_index != np.concatenate(([previous], predicted_index[:-1]))):
+            print("{:.2f}s {}".format((num_frames + i) * HOP_LENGTH / SAMPLE_RATE, labels[predicted_index[i]]))
+        if len(prediction):
+            previous = predicted_index[-1]
+        if writer is not None:
+            writer.write(prediction)
+        num_frames += len(prediction)
+        if block is None:
+            return num_frames, np.array(latency)
+
+
+if __name__ == "__main__":
+    # python LSTM_Stream.py <audio file>, or python LSTM_Stream.py - <sample rate> <channels> for PCM on stdin
+    LABELS = get_mappings(MODEL_DATASET_PATH)
+    model = load_model(MODEL_PATH)
+    if sys.argv[1] == "-":
+        sample_rate = int(sys.argv[2])
+        blocks = read_pcm(sys.stdin.buffer, int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+        name = MODEL_NAME + "_stdin"
+    else:
+        sample_rate = sf.info(sys.argv[1]).samplerate
+        blocks = read_file(sys.argv[1])
+        name = MODEL_NAME + "_" + sys.argv[1].replace("\\", "/").split("/")[-1].rsplit(".", 1)[0]
+
+    with PredictionWriter(RESULTS_PATH, name, LABELS) as writer:
+        num_frames, latency = transcribe_stream(blocks, sample_rate, model, LABELS, writer)
+    print("Frames: {}, block duration: {:.1f} ms, mean latency: {:.1f} ms, max latency: {:.1f} ms".format(
+        num_frames, BLOCK_SIZE / sample_rate * 1000, latency.mean() * 1000, latency.max() * 1000))
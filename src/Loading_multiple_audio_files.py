@@ -9,6 +9,7 @@ import librosa.display
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+from Audio_Cache import load_audio
 
 
 #TODO mutilpe return values for load with librosa
@@ -30,7 +31,7 @@ def load_data(name):
 def load_with_librosa(filenames):
     samples = [i for i in range(len(filenames))]  # initialse samples
     for i in range(len(filenames)):
-        samples[i], sr = librosa.load(file_names[i])
+        samples[i], sr = load_audio(file_names[i])
     return samples
 
 
@@ -0,0 +1,270 @@
+"""
+Batched MFCC extraction
+
+Works on a stack of equal length signals of shape (n_signals, n_samples) and
+returns MFCCs of shape (n_signals, frames, n_mfcc), the same layout the
+builders get from librosa.feature.mfcc(...).T. The STFT, mel filterbank, log
+and DCT are each done once for the whole stack, the filterbank and DCT
+matrices are built once for every (sr, n_fft, n_mels, n_mfcc).
+
+Matches librosa.feature.mfcc with its default settings (hann window,
+center=True, power spectrogram, slaney mel filters, top_db=80, ortho DCT-II).
+
+StreamingMFCC computes the same frames for a stream of audio, as it arrives.
+"""
+
+import functools
+import numpy as np
+import librosa
+
+BATCH_SIZE = 64  # signals transformed at a time, bounds the memory used by the STFT
+
+
+@functools.lru_cache(maxsize=None)
+def get_window(n_fft):
+    """
+    Periodic hann window, the librosa default
+        :param n_fft (int): length of the window
+        :return window (ndarray): window of shape (n_fft,)
+    """
+    n = np.arange(n_fft)
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * n / n_fft)).astype(np.float32)
+    window.setflags(write=False)
+    return window
+
+
+@functools.lru_cache(maxsize=None)
+def get_mel_basis(sr, n_fft, n_mels):
+    """
+    Mel filterbank, transposed so it can be applied with a single matmul
+        :param sr (int): sample rate
+        :param n_fft (int): length of the FFT window
+        :param n_mels (int): number of mel bands
+        :return mel_basis (ndarray): filterbank of shape (1 + n_fft // 2, n_mels)
+    """
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).T.astype(np.float32)
+    mel_basis.setflags(write=False)
+    return mel_basis
+
+
+@functools.lru_cache(maxsize=None)
+def get_dct_basis(n_mels, n_mfcc):
+    """
+    Orthonormal DCT-II basis keeping the first n_mfcc coefficients
+        :param n_mels (int): number of mel bands
+        :param n_mfcc (int): number of MFCC coefficients
+        :return dct_basis (ndarray): basis of shape (n_mels, n_mfcc)
+    """
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, np.newaxis]
+    dct_basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    dct_basis[0] *= np.sqrt(0.5)
+    dct_basis = dct_basis.T.astype(np.float32)
+    dct_basis.setflags(write=False)
+    return dct_basis
+
+
+def frame_signals(signals, n_fft=2048, hop_length=512, center=True, pad_mode="constant"):
+    """
+    Split signals into overlapping frames without copying them
+        :param signals (ndarray): signals of shape (n_signals, n_samples)
+        :param n_fft (int): length of each frame
+        :param hop_length (int): number of samples between frames
+        :param center (bool): pad the signals so frames are centered on hop_length multiples
+        :param pad_mode (str): numpy pad mode used when center is True
+        :return frames (ndarray): read only view of shape (n_signals, frames, n_fft)
+    """
+    signals = np.ascontiguousarray(signals, dtype=np.float32)
+    if center:
+        signals = np.pad(signals, [(0, 0), (n_fft // 2, n_fft // 2)], mode=pad_mode)
+    num_frames = 1 + (signals.shape[1] - n_fft) // hop_length
+    stride_signal, stride_sample = signals.strides
+    return np.lib.stride_tricks.as_strided(signals,
+                                           shape=(signals.shape[0], num_frames, n_fft),
+                                           strides=(stride_signal, hop_length * stride_sample, stride_sample),
+                                           writeable=False)
+
+
+def power_to_mfcc(power, sr=22050, n_mfcc=13, n_fft=2048, n_mels=128, top_db=80.0, amin=1e-10):
+    """
+    Convert power spectra to MFCCs
+        :param power (ndarray): power spectra of shape (n_signals, frames, 1 + n_fft // 2)
+        :param top_db (float): threshold below the loudest value of each signal, None to disable
+        :return mfcc (ndarray): MFCCs of shape (n_signals, frames, n_mfcc)
+    """
+    mel = power @ get_mel_basis(sr, n_fft, n_mels)
+    log_mel = 10.0 * np.log10(np.maximum(mel, amin))
+    if top_db is not None:
+        # librosa clips each spectrogram relative to its own maximum
+        peak = log_mel.max(axis=(1, 2), keepdims=True)
+        log_mel = np.maximum(log_mel, peak - top_db)
+    return log_mel @ get_dct_basis(n_mels, n_mfcc)
+
+
+def batch_mfcc(signals, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512, n_mels=128,
+               pad_mode="constant", batch_size=BATCH_SIZE):
+    """
+    Extract the MFCCs of a stack of equal length signals
+        :param signals (ndarray): signals of shape (n_signals, n_samples)
+        :param sr (int): sample rate
+        :param n_mfcc (int): number of MFCC coefficients to create
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param n_mels (int): number of mel bands
+        :param pad_mode (str): padding used at the edges of the signals
+        :param batch_size (int): number of signals transformed at a time
+        :return mfcc (ndarray): MFCCs of shape (n_signals, frames, n_mfcc)
+    """
+    signals = np.asarray(signals, dtype=np.float32)
+    if signals.ndim == 1:
+        signals = signals[np.newaxis, :]
+    num_frames = 1 + signals.shape[1] // hop_length
+    mfcc = np.empty((signals.shape[0], num_frames, n_mfcc), dtype=np.float32)
+    window = get_window(n_fft)
+
+    for start in range(0, signals.shape[0], batch_size):
+        frames = frame_signals(signals[start:start + batch_size], n_fft, hop_length, pad_mode=pad_mode)
+        spectrum = np.fft.rfft(frames * window, axis=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mfcc[start:start + batch_size] = power_to_mfcc(power.astype(np.float32), sr, n_mfcc, n_fft, n_mels)
+    return mfcc
+
+
+def mfcc_signals(signals, **kwargs):
+    """
+    Extract the MFCCs of signals that may have different lengths, signals of
+    the same length are grouped into one batch
+        :param signals (list): 1D signals
+        :param kwargs: arguments passed on to batch_mfcc
+        :return mfccs (list): MFCCs of shape (frames, n_mfcc), in the same order as signals
+    """
+    mfccs = [None] * len(signals)
+    groups = {}
+    for i, signal in enumerate(signals):
+        groups.setdefault(len(signal), []).append(i)
+
+    for length, indices in groups.items():
+        batch = batch_mfcc(np.stack([signals[i] for i in indices]), **kwargs)
+        for i, mfcc in zip(indices, batch):
+            mfccs[i] = mfcc
+    return mfccs
+
+
+class RingBuffer:
+    """
+    Fixed size buffer holding the latest samples of a stream
+    """
+
+    def __init__(self, size):
+        """
+        :param size (int): number of samples kept
+        """
+        self.buffer = np.zeros(size, dtype=np.float32)
+        self.position = 0  # index the next sample is written to, and of the oldest sample
+
+    def extend(self, samples):
+        """
+        Append samples, overwriting the oldest ones
+            :param samples (ndarray): 1D samples
+        """
+        size = len(self.buffer)
+        samples = np.asarray(samples, dtype=np.float32)[-size:]
+        end = self.position + len(samples)
+        if end <= size:
+            self.buffer[self.position:end] = samples
+        else:
+            split = size - self.position
+            self.buffer[self.position:] = samples[:split]
+            self.buffer[:end - size] = samples[split:]
+        self.position = end % size
+
+    def latest(self):
+        """
+        The samples in the buffer, oldest first
+            :return (ndarray): copy of shape (size,)
+        """
+        return np.concatenate((self.buffer[self.position:], self.buffer[:self.position]))
+
+
+class StreamingMFCC:
+    """
+    MFCCs of a stream of audio, computed frame by frame as the samples arrive
+
+    Only the last n_fft samples are kept, in a ring buffer, and each frame is
+    transformed once, when the samples it ends with come in, so memory and the
+    work per sample don't grow with the length of the stream. The frames are
+    the ones batch_mfcc gives for the whole signal (center=True, zero padded),
+    except that top_db clips relative to the loudest frame seen so far instead
+    of the loudest frame of the whole signal.
+
+        mfcc = StreamingMFCC()
+        for block in blocks:
+            frames = mfcc.push(block)  # (new frames, n_mfcc)
+        frames = mfcc.flush()
+    """
+
+    def __init__(self, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512, n_mels=128, top_db=80.0, amin=1e-10,
+                 batch_frames=1024):
+        """
+        :param sr (int): sample rate
+        :param n_mfcc (int): number of MFCC coefficients to create
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param n_mels (int): number of mel bands
+        :param top_db (float): threshold below the loudest value so far, None to disable
+        :param amin (float): smallest mel power before the log
+        :param batch_frames (int): frames transformed at a time, bounds the memory used by long pushes
+        """
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.top_db = top_db
+        self.amin = amin
+        self.batch_frames = batch_frames
+        self.ring = RingBuffer(n_fft)  # starts with the n_fft // 2 zeros of the center padding
+        self.needed = n_fft - n_fft // 2  # samples missing before the next frame is complete
+        self.peak = -np.inf
+        self.num_frames = 0
+
+    def push(self, samples):
+        """
+        Add samples to the stream
+            :param samples (ndarray): 1D samples
+            :return (ndarray): MFCCs of the frames completed by the samples, shape (new frames, n_mfcc)
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) < self.needed:
+            self.ring.extend(samples)
+            self.needed -= len(samples)
+            return np.zeros((0, self.n_mfcc), dtype=np.float32)
+
+        # every frame ending in the new samples, as views of the buffered and new samples
+        num_frames = 1 + (len(samples) - self.needed) // self.hop_length
+        signal = np.concatenate((self.ring.latest(), samples))
+        frames = frame_signals(signal[np.newaxis, self.needed:], self.n_fft, self.hop_length, center=False)[0]
+        self.ring.extend(samples)
+        self.needed = self.hop_length - (len(samples) - self.needed) % self.hop_length
+
+        mfcc = np.empty((num_frames, self.n_mfcc), dtype=np.float32)
+        for start in range(0, num_frames, self.batch_frames):
+            mfcc[start:start + self.batch_frames] = self.transform(frames[start:start + self.batch_frames])
+        return mfcc
+
+    def flush(self):
+        """
+        End the stream, the frames overlapping its end are padded with zeros
+            :return (ndarray): MFCCs of the last frames, shape (new frames, n_mfcc)
+        """
+        return self.push(np.zeros(self.n_fft // 2, dtype=np.float32))
+
+    def transform(self, frames):
+        spectrum = np.fft.rfft(frames * get_window(self.n_fft), axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        log_mel = 10.0 * np.log10(np.maximum(power @ get_mel_basis(self.sr, self.n_fft, self.n_mels), self.amin))
+        if self.top_db is not None:
+            self.peak = max(self.peak, float(log_mel.max()))
+            log_mel = np.maximum(log_mel, self.peak - self.top_db)
+        self.num_frames += len(frames)
+        return log_mel @ get_dct_basis(self.n_mels, self.n_mfcc)
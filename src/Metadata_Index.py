@@ -0,0 +1,177 @@
+"""
+Queryable metadata index of the featurized clips of a feature store
+
+Every record of a store gets the columns:
+    note, frequency   - note name and frequency in Hz of the clip (detune included)
+    detune            - frequency shift in Hz of simulated notes
+    pluck_position    - pluck position of simulated notes
+    style             - Picked or Plucked excitation of simulated notes
+    string, fret      - string and fret number of IDMT recordings
+    source            - simulated or IDMT
+
+Subsets of a store (e.g. 6 notes, picked only) are saved as views: a view
+holds the indices of the selected records and their remapped labels, the
+features stay in the source store so nothing is extracted again.
+
+    index = load_index(STORE_PATH)
+    view_path = make_view(STORE_PATH, "Dataset_Files/6notes", note=list(notes_to_frequency_6))
+"""
+
+import os
+import json
+import numpy as np
+from Feature_Store import load_manifest, load_metadata, load_labels, save_view
+
+COLUMNS = ["note", "frequency", "detune", "pluck_position", "style", "string", "fret", "source"]
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+STYLES = ["Picked", "Plucked"]
+
+
+def note_to_midi(note):
+    """
+    MIDI number of a note name
+        :param note (str): note name e.g. A4, D#5
+        :return (int): MIDI number, A4 is 69
+    """
+    return NOTE_NAMES.index(note[:-1]) + 12 * (int(note[-1]) + 1)
+
+
+def midi_to_note(midi):
+    """
+    Note name of a MIDI number
+        :param midi (int): MIDI number
+        :return (str): note name e.g. A4, D#5
+    """
+    return NOTE_NAMES[midi % 12] + str(midi // 12 - 1)
+
+
+def midi_to_frequency(midi):
+    return 440.0 * 2 ** ((midi - 69) / 12)
+
+
+def simulated_metadata(file_path, note):
+    """
+    Columns of a simulated note, parsed from a file name created by
+    Audio_Data_From_Matlab.play_style: <note>_<detune>_<style>_<pluck>.wav
+        :param file_path (str): path to audio file
+        :param note (str): name of the note folder the file is in
+        :return metadata (dict): column values, None for anything the file name doesn't have
+    """
+    parts = os.path.splitext(os.path.basename(file_path))[0].split("_")
+    metadata = dict.fromkeys(COLUMNS)
+    metadata.update({"file": os.path.basename(file_path), "note": note, "source": "simulated"})
+    try:
+        metadata["detune"] = float(parts[1])
+    except (IndexError, ValueError):
+        pass
+    if len(parts) > 2 and parts[2] in STYLES:
+        metadata["style"] = parts[2]
+    if len(parts) > 3 and parts[3].isdigit():
+        metadata["pluck_position"] = int(parts[3]) / 10  # play_style saves pluck position * 10
+    try:
+        metadata["frequency"] = midi_to_frequency(note_to_midi(note)) + (metadata["detune"] or 0)
+    except ValueError:
+        pass
+    return metadata
+
+
+def idmt_metadata(file_path, annotation):
+    """
+    Columns of an IDMT recording
+        :param file_path (str): path to audio file
+        :param annotation (dict): entry of the IDMT annotation index
+        :return metadata (dict): column values
+    """
+    metadata = dict.fromkeys(COLUMNS)
+    metadata.update({"file": os.path.basename(file_path),
+                     "note": midi_to_note(annotation["pitch"]),
+                     "frequency": midi_to_frequency(annotation["pitch"]),
+                     "string": int(annotation["stringNumber"]) if annotation["stringNumber"] else None,
+                     "fret": int(annotation["fretNumber"]) if annotation["fretNumber"] else None,
+                     "folder": annotation["folder"],
+                     "source": "IDMT"})
+    return metadata
+
+
+def load_index(store_path):
+    """
+    Load the metadata index of a store, stores built before the metadata was
+    saved only get the note column, taken from the mapping
+        :param store_path (str): path to the store
+        :return index (dict): column name -> ndarray with a value per record
+    """
+    manifest = load_manifest(store_path)
+    metadata = load_metadata(store_path)
+    num_records = manifest["num_records"]
+
+    index = {}
+    for column in COLUMNS + [key for key in metadata if key not in COLUMNS]:
+        values = metadata.get(column, [None] * num_records)
+        index[column] = np.array(values, dtype=object)
+    if "note" not in metadata and manifest["mapping"]:
+        index["note"] = np.array(manifest["mapping"], dtype=object)[load_labels(store_path)]
+    return index
+
+
+def query(index, **conditions):
+    """
+    Select records of an index
+        :param index (dict): metadata index
+        :param conditions: column=value, column=[values] or column=function(values) -> mask
+        :return (ndarray): indices of the records matching every condition
+    """
+    num_records = len(next(iter(index.values()))) if index else 0
+    mask = np.ones(num_records, dtype=bool)
+    for column, condition in conditions.items():
+        values = index[column]
+        if callable(condition):
+            mask &= np.asarray(condition(values), dtype=bool)
+        elif isinstance(condition, (list, tuple, set)):
+            condition = set(condition)
+            mask &= np.array([value in condition for value in values], dtype=bool)
+        else:
+            mask &= values == condition
+    return np.flatnonzero(mask)
+
+
+def make_view(store_path, view_path, label_by="note", mapping=None, **conditions):
+    """
+    Save the records matching a query as a view of the store, labels are
+    remapped to the selected values of label_by
+        :param store_path (str): path to the source store
+        :param view_path (str): folder to create the view in
+        :param label_by (str): column the new labels are the values of
+        :param mapping (list): order of the new labels, records with other values are left out,
+            defaults to the order the values first appear in
+        :param conditions: passed on to query
+        :return view_path (str): path to the view
+    """
+    index = load_index(store_path)
+    indices = query(index, **conditions)
+    if mapping is not None:
+        indices = indices[[value in mapping for value in index[label_by][indices]]]
+    values = index[label_by][indices]
+    if mapping is None:
+        mapping = []
+        for value in values:
+            if value not in mapping:
+                mapping.append(value)
+    label_of = {value: label for label, value in enumerate(mapping)}
+    labels = np.array([label_of[value] for value in values], dtype=np.int64)
+
+    save_view(view_path, store_path, indices, labels, mapping=[str(value) for value in mapping])
+    print("Created view: {} with {} records, {} labels".format(view_path, len(indices), len(mapping)))
+    return view_path
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python Metadata_Index.py <store_path> <view_path> [column=value[,value...]]...
+    conditions = {}
+    for argument in sys.argv[3:]:
+        column, values = argument.split("=", 1)
+        values = [json.loads(value) if value[:1].isdigit() or value[:1] == "-" else value
+                  for value in values.split(",")]
+        conditions[column] = values
+    make_view(sys.argv[1], sys.argv[2], **conditions)
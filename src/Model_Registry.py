@@ -0,0 +1,178 @@
+"""
+Registry of the trained models
+
+Models are addressed by name (the .h5 file name without extension) and know
+the dataset they were trained on, so their note names come with them. A model
+is only loaded the first time it is asked for and is then kept in memory;
+the least recently used models are evicted once there are more than
+MAX_MODELS loaded or their weights take more than MAX_MEMORY bytes. A model
+is loaded again only if its .h5 file changes. Whoever holds on to the models,
+like the micro-batchers of the inference server, is told through on_evict
+so it can let go of them and their memory is actually freed.
+
+    registry = ModelRegistry()
+    registry.register("CNN_Model_Matlab_Hybrid2", mapping_path="Dataset_Files/Hybrid_Dataset")
+    model, labels = registry.get("CNN_Model_Matlab_Hybrid2")
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from Feature_Store import load_dataset_manifest
+
+REGISTRY_PATH = "Model_Registry.json"  # model name -> path and dataset, for models that aren't found by name
+MODEL_PATHS = ["CNN/CNN_Model_Files", "LSTM/LSTM_Model_Files"]  # folders of .h5 models
+MAX_MODELS = 8
+MAX_MEMORY = 2 * 1024 ** 3  # bytes of weights kept loaded
+
+
+def file_state(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def model_size(model):
+    """
+    Memory used by the weights of a model
+        :param model: Keras model
+        :return (int): bytes
+    """
+    return sum(int(weight.numpy().nbytes) for weight in model.weights)
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, LRU cached models with the names of the notes they predict
+    """
+
+    def __init__(self, registry_path=REGISTRY_PATH, model_paths=MODEL_PATHS, max_models=MAX_MODELS,
+                 max_memory=MAX_MEMORY, on_evict=None):
+        """
+        :param registry_path (str): json file of registered models, None to not save registrations
+        :param model_paths (list): folders searched for .h5 models
+        :param max_models (int): most models kept loaded
+        :param max_memory (int): most bytes of weights kept loaded
+        :param on_evict (function): called with the name and model of every model dropped from the cache
+        """
+        self.registry_path = registry_path
+        self.model_paths = model_paths
+        self.max_models = max_models
+        self.max_memory = max_memory
+        self.entries = {}
+        if registry_path is not None and os.path.exists(registry_path):
+            with open(registry_path, "r") as fp:
+                self.entries = json.load(fp)
+        self.on_evict = on_evict
+        self.loaded = OrderedDict()  # name -> (model, labels, file state, size), least recently used first
+        self.lock = threading.RLock()
+        self.load_locks = {}  # name -> lock held while the model is loaded, other models aren't held up
+
+    def names(self):
+        """
+        Names of every model that can be loaded
+            :return (list): model names
+        """
+        names = set(self.entries)
+        for model_path in self.model_paths:
+            if os.path.isdir(model_path):
+                names.update(os.path.splitext(f)[0] for f in os.listdir(model_path)
+                             if os.path.splitext(f)[1] == ".h5")
+        return sorted(names)
+
+    def register(self, name, path=None, mapping_path=None):
+        """
+        Record where a model is and which dataset it was trained on
+            :param name (str): model name
+            :param path (str): path to the .h5 file, None to find it by name
+            :param mapping_path (str): feature store or json dataset the model was trained on
+        """
+        with self.lock:
+            self.entries[name] = {"path": path or self.find(name), "mapping": mapping_path}
+            dropped = self.loaded.pop(name, None)
+            if self.registry_path is not None:
+                with open(self.registry_path + ".tmp", "w") as fp:
+                    json.dump(self.entries, fp, indent=4)
+                os.replace(self.registry_path + ".tmp", self.registry_path)
+        if dropped is not None:
+            self.notify([(name, dropped[0])])
+
+    def find(self, name):
+        """
+        Path to a model
+            :param name (str): model name
+            :return (str): path to the .h5 file
+        """
+        if name in self.entries and self.entries[name]["path"]:
+            return self.entries[name]["path"]
+        for model_path in self.model_paths:
+            path = os.path.join(model_path, name + ".h5")
+            if os.path.exists(path):
+                return path
+        raise KeyError("unknown model {}".format(name))
+
+    def get(self, name):
+        """
+        Load a model, or take it from the cache if its file hasn't changed
+            :param name (str): model name
+            :return model: Keras model
+            :return labels (list): names of the notes, empty if the model has no dataset registered
+        """
+        with self.lock:
+            path = self.find(name)
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+
+        # the registry lock isn't held while loading, a cold load only holds up requests for the same model
+        with load_lock:
+            state = file_state(path)
+            with self.lock:
+                if name in self.loaded and self.loaded[name][2] == state:
+                    self.loaded.move_to_end(name)
+                    model, labels = self.loaded[name][:2]
+                    return model, labels
+
+            # tensorflow is only imported once a model is needed
+            from tensorflow.keras.models import load_model
+            model = load_model(path)
+            mapping_path = self.entries.get(name, {}).get("mapping")
+            labels = load_dataset_manifest(mapping_path)["mapping"] if mapping_path else []
+
+            with self.lock:
+                replaced = self.loaded.pop(name, None)
+                self.loaded[name] = (model, labels, state, model_size(model))
+                evicted = self.evict()
+            print("Loaded model: ", name)
+        if replaced is not None:
+            evicted.insert(0, (name, replaced[0]))
+        self.notify(evicted)
+        return model, labels
+
+    def is_loaded(self, name, model):
+        """
+        Whether a model is still the one cached under its name
+            :param name (str): model name
+            :param model: model returned by get
+            :return (bool): False once the model was evicted or reloaded
+        """
+        with self.lock:
+            return name in self.loaded and self.loaded[name][0] is model
+
+    def evict(self):
+        """
+        Drop the least recently used models until the cache fits, the last model used is always kept
+            :return (list): name and model of every model dropped, on_evict isn't called for them
+        """
+        evicted = []
+        with self.lock:
+            while len(self.loaded) > 1 and (len(self.loaded) > self.max_models or
+                                            sum(entry[3] for entry in self.loaded.values()) > self.max_memory):
+                name, entry = self.loaded.popitem(last=False)
+                evicted.append((name, entry[0]))
+                print("Evicted model: ", name)
+        return evicted
+
+    def notify(self, evicted):
+        # called without the lock, so on_evict can take locks of its own
+        if self.on_evict is not None:
+            for name, model in evicted:
+                self.on_evict(name, model)
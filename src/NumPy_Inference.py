@@ -0,0 +1,331 @@
+"""
+NumPy inference runtime for the trained CNN and LSTM models
+
+Reads the layers and weights of a Keras .h5 file with h5py and runs the
+forward pass with NumPy, so predicting doesn't need TensorFlow. Only the
+layers of CNN.build_model and LSTM.build_model are implemented: Conv2D,
+MaxPooling2D, BatchNormalization, Flatten, Dense, Dropout and LSTM.
+
+BatchNormalization is folded into the weights of a neighbouring layer when
+the model is loaded. In the CNN it comes after the max pooling, so it is
+folded into the next Conv2D (valid padding) or Dense layer, which sees it as
+a per input channel scale and shift.
+
+    model = NumPyModel("CNN/CNN_Model_Files/CNN_Model_Matlab.h5")
+    predicted_index, prediction = model.predict(X)
+"""
+
+import json
+import numpy as np
+import h5py
+from numpy.lib.stride_tricks import as_strided
+
+BATCH_SIZE = 256  # windows per forward pass
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "hard_sigmoid": lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+}
+
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def activation(name):
+    if name == "softmax":
+        return softmax
+    if name not in ACTIVATIONS:
+        raise ValueError("unsupported activation {}".format(name))
+    return ACTIVATIONS[name]
+
+
+def decode(value):
+    # h5py returns attributes as bytes or str depending on how the file was written
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def read_h5(model_path):
+    """
+    Read the layer configs and weights of a Keras .h5 model
+        :param model_path (str): path to the .h5 file
+        :return layers (list): (class name, config, weights) of every layer, weights is a list of ndarrays
+    """
+    with h5py.File(model_path, "r") as f:
+        model_config = json.loads(decode(f.attrs["model_config"]))
+        if model_config["class_name"] != "Sequential":
+            raise ValueError("only Sequential models are supported")
+        weights_group = f["model_weights"] if "model_weights" in f else f
+        layers = []
+        for layer in model_config["config"]["layers"]:
+            config = layer["config"]
+            weights = []
+            if config["name"] in weights_group:
+                group = weights_group[config["name"]]
+                weights = [np.asarray(group[decode(name)], dtype=np.float32) for name in group.attrs["weight_names"]]
+            layers.append((layer["class_name"], config, weights))
+    return layers
+
+
+def windows_2d(x, size, strides):
+    """
+    Sliding windows over the height and width of NHWC inputs, as a view
+        :param x (ndarray): inputs of shape (n, h, w, c)
+        :param size (tuple): window height and width
+        :param strides (tuple): step between windows
+        :return (ndarray): view of shape (n, out_h, out_w, size_h, size_w, c)
+    """
+    n, h, w, c = x.shape
+    out_h = (h - size[0]) // strides[0] + 1
+    out_w = (w - size[1]) // strides[1] + 1
+    s = x.strides
+    return as_strided(x, shape=(n, out_h, out_w, size[0], size[1], c),
+                      strides=(s[0], s[1] * strides[0], s[2] * strides[1], s[1], s[2], s[3]), writeable=False)
+
+
+def same_padding(size, kernel, stride):
+    # padding TensorFlow adds for padding="same", the extra sample goes after
+    out = -(-size // stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+
+def pad_same(x, kernel, strides, value=0.0):
+    pad_h = same_padding(x.shape[1], kernel[0], strides[0])
+    pad_w = same_padding(x.shape[2], kernel[1], strides[1])
+    return np.pad(x, ((0, 0), pad_h, pad_w, (0, 0)), constant_values=value)
+
+
+class Conv2D:
+    def __init__(self, config, kernel, bias=None):
+        self.kernel = kernel  # (kh, kw, c_in, c_out)
+        self.bias = bias if bias is not None else np.zeros(kernel.shape[-1], dtype=np.float32)
+        self.strides = tuple(config["strides"])
+        self.padding = config["padding"]
+        self.activation = activation(config["activation"])
+        if tuple(config.get("dilation_rate", (1, 1))) != (1, 1):
+            raise ValueError("dilated convolutions are not supported")
+
+    def fold_input(self, scale, shift):
+        # conv(x * scale + shift) = conv'(x), only exact when no padding is added
+        if self.padding != "valid":
+            return False
+        self.bias = self.bias + np.einsum("hwio,i->o", self.kernel, shift)
+        self.kernel = self.kernel * scale[:, np.newaxis]
+        return True
+
+    def __call__(self, x):
+        size = self.kernel.shape[:2]
+        if self.padding == "same":
+            x = pad_same(x, size, self.strides)
+        patches = windows_2d(np.ascontiguousarray(x), size, self.strides)
+        n, out_h, out_w = patches.shape[:3]
+        # im2col and one matmul for the whole batch
+        cols = patches.reshape(n * out_h * out_w, -1)
+        y = cols @ self.kernel.reshape(-1, self.kernel.shape[-1]) + self.bias
+        return self.activation(y.reshape(n, out_h, out_w, -1))
+
+
+class MaxPooling2D:
+    def __init__(self, config):
+        self.pool_size = tuple(config["pool_size"])
+        self.strides = tuple(config["strides"] or config["pool_size"])
+        self.padding = config["padding"]
+
+    def __call__(self, x):
+        if self.padding == "same":
+            x = pad_same(x, self.pool_size, self.strides, value=-np.inf)
+        return windows_2d(np.ascontiguousarray(x), self.pool_size, self.strides).max(axis=(3, 4))
+
+
+class BatchNormalization:
+    def __init__(self, config, weights):
+        weights = list(weights)
+        num_channels = weights[-1].shape[0]
+        gamma = weights.pop(0) if config.get("scale", True) else np.ones(num_channels, dtype=np.float32)
+        beta = weights.pop(0) if config.get("center", True) else np.zeros(num_channels, dtype=np.float32)
+        moving_mean, moving_variance = weights
+        # inference batch norm is an affine transform per channel
+        self.scale = gamma / np.sqrt(moving_variance + config["epsilon"])
+        self.shift = beta - moving_mean * self.scale
+
+    def __call__(self, x):
+        return x * self.scale + self.shift
+
+
+class Flatten:
+    def fold_input(self, scale, shift, shape):
+        # a per channel transform before flatten is a per feature transform after it
+        return np.broadcast_to(scale, shape).ravel(), np.broadcast_to(shift, shape).ravel()
+
+    def __call__(self, x):
+        return x.reshape(len(x), -1)
+
+
+class Dense:
+    def __init__(self, config, kernel, bias=None):
+        self.kernel = kernel  # (in, out)
+        self.bias = bias if bias is not None else np.zeros(kernel.shape[-1], dtype=np.float32)
+        self.activation = activation(config["activation"])
+
+    def fold_input(self, scale, shift):
+        self.bias = self.bias + shift @ self.kernel
+        self.kernel = self.kernel * scale[:, np.newaxis]
+        return True
+
+    def __call__(self, x):
+        return self.activation(x @ self.kernel + self.bias)
+
+
+class LSTM:
+    def __init__(self, config, kernel, recurrent_kernel, bias=None):
+        self.units = config["units"]
+        self.kernel = kernel  # (in, 4 * units), gates in the order i, f, c, o
+        self.recurrent_kernel = recurrent_kernel  # (units, 4 * units)
+        self.bias = bias if bias is not None else np.zeros(4 * self.units, dtype=np.float32)
+        self.activation = activation(config["activation"])
+        self.recurrent_activation = activation(config["recurrent_activation"])
+        self.return_sequences = config["return_sequences"]
+        if config.get("go_backwards") or config.get("stateful"):
+            raise ValueError("only forward, stateless LSTMs are supported")
+
+    def __call__(self, x):
+        n, steps, _ = x.shape
+        # the input projection of every step is one matmul
+        inputs = (x.reshape(n * steps, -1) @ self.kernel + self.bias).reshape(n, steps, -1)
+        h = np.zeros((n, self.units), dtype=x.dtype)
+        c = np.zeros((n, self.units), dtype=x.dtype)
+        outputs = []
+        u = self.units
+        for t in range(steps):
+            z = inputs[:, t] + h @ self.recurrent_kernel
+            i = self.recurrent_activation(z[:, :u])
+            f = self.recurrent_activation(z[:, u:2 * u])
+            c = f * c + i * self.activation(z[:, 2 * u:3 * u])
+            o = self.recurrent_activation(z[:, 3 * u:])
+            h = o * self.activation(c)
+            if self.return_sequences:
+                outputs.append(h)
+        return np.stack(outputs, axis=1) if self.return_sequences else h
+
+
+def build_layers(layers, input_shape):
+    """
+    Create the runtime layers and fold the batch norms into their neighbours
+        :param layers (list): (class name, config, weights) from read_h5
+        :param input_shape (tuple): shape of one input window
+        :return (list): callable layers
+    """
+    built = []
+    pending = None  # batch norm waiting to be folded into the next linear layer
+    shape = tuple(input_shape)
+    for class_name, config, weights in layers:
+        if class_name in ["InputLayer", "Dropout"]:
+            continue
+        if class_name == "Conv2D":
+            layer = Conv2D(config, *weights)
+        elif class_name in ["MaxPooling2D", "MaxPool2D"]:
+            layer = MaxPooling2D(config)
+        elif class_name == "BatchNormalization":
+            layer = BatchNormalization(config, weights)
+        elif class_name == "Flatten":
+            layer = Flatten()
+        elif class_name == "Dense":
+            layer = Dense(config, *weights)
+        elif class_name == "LSTM":
+            layer = LSTM(config, *weights)
+        else:
+            raise ValueError("unsupported layer {}".format(class_name))
+
+        if pending is not None:
+            if isinstance(layer, Flatten):
+                # carry the batch norm through the flatten as a per feature transform
+                pending.scale, pending.shift = layer.fold_input(pending.scale, pending.shift, shape)
+                built.append(layer)
+                shape = (int(np.prod(shape)),)
+                continue
+            if not (isinstance(layer, (Conv2D, Dense)) and layer.fold_input(pending.scale, pending.shift)):
+                built.append(pending)
+            pending = None
+
+        if isinstance(layer, BatchNormalization):
+            pending = layer
+        else:
+            built.append(layer)
+        shape = layer_output_shape(layer, shape)
+    if pending is not None:
+        built.append(pending)
+    return built
+
+
+def layer_output_shape(layer, shape):
+    # shape of one window after a layer, without running it
+    return layer(np.zeros((1,) + tuple(shape), dtype=np.float32)).shape[1:]
+
+
+class NumPyModel:
+    """
+    Runs a Keras .h5 model with NumPy
+    """
+
+    def __init__(self, model_path):
+        """
+        :param model_path (str): path to the .h5 file
+        """
+        layers = read_h5(model_path)
+        # the input shape is on the InputLayer, or on the first layer of older files
+        config = next(config for _, config, _ in layers if "batch_input_shape" in config)
+        self.input_shape = tuple(config["batch_input_shape"][1:])
+        self.layers = build_layers(layers, self.input_shape)
+
+    def predict_on_batch(self, X):
+        """
+        Forward pass of a batch
+            :param X (ndarray): inputs, shaped like the Keras model inputs
+            :return (ndarray): output of the model
+        """
+        x = np.asarray(X, dtype=np.float32).reshape((-1,) + self.input_shape)
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def predict(self, X, batch_size=BATCH_SIZE):
+        """
+        Predict on many windows
+            :param X (ndarray): inputs, shaped like the Keras model inputs
+            :param batch_size (int): windows per forward pass
+            :return predicted_index (ndarray): index with the highest probability for each window
+            :return prediction (ndarray): probabilities of shape [num_windows, number of notes]
+        """
+        prediction = np.concatenate([self.predict_on_batch(X[start:start + batch_size])
+                                     for start in range(0, len(X), batch_size)])
+        return np.argmax(prediction, axis=1), prediction
+
+
+def compare_with_keras(model_path, X):
+    """
+    Largest difference between the outputs of the runtime and of Keras, needs TensorFlow
+        :param model_path (str): path to the .h5 file
+        :param X (ndarray): inputs, shaped like the Keras model inputs
+        :return (float): largest absolute difference of the probabilities
+    """
+    from tensorflow.keras.models import load_model
+
+    expected = load_model(model_path).predict(X)
+    actual = NumPyModel(model_path).predict(X)[1]
+    return float(np.max(np.abs(expected - actual)))
+
+
+if __name__ == "__main__":
+    # python NumPy_Inference.py <model_path> <store_path>: compare with Keras on the first records of a store
+    import sys
+    from Feature_Store import load_manifest
+    from Input_Pipeline import load_records
+
+    model = NumPyModel(sys.argv[1])
+    num_records = min(BATCH_SIZE, load_manifest(sys.argv[2])["num_records"])
+    X = load_records(sys.argv[2], np.arange(num_records))[0].reshape((-1,) + model.input_shape)
+    print("Largest difference to Keras: ", compare_with_keras(sys.argv[1], X))
@@ -0,0 +1,198 @@
+"""
+Onset-driven segmentation of a recording into note events
+
+Instead of classifying every window of a recording, including silence and
+the decay of notes, the onsets and offsets of the notes are found first and
+only those events are classified. The spectral flux (the rise of the log
+magnitude spectrum from one frame to the next) and the energy of every
+frame are computed in one vectorized pass over the STFT frames:
+    onset  - a peak of the flux above its local mean, in a frame that isn't silent
+    offset - the energy falls SILENCE_DB below the loudest frame, or the next onset starts
+
+Each event is cut from its onset, like the training clips start at the
+pluck, zero padded after its offset to DURATION and classified in batches.
+
+    python Onset_Segmentation.py recording.wav
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import librosa
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+from MFCC_Engine import frame_signals, get_window, batch_mfcc
+
+SAMPLE_RATE = 22050
+DURATION = 4  # seconds of audio classified per event, the length of the training clips
+N_MFCC = 13
+N_FFT = 2048
+HOP_LENGTH = 512
+BATCH_FRAMES = 2048  # STFT frames computed at a time, bounds the memory used by long recordings
+BATCH_SIZE = 64  # events classified at a time
+
+DELTA = 0.07  # how far the normalized flux must rise above its local mean to be an onset
+AVERAGE_FRAMES = 10  # frames on each side of the local mean of the flux
+WAIT = 4  # fewest frames between onsets, about 90 ms
+SILENCE_DB = -50  # energy below the loudest frame that counts as silence
+MIN_DURATION = 0.05  # seconds, shorter events are dropped
+
+MODEL_DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"
+MODEL_PATH = "CNN/CNN_Model_Files/CNN_Model_Simulated_Dataset_Matlab_12frets_1.h5"
+RESULTS_PATH = "Results/Onset_Results/"
+
+
+def spectral_features(signal, n_fft=N_FFT, hop_length=HOP_LENGTH, batch_frames=BATCH_FRAMES):
+    """
+    Spectral flux and energy of every frame of a signal
+        :param signal (ndarray): 1D signal
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param batch_frames (int): frames transformed at a time
+        :return flux (ndarray): summed rise of the log magnitude spectrum, shape (frames,)
+        :return energy_db (ndarray): RMS energy in dB, shape (frames,)
+    """
+    frames = frame_signals(np.asarray(signal, dtype=np.float32)[np.newaxis], n_fft, hop_length)[0]
+    window = get_window(n_fft)
+    flux = np.zeros(len(frames), dtype=np.float32)
+    energy_db = np.zeros(len(frames), dtype=np.float32)
+    previous = None
+    for start in range(0, len(frames), batch_frames):
+        batch = frames[start:start + batch_frames]
+        log_magnitude = np.log1p(100 * np.abs(np.fft.rfft(batch * window, axis=-1))).astype(np.float32)
+        if previous is None:
+            previous = log_magnitude[:1]  # the first frame has no rise
+        rise = np.diff(np.concatenate((previous, log_magnitude)), axis=0)
+        flux[start:start + len(batch)] = np.maximum(rise, 0).sum(axis=1)
+        energy_db[start:start + len(batch)] = 10 * np.log10(np.mean(batch ** 2, axis=1) + 1e-10)
+        previous = log_magnitude[-1:]
+    return flux, energy_db
+
+
+def detect_onsets(flux, energy_db, delta=DELTA, average_frames=AVERAGE_FRAMES, wait=WAIT, silence_db=SILENCE_DB):
+    """
+    Frames where notes start
+        :param flux (ndarray): spectral flux of every frame
+        :param energy_db (ndarray): energy of every frame in dB
+        :param delta (float): rise of the normalized flux above its local mean
+        :param average_frames (int): frames on each side of the local mean
+        :param wait (int): fewest frames between onsets
+        :param silence_db (float): energy below the loudest frame that counts as silence
+        :return (ndarray): onset frame indices, ascending
+    """
+    if len(flux) == 0:
+        return np.zeros(0, dtype=np.int64)
+    flux = flux / max(float(flux.max()), 1e-10)
+    peak = flux == maximum_filter1d(flux, 2 * wait + 1)
+    above_mean = flux > uniform_filter1d(flux, 2 * average_frames + 1) + delta
+    # the energy rises just after the flux peaks, so look at the frames around it
+    loud = maximum_filter1d(energy_db, 2 * wait + 1) > energy_db.max() + silence_db
+    onsets = np.flatnonzero(peak & above_mean & loud)
+    if onsets.size == 0:
+        return onsets
+    # flat peaks give neighbouring candidates, keep the first
+    return onsets[np.concatenate(([True], np.diff(onsets) > wait))]
+
+
+def detect_offsets(onsets, energy_db, wait=WAIT, silence_db=SILENCE_DB):
+    """
+    Frames where the notes end, the first silent frame or the next onset
+        :param onsets (ndarray): onset frame indices, ascending
+        :param energy_db (ndarray): energy of every frame in dB
+        :param wait (int): frames after an onset before silence is looked for, the energy may still be rising
+        :param silence_db (float): energy below the loudest frame that counts as silence
+        :return (ndarray): offset frame indices, exclusive
+    """
+    num_frames = len(energy_db)
+    silent = energy_db < energy_db.max() + silence_db
+    # index of the first silent frame at or after every frame
+    index = np.where(silent, np.arange(num_frames), num_frames)
+    next_silent = np.append(np.minimum.accumulate(index[::-1])[::-1], num_frames)
+    next_onset = np.append(onsets[1:], num_frames)
+    return np.minimum(next_silent[np.minimum(onsets + wait, num_frames)], next_onset)
+
+
+def segment(signal, sr=SAMPLE_RATE, hop_length=HOP_LENGTH, min_duration=MIN_DURATION, **kwargs):
+    """
+    Note events of a signal
+        :param signal (ndarray): 1D signal
+        :param sr (int): sample rate
+        :param hop_length (int): number of samples between frames
+        :param min_duration (float): seconds, shorter events are dropped
+        :param kwargs: arguments passed on to detect_onsets
+        :return (ndarray): onset and offset frame of every event, shape (num_events, 2)
+    """
+    flux, energy_db = spectral_features(signal, hop_length=hop_length)
+    onsets = detect_onsets(flux, energy_db, **kwargs)
+    offsets = detect_offsets(onsets, energy_db, kwargs.get("wait", WAIT), kwargs.get("silence_db", SILENCE_DB))
+    events = np.stack((onsets, offsets), axis=1).astype(np.int64).reshape(-1, 2)
+    return events[(events[:, 1] - events[:, 0]) * hop_length / sr >= min_duration]
+
+
+def event_signals(signal, events, sr=SAMPLE_RATE, duration=DURATION, hop_length=HOP_LENGTH):
+    """
+    Audio of every event, from its onset, zero padded after its offset to the length of a training clip
+        :param signal (ndarray): 1D signal
+        :param events (ndarray): onset and offset frame of every event
+        :param sr (int): sample rate
+        :param duration (float): seconds per event
+        :param hop_length (int): number of samples between frames
+        :return (ndarray): signals of shape (num_events, sr * duration)
+    """
+    num_samples = int(sr * duration)
+    starts = events[:, 0] * hop_length
+    lengths = np.minimum((events[:, 1] - events[:, 0]) * hop_length, num_samples)
+    # gather every event with one fancy index, samples past the offset or the end of the signal are zeroed
+    positions = starts[:, np.newaxis] + np.arange(num_samples)
+    keep = (np.arange(num_samples) < lengths[:, np.newaxis]) & (positions < len(signal))
+    return np.where(keep, signal[np.minimum(positions, len(signal) - 1)], 0).astype(np.float32)
+
+
+def transcribe(signal, model, labels, sr=SAMPLE_RATE, batch_size=BATCH_SIZE, **kwargs):
+    """
+    Find the note events of a signal and classify them
+        :param signal (ndarray): 1D signal
+        :param model: Keras model taking the MFCCs of a training clip
+        :param labels (list): names of the notes
+        :param sr (int): sample rate
+        :param batch_size (int): events classified at a time
+        :param kwargs: arguments passed on to segment
+        :return events (DataFrame): onset, offset, predicted note and its probability of every event
+        :return prediction (ndarray): probabilities of shape (num_events, number of notes)
+    """
+    events = segment(signal, sr, **kwargs)
+    if len(events) == 0:
+        # nothing to classify, e.g. a silent recording
+        return pd.DataFrame(columns=["onset", "offset", "predicted_note", "probability"]), \
+            np.zeros((0, len(labels)), dtype=np.float32)
+    channel = len(model.input_shape) == 4  # the CNN takes a channel axis, the LSTM doesn't
+    prediction = np.zeros((len(events), len(labels)), dtype=np.float32)
+    for start in range(0, len(events), batch_size):
+        mfcc = batch_mfcc(event_signals(signal, events[start:start + batch_size], sr), sr=sr, n_mfcc=N_MFCC,
+                          n_fft=N_FFT, hop_length=HOP_LENGTH)
+        prediction[start:start + batch_size] = model.predict_on_batch(mfcc[..., np.newaxis] if channel else mfcc)
+
+    predicted_index = np.argmax(prediction, axis=1)
+    frame_time = HOP_LENGTH / sr
+    return pd.DataFrame({"onset": events[:, 0] * frame_time,
+                         "offset": events[:, 1] * frame_time,
+                         "predicted_note": np.asarray(labels)[predicted_index],
+                         "probability": prediction[np.arange(len(events)), predicted_index]}), prediction
+
+
+if __name__ == "__main__":
+    import sys
+    from tensorflow.keras.models import load_model
+    from Feature_Store import load_dataset_manifest
+
+    # python Onset_Segmentation.py <audio file>
+    LABELS = load_dataset_manifest(MODEL_DATASET_PATH)["mapping"]
+    model = load_model(MODEL_PATH)
+    signal, _ = librosa.load(sys.argv[1], sr=SAMPLE_RATE)
+    events, _ = transcribe(signal, model, LABELS)
+
+    name = os.path.splitext(os.path.basename(sys.argv[1]))[0]
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    events.to_csv(os.path.join(RESULTS_PATH, "Events_" + name + ".csv"), index=False)
+    print(events)
+    num_windows = 1 + max(0, len(signal) - SAMPLE_RATE * DURATION) // HOP_LENGTH
+    print("Classified {} events instead of {} windows".format(len(events), num_windows))
@@ -0,0 +1,167 @@
+"""
+Writes the results of a prediction run
+
+Takes the whole probability matrix (or chunks of it, for long recordings) and
+writes in one vectorized pass per chunk:
+    Prediction_<name>.csv   - probabilities, predicted note and the top k notes per sample
+    Prediction_<name>.f32   - raw float32 probabilities of shape (num_samples, num_notes)
+    Prediction_<name>.json  - notes and shape of the .f32 file
+    Description_<name>.csv  - summary statistics of every note, like DataFrame.describe
+
+    with PredictionWriter(RESULTS_PATH, MODEL_NAME + "_" + DATASET_NAME, LABELS) as writer:
+        writer.write(pred)
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+TOP_K = 3
+DECIMALS = 2  # decimal places of the probabilities in the csv files
+
+
+def top_k(pred, k=TOP_K):
+    """
+    Indices of the k most likely notes of each sample
+        :param pred (ndarray): probabilities of shape (num_samples, num_notes)
+        :param k (int): number of notes
+        :return (ndarray): indices of shape (num_samples, k), most likely first
+    """
+    k = min(k, pred.shape[1])
+    return np.argsort(-pred, axis=1, kind="stable")[:, :k]
+
+
+def prediction_frame(pred, labels, k=TOP_K, decimals=DECIMALS, start=0):
+    """
+    Table of the probabilities, predicted note and top k notes of every sample
+        :param pred (ndarray): probabilities of shape (num_samples, num_notes)
+        :param labels (list): names of the notes
+        :param k (int): number of most likely notes to list
+        :param decimals (int): decimal places of the probabilities
+        :param start (int): index of the first sample
+        :return (DataFrame): one row per sample
+    """
+    pred = np.asarray(pred)
+    labels = np.asarray(labels)
+    best = top_k(pred, k)
+    best_probabilities = np.take_along_axis(pred, best, axis=1)
+
+    columns = {label: np.round(pred[:, i], decimals) for i, label in enumerate(labels)}
+    columns["predicted_index"] = best[:, 0]
+    columns["predicted_note"] = labels[best[:, 0]]
+    for j in range(best.shape[1]):
+        columns["top_{}".format(j + 1)] = labels[best[:, j]]
+        columns["top_{}_probability".format(j + 1)] = np.round(best_probabilities[:, j], decimals)
+    return pd.DataFrame(columns, index=pd.RangeIndex(start, start + len(pred)))
+
+
+def describe(pred, labels, decimals=DECIMALS):
+    """
+    Summary statistics of the probability of every note
+        :param pred (ndarray): probabilities of shape (num_samples, num_notes)
+        :param labels (list): names of the notes
+        :param decimals (int): decimal places
+        :return (DataFrame): count, mean, std, min, quartiles and max of every note
+    """
+    pred = np.asarray(pred, dtype=np.float64)
+    count = np.full(pred.shape[1], len(pred), dtype=np.float64)
+    if len(pred) == 0:
+        rows = [count] + [np.full(pred.shape[1], np.nan)] * 7
+    else:
+        quartiles = np.percentile(pred, [0, 25, 50, 75, 100], axis=0)
+        std = pred.std(axis=0, ddof=1) if len(pred) > 1 else np.full(pred.shape[1], np.nan)
+        rows = [count, pred.mean(axis=0), std] + list(quartiles)
+    return pd.DataFrame(rows, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+                        columns=list(labels)).round(decimals)
+
+
+class PredictionWriter:
+    """
+    Streams prediction results to disk chunk by chunk, so a long recording
+    never has to be held in memory as a table
+
+        with PredictionWriter(results_path, name, labels) as writer:
+            for pred in chunks:
+                writer.write(pred)
+    """
+
+    def __init__(self, results_path, name, labels, k=TOP_K, decimals=DECIMALS, csv=True, binary=True):
+        """
+        :param results_path (str): folder to write the results to
+        :param name (str): name of the run, used in the file names
+        :param labels (list): names of the notes
+        :param k (int): number of most likely notes to list
+        :param decimals (int): decimal places of the probabilities in the csv files
+        :param csv (bool): write the predictions as csv
+        :param binary (bool): write the probabilities as a raw float32 file
+        """
+        self.labels = list(labels)
+        self.k = k
+        self.decimals = decimals
+        self.csv_path = os.path.join(results_path, "Prediction_" + name + ".csv") if csv else None
+        self.binary_path = os.path.join(results_path, "Prediction_" + name + ".f32") if binary else None
+        self.description_path = os.path.join(results_path, "Description_" + name + ".csv")
+        self.chunks = []  # only kept when there is no binary file to describe
+        self.num_samples = 0
+
+        os.makedirs(results_path or ".", exist_ok=True)
+        for path in [self.csv_path, self.binary_path]:
+            if path is not None:
+                open(path, "w").close()
+
+    def write(self, pred):
+        """
+        Write the results of some samples
+            :param pred (ndarray): probabilities of shape (num_samples, num_notes)
+        """
+        pred = np.asarray(pred, dtype=np.float32)
+        if self.csv_path is not None:
+            frame = prediction_frame(pred, self.labels, self.k, self.decimals, start=self.num_samples)
+            frame.to_csv(self.csv_path, mode="a", header=self.num_samples == 0)
+        if self.binary_path is not None:
+            with open(self.binary_path, "ab") as fp:
+                pred.tofile(fp)
+        else:
+            self.chunks.append(pred)
+        self.num_samples += len(pred)
+
+    def close(self):
+        """
+        Write the summary statistics and the description of the binary file
+            :return description (DataFrame): summary statistics of every note
+        """
+        shape = (self.num_samples, len(self.labels))
+        if self.binary_path is not None:
+            with open(os.path.splitext(self.binary_path)[0] + ".json", "w") as fp:
+                json.dump({"labels": self.labels, "shape": list(shape), "dtype": "float32"}, fp, indent=4)
+            pred = np.memmap(self.binary_path, dtype=np.float32, mode="r", shape=shape) if self.num_samples \
+                else np.zeros(shape, dtype=np.float32)
+        else:
+            pred = np.concatenate(self.chunks) if self.chunks else np.zeros(shape, dtype=np.float32)
+        description = describe(pred, self.labels, self.decimals)
+        description.to_csv(self.description_path)
+        return description
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_predictions(results_path, name):
+    """
+    Load the probabilities written by PredictionWriter
+        :param results_path (str): folder the results were written to
+        :param name (str): name of the run
+        :return pred (ndarray): memory-mapped probabilities of shape (num_samples, num_notes)
+        :return labels (list): names of the notes
+    """
+    prefix = os.path.join(results_path, "Prediction_" + name)
+    with open(prefix + ".json", "r") as fp:
+        description = json.load(fp)
+    shape = tuple(description["shape"])
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=np.float32), description["labels"]
+    return np.memmap(prefix + ".f32", dtype=np.float32, mode="r", shape=shape), description["labels"]
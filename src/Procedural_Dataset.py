@@ -0,0 +1,184 @@
+"""
+Procedural training data, synthesized on demand
+
+Notes are generated with a random detune, amplitude, harmonic weights or
+pluck position from one of the synthesis models (sine, harmonic series,
+Karplus-Strong), their MFCCs are computed in worker processes and the
+batches are fed to model.fit through a prefetching tf.data pipeline. Nothing
+is written to disk and no example is ever repeated: batch i of a run is
+generated from the seed (seed, i).
+
+    dataset = procedural_dataset(LABELS, batch_size=BATCH_SIZE, num_workers=os.cpu_count())
+    model.fit(dataset, steps_per_epoch=STEPS_PER_EPOCH, epochs=EPOCHS)
+
+LABELS is the mapping of the store the model is validated on, so the labels
+of the procedural notes line up with it.
+"""
+
+import os
+import importlib.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.signal import resample_poly
+from MFCC_Engine import batch_mfcc
+from Metadata_Index import NOTE_NAMES, note_to_midi, midi_to_frequency
+from Wave_Writer import harmonic_series
+
+
+def load_karplus_strong():
+    # Karplus_Strong lives with the rest of the guitar simulation, it is loaded from its file so the
+    # folder doesn't have to be added to the import path
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Guitar Simulation", "Karplus_Strong.py")
+    spec = importlib.util.spec_from_file_location("Karplus_Strong", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+Karplus_Strong = load_karplus_strong()
+pluck = Karplus_Strong.pluck
+KS_SAMPLE_RATE = Karplus_Strong.SAMPLE_RATE
+
+SAMPLE_RATE = 22050
+DURATION = 4  # length of each note in seconds, the same as the simulated datasets
+SOURCES = ["sine", "harmonics", "karplus_strong"]
+MAX_DETUNE = 2  # Hz, the same range as DETUNE_FREQUENCIES
+MAX_HARMONICS = 8
+EXCITATIONS = ["excite-picked-nodamp.wav", "excite-plucked-nodamp.wav"]
+PREFETCH_BATCHES = 2  # batches generated ahead of training, per worker
+
+
+def random_note(rng, freq, sources=SOURCES, sample_rate=SAMPLE_RATE, duration=DURATION):
+    """
+    Synthesize a note with random parameters
+        :param rng (Generator): random generator
+        :param freq (float): frequency of the note
+        :param sources (list): synthesis models to pick from
+        :param sample_rate (int): sample rate
+        :param duration (float): length of the note in seconds
+        :return y (ndarray): float32 note with a random peak amplitude in (0.05, 1)
+    """
+    freq = freq + rng.uniform(-MAX_DETUNE, MAX_DETUNE)
+    source = sources[rng.integers(len(sources))]
+    if source == "sine":
+        y = harmonic_series(freq, sample_rate, duration, amplitude=1)
+    elif source == "harmonics":
+        # harmonics above the Nyquist frequency would alias
+        num_harmonics = max(1, min(MAX_HARMONICS, int(sample_rate / 2 / freq)))
+        weights = rng.uniform(0, 1, num_harmonics) * 0.5 ** np.arange(num_harmonics)
+        weights[0] = 1
+        y = harmonic_series(freq, sample_rate, duration, amplitude=1, num_harmonics=num_harmonics, weights=weights)
+    elif source == "karplus_strong":
+        excitation = EXCITATIONS[rng.integers(len(EXCITATIONS))]
+        y = pluck(freq, pluck_position=rng.uniform(0.05, 0.95), excitation_signal=excitation, duration=duration)
+        # the model runs at the rate of the excitation signals
+        y = resample_poly(y, sample_rate, KS_SAMPLE_RATE)[:int(sample_rate * duration)]
+    else:
+        raise ValueError("unknown source {}".format(source))
+
+    peak = np.max(np.abs(y))
+    if peak > 0:
+        y = y * (rng.uniform(0.05, 1) / peak)
+    return y.astype(np.float32)
+
+
+def make_batch(args):
+    """
+    Synthesize a batch of notes and extract their MFCCs
+        :param args (tuple): (seed, batch_index, frequencies, batch_size, sources, n_mfcc, n_fft, hop_length)
+        :return X (ndarray): float32 MFCCs of shape (batch_size, frames, n_mfcc)
+        :return y (ndarray): int32 labels
+    """
+    seed, batch_index, frequencies, batch_size, sources, n_mfcc, n_fft, hop_length = args
+    rng = np.random.default_rng([seed, batch_index])
+    y = rng.integers(len(frequencies), size=batch_size).astype(np.int32)
+    signals = np.stack([random_note(rng, frequencies[label], sources) for label in y])
+    X = batch_mfcc(signals, sr=SAMPLE_RATE, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
+    return X, y
+
+
+def mapping_frequencies(mapping):
+    """
+    Frequency of every note of a mapping
+        :param mapping (list): note names, e.g. A4, or the ds/A4 folder paths some builders write
+        :return (list): frequencies in Hz
+    """
+    notes = [str(label).replace("\\", "/").split("/")[-1] for label in mapping]
+    invalid = [label for label, note in zip(mapping, notes)
+               if not (note[:-1] in NOTE_NAMES and note[-1:].isdigit())]
+    if invalid:
+        raise ValueError("procedural notes need a mapping of note names like A4, "
+                         "got {} labels that aren't, e.g. {}".format(len(invalid), invalid[:5]))
+    return [midi_to_frequency(note_to_midi(note)) for note in notes]
+
+
+def generate_batches(mapping, batch_size=32, sources=SOURCES, n_mfcc=13, n_fft=2048, hop_length=512, seed=0,
+                     num_workers=1, num_batches=None):
+    """
+    Generate batches of procedural notes, in parallel if num_workers > 1
+        :param mapping (list): note names, a note's label is its index
+        :param batch_size (int): notes per batch
+        :param sources (list): synthesis models to pick from
+        :param n_mfcc (int): number of MFCC coefficients
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param seed (int): seed of the run
+        :param num_workers (int): number of processes to use, None uses every core
+        :param num_batches (int): number of batches to generate, None never stops
+        :return (iterator): (X, y) batches
+    """
+    frequencies = mapping_frequencies(mapping)
+
+    def tasks():
+        batch_index = 0
+        while num_batches is None or batch_index < num_batches:
+            yield seed, batch_index, frequencies, batch_size, list(sources), n_mfcc, n_fft, hop_length
+            batch_index += 1
+
+    if num_workers == 1:
+        for args in tasks():
+            yield make_batch(args)
+        return
+
+    # keep a bounded number of batches in flight so an endless run doesn't queue up forever
+    max_pending = (num_workers or os.cpu_count()) * PREFETCH_BATCHES
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for args in tasks():
+            pending.append(executor.submit(make_batch, args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def procedural_dataset(mapping, batch_size=32, sources=SOURCES, n_mfcc=13, n_fft=2048, hop_length=512, seed=0,
+                       num_workers=1, num_batches=None, channel=True):
+    """
+    tf.data pipeline of procedural notes, ready for model.fit
+        :param mapping (list): note names, a note's label is its index
+        :param batch_size (int): notes per batch
+        :param sources (list): synthesis models to pick from
+        :param n_mfcc (int): number of MFCC coefficients
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param seed (int): seed of the run
+        :param num_workers (int): number of processes to use, None uses every core
+        :param num_batches (int): number of batches to generate, None never stops
+        :param channel (bool): add a channel axis for the CNN
+        :return dataset (tf.data.Dataset): (X, y) batches
+    """
+    # tensorflow is only imported here so the worker processes don't load it
+    import tensorflow as tf
+
+    mapping_frequencies(mapping)  # fail here rather than inside the generator when training starts
+    frames = 1 + int(SAMPLE_RATE * DURATION) // hop_length
+    dataset = tf.data.Dataset.from_generator(
+        lambda: generate_batches(mapping, batch_size, sources, n_mfcc, n_fft, hop_length, seed, num_workers,
+                                 num_batches),
+        output_types=(tf.float32, tf.int32),
+        output_shapes=((None, frames, n_mfcc), (None,)))
+    if channel:
+        dataset = dataset.map(lambda X, y: (X[..., tf.newaxis], y))
+    return dataset.prefetch(tf.data.experimental.AUTOTUNE)
@@ -1,5 +1,5 @@
 """
-This code creates the JSON file of the notes
+This code creates the feature store of the notes
 pre-processing of audio takes place here
 """
 
@@ -7,98 +7,88 @@ pre-processing of audio takes place here
 # TODO Test if MFCC to spectrogram changes work as intended
 
 import os
-import librosa
 import math
-import json
+from Feature_Store import DatasetWriter, is_store, load_manifest
+from Feature_Extraction import list_dataset_files, extract_dataset_files
+from Build_Journal import incremental_build
+from Metadata_Index import simulated_metadata
 
 
 DATASET_PATH = "Simulated_Dataset_Matlab_Test"  # name of folder with audio files
-JSON_PATH = "Dataset_JSON_Files/Simulated_Dataset_Matlab_Test_1.json"  # name of file to be created
+STORE_PATH = "Dataset_Files/Simulated_Dataset_Matlab_Test_1"  # name of feature store to be created
 SAMPLE_RATE = 22050
 DURATION = 4  # length of audio files measured in seconds
 NUM_SEGMENTS = 1
+NUM_WORKERS = os.cpu_count()  # processes used to extract features, 1 runs serially
+CACHE_PATH = "Feature_Cache"  # folder to cache features in, None disables the cache
+MAX_CACHE_SIZE = 2 * 1024 ** 3  # bytes
+INCREMENTAL = True  # only featurize new or changed files, resumes interrupted builds
 SAMPLES_PER_TRACK = SAMPLE_RATE * DURATION
 
 
-# Modified to create spectrograms instead of MFCCs (Testing phase)
-def save_mfcc(dataset_path, json_path, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=5):
-    """Creates a JSON file of the MFCCs for the dataset
+def save_mfcc(dataset_path, store_path, n_mfcc=13, n_fft=2048, hop_length=512, num_segments=5, num_workers=1,
+              cache_path=None, max_cache_size=MAX_CACHE_SIZE, incremental=False):
+    """Creates a feature store of the MFCCs for the dataset
         :param
         ----------
          dataset_path: path to the dataset folder
-         json_path: name of JSON file to be created
+         store_path: name of feature store to be created
          n_mfcc: number of MFCC coefficients to create
          n_fft:
          hop_length:
          num_segments:
+         num_workers: number of processes to extract features with, None uses every core
+         cache_path: folder to cache features in, only files missing from the cache are extracted
+         max_cache_size: size cap of the cache in bytes
+         incremental: only featurize files that are new or changed since the last build of store_path
 
     """
     # dictionary to store data
     data = {
-        "mapping": [],
-        # "spectrogram": [],
-        "mfcc": [],  # not in use for Spectrogram conversion
-        "labels": []
+        "mapping": []
     }
     num_samples_per_segment = int(SAMPLES_PER_TRACK / num_segments)
     expected_num_mfcc_vectors_per_segment = math.ceil(num_samples_per_segment / hop_length)  # round up always
 
-    # Loop through all the data
-    for i, (dirpath, dirnames, filenames) in enumerate(os.walk(dataset_path)):
-        # dirpath = current folder path
-        # dirnames = subfolders in dirpath
-        # filenames = all files in dirpath
-
-        # ensure that we're not at the root level (Audio folder)
-        if dirpath is not dataset_path:
-            # save the semantic label (name of the note)
-            dirpath_components = dirpath.split("\\")    # TODO confirm what this actually does
-            semantic_label = dirpath_components[-1]
-            data["mapping"].append(semantic_label)
-            print("\nProcessing {}".format(semantic_label))
-
-            # process files for specific note
-            for f in filenames:
-                # load audio file
-                file_path = os.path.join(dirpath, f)
-                signal, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=DURATION)
-
-                # process segments extracting mfcc and storing data
-                for s in range(num_segments):
-                    start_sample = num_samples_per_segment * s  # s=0 -> 0
-                    finish_sample = start_sample + num_samples_per_segment  # s=0 -> num_samples_per_segment
-
-                    """
-                    # Modification to use spectrograms
-                    spectrogram = librosa.feature.melspectrogram(signal[start_sample:finish_sample],
-                                                sr=sr,
-                                                n_fft=n_fft,
-                                                hop_length=hop_length)
-
-                    spectrogram = spectrogram.T
-
-                    # Says MFCC but should work for spectrograms
-                    if len(spectrogram) == expected_num_mfcc_vectors_per_segment:
-                        data["spectrogram"].append(spectrogram.tolist())  # can't save numpy arrays as json files
-                        data["labels"].append(i - 1)  # each iterations is a different folder
-                        print("{}, segment:{}".format(file_path, s + 1))
-                    """
-                    mfcc = librosa.feature.mfcc(signal[start_sample:finish_sample],
-                                                sr=sr,
-                                                n_fft=n_fft,
-                                                n_mfcc=n_mfcc,
-                                                hop_length=hop_length)
-                    mfcc = mfcc.T  # TODO find out why this is better to work with
-
-                    # store mfcc for segment if it has expected length
-                    if len(mfcc) == expected_num_mfcc_vectors_per_segment:
-                        data["mfcc"].append(mfcc.tolist())  # can't save numpy arrays as json files
-                        data["labels"].append(i - 1)  # each iterations is a different folder
-                        print("{}, segment:{}".format(file_path, s+1))
+    # list every file first so labels don't depend on the order files are processed in
+    data["mapping"], files = list_dataset_files(dataset_path)
+    file_paths = [file_path for file_path, label in files]
+    print("\nProcessing {} files with {} workers".format(len(files), num_workers))
+
+    # process segments extracting mfcc and storing data, results come back in file order
+    params = {
+        "sample_rate": SAMPLE_RATE,
+        "duration": DURATION,
+        "n_mfcc": n_mfcc,
+        "n_fft": n_fft,
+        "hop_length": hop_length,
+        "num_segments": num_segments
+    }
 
-    with open(json_path, "w") as fp:
-        json.dump(data, fp, indent=4)
+    def extract(paths, content_hashes=None):
+        return extract_dataset_files(paths, num_workers=num_workers, cache_path=cache_path,
+                                     max_cache_size=max_cache_size, content_hashes=content_hashes, **params)
+
+    if incremental:
+        # keep the labels of the existing records, new notes are added to the end of the mapping
+        mapping = load_manifest(store_path)["mapping"] if is_store(store_path) else []
+        mapping = mapping + [note for note in data["mapping"] if note not in mapping]
+        files = [(file_path, mapping.index(data["mapping"][label]),
+                  simulated_metadata(file_path, data["mapping"][label])) for file_path, label in files]
+        incremental_build(store_path, files, extract, (expected_num_mfcc_vectors_per_segment, n_mfcc),
+                          mapping=mapping, params=params)
+        return
+
+    # records are written to the store in chunks as they are produced
+    with DatasetWriter(store_path, (expected_num_mfcc_vectors_per_segment, n_mfcc), mapping=data["mapping"],
+                       params=params) as writer:
+        for (file_path, label), segments in zip(files, extract(file_paths)):
+            metadata = simulated_metadata(file_path, data["mapping"][label])
+            for s, mfcc in segments:
+                writer.append(mfcc, label, metadata)
+                print("{}, segment:{}".format(file_path, s+1))
 
 
 if __name__ == "__main__":
-    save_mfcc(DATASET_PATH, JSON_PATH, num_segments=NUM_SEGMENTS)
+    save_mfcc(DATASET_PATH, STORE_PATH, num_segments=NUM_SEGMENTS, num_workers=NUM_WORKERS,
+              cache_path=CACHE_PATH, incremental=INCREMENTAL)
@@ -0,0 +1,150 @@
+"""
+MFCCs of overlapping windows of a long recording
+
+Cutting a recording into DURATION long windows and extracting the MFCCs of
+each one recomputes the same STFT frames for every window that overlaps them.
+SlidingMFCC computes the frame-level MFCCs of the whole recording once, with
+the n_fft=2048, hop_length=512 framing of Save_dataset.save_mfcc, and serves
+the windows as a read only strided view of the frames, so a window costs no
+copy and no extra FFTs however small the stride is. Audio can be appended
+while the windows are being used, only the new frames are computed.
+
+A window has the frames of a clip cut from the recording at a multiple of
+hop_length, except that the frames at its edges see the neighbouring audio
+instead of zero padding and top_db clips relative to the loudest frame so far.
+
+    sliding = SlidingMFCC()
+    sliding.append(audio)
+    sliding.close()
+    windows = sliding.windows(stride_frames=8)  # (num_windows, window_frames, n_mfcc)
+"""
+
+import numpy as np
+import librosa
+from numpy.lib.stride_tricks import as_strided
+from MFCC_Engine import StreamingMFCC
+
+SAMPLE_RATE = 22050
+DURATION = 4  # length of the windows in seconds, the length of the training clips
+N_MFCC = 13
+N_FFT = 2048
+HOP_LENGTH = 512
+STRIDE_FRAMES = 1  # frames between the starts of consecutive windows
+
+
+class SlidingMFCC:
+    """
+    Frame-level MFCCs of a recording, served as overlapping windows
+    """
+
+    def __init__(self, sr=SAMPLE_RATE, duration=DURATION, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                 top_db=80.0):
+        """
+        :param sr (int): sample rate
+        :param duration (float): length of the windows in seconds
+        :param n_mfcc (int): number of MFCC coefficients to create
+        :param n_fft (int): length of the FFT window
+        :param hop_length (int): number of samples between frames
+        :param top_db (float): threshold below the loudest value so far, None to disable
+        """
+        self.sr = sr
+        self.hop_length = hop_length
+        self.window_frames = 1 + int(sr * duration) // hop_length  # frames of a training clip
+        self.stream = StreamingMFCC(sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, top_db=top_db)
+        self.buffer = np.zeros((self.window_frames, n_mfcc), dtype=np.float32)
+        self.num_frames = 0
+        self.closed = False
+
+    @property
+    def frames(self):
+        """
+        MFCCs of every frame computed so far, shape (num_frames, n_mfcc)
+        """
+        return self.buffer[:self.num_frames]
+
+    def add_frames(self, frames):
+        end = self.num_frames + len(frames)
+        if end > len(self.buffer):
+            # grow geometrically so appending stays linear in the length of the recording
+            buffer = np.zeros((max(end, 2 * len(self.buffer)), self.buffer.shape[1]), dtype=np.float32)
+            buffer[:self.num_frames] = self.frames
+            self.buffer = buffer
+        self.buffer[self.num_frames:end] = frames
+        self.num_frames = end
+        return len(frames)
+
+    def append(self, samples):
+        """
+        Add audio to the end of the recording, only the frames it completes are computed
+            :param samples (ndarray): 1D samples at sr
+            :return (int): number of new frames
+        """
+        if self.closed:
+            raise ValueError("can't append to a closed recording")
+        return self.add_frames(self.stream.push(samples))
+
+    def close(self):
+        """
+        End the recording, computing the frames that overlap its end
+            :return (int): number of new frames
+        """
+        if self.closed:
+            return 0
+        self.closed = True
+        return self.add_frames(self.stream.flush())
+
+    def num_windows(self, stride_frames=STRIDE_FRAMES):
+        if self.num_frames < self.window_frames:
+            return 0
+        return 1 + (self.num_frames - self.window_frames) // stride_frames
+
+    def windows(self, stride_frames=STRIDE_FRAMES, channel=False):
+        """
+        Every complete window, as a view of the frames. The view is only valid until the next append
+            :param stride_frames (int): frames between the starts of consecutive windows
+            :param channel (bool): add a channel axis for the CNN
+            :return (ndarray): read only view of shape (num_windows, window_frames, n_mfcc)
+        """
+        frames = self.frames
+        shape = (self.num_windows(stride_frames), self.window_frames, frames.shape[1])
+        strides = (frames.strides[0] * stride_frames,) + frames.strides
+        windows = as_strided(frames, shape=shape, strides=strides, writeable=False)
+        return windows[..., np.newaxis] if channel else windows
+
+    def window_times(self, stride_frames=STRIDE_FRAMES):
+        """
+        Start time of every window
+            :param stride_frames (int): frames between the starts of consecutive windows
+            :return (ndarray): seconds from the start of the recording
+        """
+        return np.arange(self.num_windows(stride_frames)) * stride_frames * self.hop_length / self.sr
+
+
+def recording_windows(file_path, stride_frames=STRIDE_FRAMES, channel=False, **kwargs):
+    """
+    MFCC windows of a whole audio file
+        :param file_path (str): path to the audio file
+        :param stride_frames (int): frames between the starts of consecutive windows
+        :param channel (bool): add a channel axis for the CNN
+        :param kwargs: arguments passed on to SlidingMFCC
+        :return windows (ndarray): read only view of shape (num_windows, window_frames, n_mfcc)
+        :return times (ndarray): start time of every window in seconds
+    """
+    sliding = SlidingMFCC(**kwargs)
+    signal, _ = librosa.load(file_path, sr=sliding.sr)
+    sliding.append(signal)
+    sliding.close()
+    return sliding.windows(stride_frames, channel), sliding.window_times(stride_frames)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python Sliding_MFCC.py <audio file> [stride in frames]
+    stride = int(sys.argv[2]) if len(sys.argv) > 2 else STRIDE_FRAMES
+    sliding = SlidingMFCC()
+    sliding.append(librosa.load(sys.argv[1], sr=sliding.sr)[0])
+    sliding.close()
+    windows = sliding.windows(stride)
+    print("Windows: {}, frames computed: {}, frames computed a window at a time: {}".format(
+        len(windows), sliding.num_frames, len(windows) * sliding.window_frames))
@@ -0,0 +1,209 @@
+"""
+Quantized TensorFlow Lite export of the CNN and LSTM models
+
+A trained .h5 model is converted to TensorFlow Lite with either
+    dynamic - weights stored as int8, activations stay float
+    int8    - weights and activations int8, calibrated on training features
+and the converted models are compared with the Keras model on the same test
+split: file size, accuracy and latency per window on the CPU.
+
+The test set is the one saved with the model when it was trained (see
+Input_Pipeline.save_split) and the int8 calibration windows come from its
+training set. A model trained before splits were saved has no held-out test
+set, the records are then split again and the report says held_out=False:
+those accuracies include windows the model was trained on.
+
+    python TFLite_Export.py
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from Feature_Store import load_manifest
+from Input_Pipeline import split_indices, load_records, load_split
+
+MODEL_PATH = "CNN/CNN_Model_Files/CNN_Model_Simulated_Dataset_Matlab_12frets_1.h5"
+DATASET_PATH = "Dataset_Files/Simulated_Dataset_Matlab_12frets_1"  # dataset the model was trained on
+EXPORT_PATH = "TFLite_Model_Files/"
+MODES = ["dynamic", "int8"]
+NUM_CALIBRATION_SAMPLES = 200  # training windows used to calibrate int8 activations
+NUM_LATENCY_SAMPLES = 200  # test windows timed one at a time
+SEED = 0  # seed of the calibration windows, and of the split for models without a saved split
+
+
+def representative_dataset(X, num_samples=NUM_CALIBRATION_SAMPLES, seed=SEED):
+    """
+    Calibration data for int8 quantization
+        :param X (ndarray): training features, with the channel axis for the CNN
+        :param num_samples (int): number of windows to use
+        :param seed (int): seed of the random choice of windows
+        :return (function): generator of single window batches, as the converter expects
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(X), size=min(num_samples, len(X)), replace=False))
+
+    def generator():
+        for i in indices:
+            yield [np.asarray(X[i:i + 1], dtype=np.float32)]
+    return generator
+
+
+def convert(model, mode="dynamic", calibration_data=None):
+    """
+    Convert a Keras model to a quantized TensorFlow Lite model
+        :param model: Keras model
+        :param mode (str): dynamic or int8
+        :param calibration_data (function): representative dataset, needed for int8
+        :return (bytes): TensorFlow Lite flatbuffer
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "int8":
+        if calibration_data is None:
+            raise ValueError("int8 quantization needs calibration data")
+        converter.representative_dataset = calibration_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif mode != "dynamic":
+        raise ValueError("mode must be dynamic or int8, got {}".format(mode))
+    return converter.convert()
+
+
+class TFLiteModel:
+    """
+    Runs a TensorFlow Lite model like a Keras model, int8 inputs and outputs
+    are quantized and dequantized so it takes and returns floats
+    """
+
+    def __init__(self, model_content=None, model_path=None, num_threads=None):
+        """
+        :param model_content (bytes): TensorFlow Lite flatbuffer
+        :param model_path (str): path to a .tflite file, used if model_content is None
+        :param num_threads (int): CPU threads used by the interpreter
+        """
+        self.interpreter = tf.lite.Interpreter(model_content=model_content, model_path=model_path,
+                                               num_threads=num_threads)
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def resize(self, batch_size):
+        if batch_size != self.batch_size:
+            shape = [batch_size] + list(self.input_details["shape"][1:])
+            self.interpreter.resize_tensor_input(self.input_details["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def predict_on_batch(self, X):
+        """
+        Predict on a batch of windows
+            :param X (ndarray): inputs, shaped like the Keras model inputs
+            :return (ndarray): probabilities of shape (num_windows, num_notes)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        self.resize(len(X))
+        if self.input_details["dtype"] == np.int8:
+            scale, zero_point = self.input_details["quantization"]
+            X = np.clip(np.round(X / scale + zero_point), -128, 127).astype(np.int8)
+        self.interpreter.set_tensor(self.input_details["index"], X)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output_details["index"])
+        if self.output_details["dtype"] == np.int8:
+            scale, zero_point = self.output_details["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict(self, X, batch_size=256):
+        """
+        Predict on many windows
+            :param X (ndarray): inputs, shaped like the Keras model inputs
+            :param batch_size (int): windows per interpreter call
+            :return (ndarray): probabilities of shape (num_windows, num_notes)
+        """
+        return np.concatenate([self.predict_on_batch(X[start:start + batch_size])
+                               for start in range(0, len(X), batch_size)])
+
+
+def latency(predict_on_batch, X, num_samples=NUM_LATENCY_SAMPLES):
+    """
+    Mean time to predict a single window
+        :param predict_on_batch (function): called with a batch of one window
+        :param X (ndarray): windows to time
+        :param num_samples (int): number of windows to time
+        :return (float): milliseconds per window
+    """
+    X = X[:num_samples]
+    predict_on_batch(X[:1])  # warm up
+    start = time.perf_counter()
+    for i in range(len(X)):
+        predict_on_batch(X[i:i + 1])
+    return (time.perf_counter() - start) / max(len(X), 1) * 1000
+
+
+def export(model_path=MODEL_PATH, dataset_path=DATASET_PATH, export_path=EXPORT_PATH, modes=MODES, seed=SEED):
+    """
+    Export the quantized models and compare them with the Keras model
+        :param model_path (str): path to the .h5 model
+        :param dataset_path (str): feature store the model was trained on
+        :param export_path (str): folder to save the .tflite files and the report in
+        :param modes (list): quantization modes to export
+        :param seed (int): seed of the calibration windows, and of the split if none was saved with the model
+        :return report (DataFrame): size, accuracy and latency of every model
+    """
+    model = load_model(model_path)
+    channel = len(model.input_shape) == 4  # the CNN takes a channel axis, the LSTM doesn't
+
+    num_records = load_manifest(dataset_path)["num_records"]
+    split = load_split(model_path)
+    held_out = split is not None
+    if held_out:
+        if max(len(indices) and int(indices.max()) for indices in split) >= num_records:
+            raise ValueError("the split saved with {} isn't a split of {}".format(model_path, dataset_path))
+        train_indices, validation_indices, test_indices = split
+    else:
+        print("No split saved with {}, its test accuracy isn't a held-out evaluation".format(model_path))
+        train_indices, validation_indices, test_indices = split_indices(num_records, 0.25, 0.2, seed)
+    # only the windows used for calibration are read
+    calibration_indices = np.random.default_rng(seed).choice(
+        train_indices, size=min(NUM_CALIBRATION_SAMPLES, len(train_indices)), replace=False)
+    X_train = load_records(dataset_path, np.sort(calibration_indices), channel)[0]
+    X_test, y_test = load_records(dataset_path, test_indices, channel)
+
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    os.makedirs(export_path, exist_ok=True)
+    rows = [{"model": name,
+             "mode": "keras",
+             "held_out": held_out,
+             "size_bytes": os.path.getsize(model_path),
+             "accuracy": float(np.mean(np.argmax(model.predict(X_test), axis=1) == y_test)),
+             "latency_ms": latency(model.predict_on_batch, X_test)}]
+
+    for mode in modes:
+        try:
+            content = convert(model, mode, representative_dataset(X_train, seed=seed))
+        except Exception as e:
+            # e.g. LSTM ops without an int8 kernel
+            print("Could not convert {} to {}: {}".format(name, mode, e))
+            continue
+        tflite_path = os.path.join(export_path, "{}_{}.tflite".format(name, mode))
+        with open(tflite_path, "wb") as fp:
+            fp.write(content)
+        tflite_model = TFLiteModel(model_content=content)
+        rows.append({"model": name,
+                     "mode": mode,
+                     "held_out": held_out,
+                     "size_bytes": len(content),
+                     "accuracy": float(np.mean(np.argmax(tflite_model.predict(X_test), axis=1) == y_test)),
+                     "latency_ms": latency(tflite_model.predict_on_batch, X_test)})
+
+    report = pd.DataFrame(rows)
+    report.to_csv(os.path.join(export_path, "Report_" + name + ".csv"), index=False)
+    return report
+
+
+if __name__ == "__main__":
+    print(export())
@@ -0,0 +1,91 @@
+"""
+Vectorized sine and harmonic wav writer
+
+A signal is built with one NumPy operation over all harmonics and samples,
+converted to int16 or float32 in bulk and written with a single call. Many
+notes can be written in parallel with write_notes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.io import wavfile
+
+SAMPLE_RATE = 44100
+INT16_MAX = np.iinfo(np.int16).max
+
+
+def harmonic_series(freq, sample_rate=SAMPLE_RATE, duration=20, amplitude=20, num_harmonics=1, decay=0.5,
+                    weights=None):
+    """
+    Sum of the first harmonics of a frequency, y = sum_n A*decay^(n-1)*sin(2*pi*n*f*t)
+        :param freq (float): fundamental frequency
+        :param sample_rate (int): sample rate
+        :param duration (float): length of the signal in seconds
+        :param amplitude (float): amplitude of the fundamental, in int16 sample values
+        :param num_harmonics (int): number of harmonics, 1 is a pure sine
+        :param decay (float): each harmonic has this times the amplitude of the one before
+        :param weights (ndarray): relative amplitude of each harmonic, replaces decay if given
+        :return y (ndarray): float64 signal
+    """
+    t_seq = np.arange(int(sample_rate * duration)) / sample_rate
+    n = np.arange(1, num_harmonics + 1)[:, np.newaxis]  # (n_harmonics, 1)
+    if weights is not None:
+        amplitudes = amplitude * np.asarray(weights, dtype=np.float64)[:num_harmonics, np.newaxis]
+    else:
+        amplitudes = amplitude * decay ** (n - 1)
+    # (n_harmonics, n_samples) summed over the harmonics
+    return (amplitudes * np.sin(2 * np.pi * freq * n * t_seq)).sum(axis=0)
+
+
+def write_wav(filename, y, sample_rate=SAMPLE_RATE, dtype="int16"):
+    """
+    Write a mono wav file in one call
+        :param filename (str): path to the wav file
+        :param y (ndarray): signal, in int16 sample values for int16 files and -1 to 1 for float32 files
+        :param sample_rate (int): sample rate
+        :param dtype (str): int16 or float32 samples
+    """
+    if dtype == "int16":
+        data = np.clip(np.rint(y), -INT16_MAX - 1, INT16_MAX).astype(np.int16)
+    elif dtype == "float32":
+        data = np.asarray(y, dtype=np.float32)
+    else:
+        raise ValueError("dtype must be int16 or float32, got {}".format(dtype))
+    wavfile.write(filename, int(sample_rate), data)
+
+
+def create_wav(filename, freq, sample_rate=SAMPLE_RATE, amplitude=20, duration=20, num_harmonics=1,
+               dtype="int16"):
+    """
+    Write a note with its harmonics to a wav file
+        :param filename (str): path to the wav file, without the .wav extension
+        :param freq (float): fundamental frequency
+        :param sample_rate (int): sample rate
+        :param amplitude (float): amplitude of the fundamental
+        :param duration (float): length of the note in seconds
+        :param num_harmonics (int): number of harmonics
+        :param dtype (str): int16 or float32 samples
+        :return (str): path to the wav file
+    """
+    y = harmonic_series(freq, sample_rate, duration, amplitude, num_harmonics)
+    write_wav(filename + ".wav", y, sample_rate, dtype)
+    return filename + ".wav"
+
+
+def _create_wav(kwargs):
+    # ProcessPoolExecutor.map only passes one argument
+    return create_wav(**kwargs)
+
+
+def write_notes(notes, num_workers=1):
+    """
+    Write many notes, in parallel if num_workers > 1
+        :param notes (list): keyword arguments of create_wav for each note
+        :param num_workers (int): number of processes to use, None uses every core
+        :return (list): paths to the wav files, in the same order as notes
+    """
+    if num_workers == 1:
+        return list(map(_create_wav, notes))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(_create_wav, notes))
+
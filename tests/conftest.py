@@ -0,0 +1,14 @@
+"""
+The modules in src import each other by file name, as if run from their own
+folder, so the folders are put on the path before the tests import them.
+"""
+
+import os
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+for folder in ["", "CNN", "LSTM", "Guitar Simulation"]:
+    path = os.path.join(SRC_PATH, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+from Build_Journal import incremental_build, load_journal
+from Feature_Cache import file_hash
+from Feature_Store import load_dataset, load_metadata
+
+RECORD_SHAPE = (2, 3)
+
+
+class Extract:
+    """
+    Featurizes a file as its number, keeping every file it was called with
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, file_paths, content_hashes):
+        assert content_hashes == [file_hash(file_path) for file_path in file_paths]
+        self.calls.extend(os.path.basename(file_path) for file_path in file_paths)
+        for file_path in file_paths:
+            with open(file_path) as fp:
+                yield [(0, np.full(RECORD_SHAPE, float(fp.read())))]
+
+
+def write(folder, name, value):
+    path = str(folder / name)
+    with open(path, "w") as fp:
+        fp.write(value)
+    return path
+
+
+def build(store_path, paths):
+    extract = Extract()
+    files = [(path, i, {"file": os.path.basename(path)}) for i, path in enumerate(paths)]
+    incremental_build(store_path, files, extract, RECORD_SHAPE, mapping=["a", "b", "c"], params={"n_mfcc": 3},
+                      chunk_size=2)
+    X, y = load_dataset(store_path)
+    return extract.calls, X[:, 0, 0].tolist()
+
+
+def test_incremental_rebuild(tmp_path):
+    store_path = str(tmp_path / "store")
+    a, b, c = write(tmp_path, "a", "1"), write(tmp_path, "b", "2"), write(tmp_path, "c", "3")
+    assert build(store_path, [a, b, c]) == (["a", "b", "c"], [1, 2, 3])
+    assert build(store_path, [a, b, c]) == ([], [1, 2, 3])
+
+    # same contents with a new modification time isn't featurized again
+    os.utime(a, (0, 0))
+    assert build(store_path, [a, b, c]) == ([], [1, 2, 3])
+
+    # b changed, c was removed and d is new, the records of b and c are dropped
+    write(tmp_path, "b", "5")
+    os.utime(b, (1, 1))
+    d = write(tmp_path, "d", "4")
+    assert build(store_path, [a, b, d]) == (["b", "d"], [1, 5, 4])
+    assert load_metadata(store_path)["file"] == ["a", "b", "d"]
+    journal = load_journal(store_path)
+    assert sorted(os.path.basename(path) for path in journal) == ["a", "b", "d"]
+    assert journal[b]["hash"] == file_hash(b)
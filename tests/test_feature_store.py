@@ -0,0 +1,70 @@
+import numpy as np
+from Feature_Store import save_dataset, load_dataset, load_manifest, load_metadata, load_labels, save_view, \
+    DatasetWriter, ViewRecords
+
+MAPPING = ["E2", "F2", "F#2"]
+
+
+def records(num_records, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((num_records, 5, 13)).astype(np.float32)
+    y = rng.integers(len(MAPPING), size=num_records).astype(np.int32)
+    return X, y
+
+
+def test_store_round_trip(tmp_path):
+    X, y = records(10)
+    save_dataset(str(tmp_path), X, y, MAPPING, {"n_mfcc": 13}, {"file": [str(i) for i in range(10)]})
+
+    for mmap_mode in ["r", None]:
+        X_loaded, y_loaded = load_dataset(str(tmp_path), mmap_mode=mmap_mode)
+        np.testing.assert_array_equal(X_loaded, X)
+        np.testing.assert_array_equal(y_loaded, y)
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["mapping"] == MAPPING
+    assert manifest["params"] == {"n_mfcc": 13}
+    assert manifest["label_counts"] == np.bincount(y, minlength=len(MAPPING)).tolist()
+    assert load_metadata(str(tmp_path))["file"][3] == "3"
+
+
+def test_writer_flushes_in_chunks(tmp_path):
+    X, y = records(7)
+    with DatasetWriter(str(tmp_path), X.shape[1:], MAPPING, chunk_records=3) as writer:
+        for i, (features, label) in enumerate(zip(X, y)):
+            writer.append(features, label, {"file": str(i)})
+    X_loaded, y_loaded = load_dataset(str(tmp_path))
+    np.testing.assert_array_equal(X_loaded, X)
+    np.testing.assert_array_equal(y_loaded, y)
+    assert load_metadata(str(tmp_path))["file"] == [str(i) for i in range(7)]
+
+
+def test_view_is_read_lazily(tmp_path):
+    X, y = records(10)
+    store_path, view_path = str(tmp_path / "store"), str(tmp_path / "view")
+    save_dataset(store_path, X, y, MAPPING)
+    indices = np.array([8, 1, 5, 2])
+    save_view(view_path, store_path, indices, [1, 0, 1, 0], ["low", "high"])
+
+    X_view, y_view = load_dataset(view_path)
+    assert isinstance(X_view, ViewRecords)
+    assert X_view.shape == (4, 5, 13)
+    np.testing.assert_array_equal(X_view[np.array([3, 0])], X[[2, 8]])
+    np.testing.assert_array_equal(X_view[1:3, :2], X[[1, 5], :2])
+    np.testing.assert_array_equal(np.asarray(X_view), X[indices])
+    np.testing.assert_array_equal(y_view, [1, 0, 1, 0])
+    np.testing.assert_array_equal(load_labels(view_path), y_view)
+
+
+def test_view_indexing_matches_an_array(tmp_path):
+    X, y = records(10)
+    store_path, view_path = str(tmp_path / "store"), str(tmp_path / "view")
+    save_dataset(store_path, X, y, MAPPING)
+    save_view(view_path, store_path, [8, 1, 5, 2, 7], [0, 1, 2, 0, 1], MAPPING)
+
+    X_view = load_dataset(view_path)[0]
+    array = np.asarray(X_view)
+    indices = np.array([4, 0, 2])
+    for key in [(Ellipsis, np.newaxis), (slice(None), slice(None, 5)), indices, 3, (indices, 2),
+                (np.newaxis, 1), slice(1, None, 2)]:
+        np.testing.assert_array_equal(X_view[key], array[key])
+    assert X_view[..., np.newaxis].shape == (5, 5, 13, 1)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from Inference_Server import MicroBatcher, clip_samples
+
+
+class SumModel:
+    input_shape = (None, 3)
+
+    def predict_on_batch(self, X):
+        return X.sum(axis=1, keepdims=True)
+
+
+def test_batches_requests():
+    batcher = MicroBatcher(SumModel(), max_batch_size=4, max_wait=0.05)
+    futures = [batcher.submit(np.full(3, i, dtype=np.float32)) for i in range(10)]
+    assert [float(future.result(timeout=5)[0]) for future in futures] == [3.0 * i for i in range(10)]
+    batcher.close()
+    batcher.thread.join(timeout=5)
+    assert not batcher.thread.is_alive()
+
+
+def test_submit_after_close_fails():
+    batcher = MicroBatcher(SumModel())
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.zeros(3, dtype=np.float32))
+
+
+def test_clip_samples():
+    assert clip_samples(173) == 88200  # a whole 4 s clip
+    assert clip_samples(87) == 44100  # half of a clip
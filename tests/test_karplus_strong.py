@@ -0,0 +1,51 @@
+"""
+kspluck against kspluck.m
+
+Matlab isn't available to the test run, so the reference below was worked out
+from kspluck.m and lagrange.m line by line with Matlab's semantics (fix, round
+halves away from zero, filter as the direct difference equation) in plain
+Python. fs / f isn't a whole number and p * N is a half, so the rounding of
+both is checked. compare_with_matlab does the same against the Matlab engine.
+"""
+
+import numpy as np
+from Karplus_Strong import kspluck, kspluck_batch, LOOP_B, LOOP_A
+
+FREQUENCY = 1100
+LENGTH = 0.005
+SAMPLE_RATE = 8000
+PLUCK_POSITION = 0.5
+EXCITATION = [1.0, -0.5, 0.25, 0.8, -0.3, 0.6, -0.9, 0.1, 0.45, -0.2, 0.35, -0.65, 0.05, 0.7, -0.4, 0.15]
+REFERENCE = [
+    0.0, 0.0, 0.0, 0.0,
+    0.0, 0.0, 0.0, 0.7663896484374999,
+    -0.016660644531249928, -0.16140698242187504, 0.8264273925781249, -0.7639202636718747,
+    0.23994770507812496, -0.2280512207031247, -0.664231507872052, 0.8517625488480398,
+    -0.47040756889766017, 1.0306934638171519, -0.12455188483789652, -1.066523420137548,
+    0.7593262447201096, -0.7922647352780913, 0.5177550890754463, 0.510686739001695,
+    -0.3100119953962803, 0.48509752588245675, -0.7632270244138372, -0.02598194210816704,
+    -0.07139814534401104, -0.07610630446739113, 0.6631084464024336, -0.07881507417902188,
+    0.15424370513747607, -0.28335351618263577, -0.38651224309236776, 0.03729874731590316,
+    -0.088778719290101, 0.431521767004616, 0.22110189146551246, -0.005451807858542754,
+]
+
+
+def test_kspluck_matches_reference():
+    y = kspluck(FREQUENCY, LENGTH, SAMPLE_RATE, np.array(EXCITATION), LOOP_B, LOOP_A, PLUCK_POSITION)
+    np.testing.assert_allclose(y, REFERENCE, rtol=1e-9, atol=1e-12)
+
+
+def test_kspluck_cuts_long_excitations():
+    excitation = np.array(EXCITATION * 4)
+    y = kspluck(FREQUENCY, LENGTH, SAMPLE_RATE, excitation, LOOP_B, LOOP_A, PLUCK_POSITION)
+    assert len(y) == int(LENGTH * SAMPLE_RATE)
+
+
+def test_kspluck_batch_matches_kspluck():
+    excitations = [np.array(EXCITATION), -np.array(EXCITATION[::-1])]
+    pluck_positions = [0.2, PLUCK_POSITION, 0.9]
+    y = kspluck_batch(FREQUENCY, LENGTH, SAMPLE_RATE, excitations, LOOP_B, LOOP_A, pluck_positions)
+    for i, excitation in enumerate(excitations):
+        for j, p in enumerate(pluck_positions):
+            expected = kspluck(FREQUENCY, LENGTH, SAMPLE_RATE, excitation, LOOP_B, LOOP_A, p)
+            np.testing.assert_allclose(y[i * len(pluck_positions) + j], expected, rtol=1e-12, atol=1e-12)
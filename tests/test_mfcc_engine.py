@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import librosa
+from MFCC_Engine import batch_mfcc, mfcc_signals, StreamingMFCC
+
+SAMPLE_RATE = 22050
+
+
+def librosa_mfcc(signal):
+    return librosa.feature.mfcc(y=signal, sr=SAMPLE_RATE, n_mfcc=13, n_fft=2048, hop_length=512,
+                                pad_mode="constant").T
+
+
+def noise(num_samples, seed=0):
+    # the same level everywhere, so top_db never clips and the streaming frames match the batch ones
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_samples) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 220 * t) + 0.1 * rng.standard_normal(num_samples)).astype(np.float32)
+
+
+def assert_close(mfcc, expected):
+    np.testing.assert_allclose(mfcc, expected, atol=1e-2 * np.abs(expected).max())
+
+
+def test_batch_mfcc_matches_librosa():
+    signals = np.stack([noise(SAMPLE_RATE * 4, seed) for seed in range(3)])
+    mfcc = batch_mfcc(signals, batch_size=2)
+    assert mfcc.shape == (3, 173, 13)
+    for signal, frames in zip(signals, mfcc):
+        assert_close(frames, librosa_mfcc(signal))
+
+
+def test_mfcc_signals_keeps_the_order():
+    signals = [noise(SAMPLE_RATE), noise(SAMPLE_RATE // 2 + 1), noise(SAMPLE_RATE, 1)]
+    for signal, frames in zip(signals, mfcc_signals(signals)):
+        assert_close(frames, librosa_mfcc(signal))
+
+
+@pytest.mark.parametrize("block_size", [1, 511, 513, 1000, 4097])
+def test_streaming_mfcc_matches_librosa(block_size):
+    signal = noise(SAMPLE_RATE + 123)
+    stream = StreamingMFCC()
+    frames = [stream.push(signal[start:start + block_size]) for start in range(0, len(signal), block_size)]
+    frames = np.concatenate(frames + [stream.flush()])
+
+    expected = librosa_mfcc(signal)
+    assert frames.shape == expected.shape
+    assert_close(frames, expected)
+    assert_close(frames, batch_mfcc(signal)[0])
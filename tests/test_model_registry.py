@@ -0,0 +1,44 @@
+import gc
+import os
+import weakref
+import pytest
+from conftest import SRC_PATH
+from Model_Registry import ModelRegistry
+from Inference_Server import ModelPool
+
+pytest.importorskip("tensorflow")
+
+CNN_MODEL_PATH = os.path.join(SRC_PATH, "CNN", "CNN_Model_Files")
+NAMES = ["CNN_Model_Matlab", "CNN_Model_Matlab_Hybrid", "CNN_Model_Matlab_Hybrid2"]
+
+
+def test_evicted_models_are_freed():
+    registry = ModelRegistry(registry_path=None, model_paths=[CNN_MODEL_PATH], max_models=2)
+    pool = ModelPool(registry)
+
+    references = {}
+    threads = {}
+    for name in NAMES:
+        batcher, _ = pool.get(name)
+        references[name] = weakref.ref(batcher.model)
+        threads[name] = batcher.thread
+        del batcher
+
+    # the least recently used model is evicted and its batcher closed
+    assert list(registry.loaded) == NAMES[1:]
+    assert sorted(pool.batchers) == sorted(NAMES[1:])
+    for batcher in pool.batchers.values():
+        assert batcher.thread.is_alive()
+
+    threads[NAMES[0]].join(timeout=5)  # the closed batcher's thread finishes its queue and exits
+    assert not threads[NAMES[0]].is_alive()
+    gc.collect()
+    assert references[NAMES[0]]() is None
+    assert all(references[name]() is not None for name in NAMES[1:])
+
+
+def test_cache_hit_returns_the_same_model():
+    registry = ModelRegistry(registry_path=None, model_paths=[CNN_MODEL_PATH], max_models=2)
+    model, _ = registry.get(NAMES[0])
+    assert registry.get(NAMES[0])[0] is model
+    assert registry.is_loaded(NAMES[0], model)
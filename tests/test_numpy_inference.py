@@ -0,0 +1,25 @@
+import os
+import numpy as np
+import pytest
+from conftest import SRC_PATH
+from NumPy_Inference import NumPyModel
+
+keras_models = pytest.importorskip("tensorflow.keras.models")
+
+MODEL_PATHS = [
+    os.path.join(SRC_PATH, "CNN", "CNN_Model_Files", "CNN_Model_Matlab.h5"),
+    os.path.join(SRC_PATH, "CNN", "CNN_Model_Files", "CNN_Model_Simulated_Dataset_Matlab_12frets_1.h5"),
+    os.path.join(SRC_PATH, "LSTM", "LSTM_Model_Files", "LSTM_Model_Simulated_Dataset_Matlab_12frets_1.h5"),
+]
+
+
+@pytest.mark.parametrize("model_path", MODEL_PATHS, ids=os.path.basename)
+def test_matches_keras(model_path):
+    model = NumPyModel(model_path)
+    X = np.random.default_rng(0).normal(0, 50, size=(8,) + model.input_shape).astype(np.float32)
+
+    expected = keras_models.load_model(model_path).predict(X)
+    predicted_index, prediction = model.predict(X, batch_size=3)
+
+    np.testing.assert_allclose(prediction, expected, atol=1e-4)
+    np.testing.assert_array_equal(predicted_index, np.argmax(expected, axis=1))
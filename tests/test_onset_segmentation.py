@@ -0,0 +1,32 @@
+import numpy as np
+from Onset_Segmentation import SAMPLE_RATE, spectral_features, detect_onsets, segment, transcribe
+
+
+class NoModel:
+    input_shape = (None, 173, 13, 1)
+
+    def predict_on_batch(self, X):
+        raise AssertionError("the model shouldn't be called without events")
+
+
+def test_no_onsets_in_silence():
+    silence = np.zeros(2 * SAMPLE_RATE, dtype=np.float32)
+    flux, energy_db = spectral_features(silence)
+    onsets = detect_onsets(flux, energy_db)
+    assert onsets.shape == (0,)
+
+    events = segment(silence)
+    assert events.shape == (0, 2)
+    assert events.dtype == np.int64
+
+    frame, prediction = transcribe(silence, NoModel(), ["A4", "B4"])
+    assert len(frame) == 0
+    assert prediction.shape == (0, 2)
+
+
+def test_onset_of_a_tone_burst():
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    signal = np.where(t >= 1, np.sin(2 * np.pi * 440 * t) * np.exp(-3 * (t - 1)), 0).astype(np.float32)
+    events = segment(signal)
+    assert len(events) == 1
+    assert abs(events[0, 0] * 512 / SAMPLE_RATE - 1) < 0.1  # within the n_fft window around the attack